@@ -2,11 +2,43 @@ import streamlit as st
 import requests
 import json
 import os
+import time
 from datetime import datetime
 
 # URL del API
 API_BASE_URL = "https://reunicheck-backend-48606537894.us-central1.run.app"
 
+def get_all_pages(url, key, limit=500):
+    """
+    Recorre un listado de la API paginado por cursor (`next_cursor`) y devuelve todos
+    sus elementos `key`, o None si alguna página falla.
+    """
+    items, cursor = [], None
+    while True:
+        params = {"limit": limit, "cursor": cursor} if cursor else {"limit": limit}
+        resp = requests.get(url, params=params)
+        if resp.status_code != 200:
+            return None
+        data = resp.json()
+        items.extend(data.get(key, []))
+        cursor = data.get("next_cursor")
+        if not cursor:
+            return items
+
+def get_ready_meetings(id_user, limit=200):
+    """Todas las reuniones listas para analizar, pidiendo páginas (`offset`) hasta que `has_more` es falso."""
+    meetings, offset = [], 0
+    while True:
+        resp = requests.get(f"{API_BASE_URL}/analysis/ready/{id_user}", params={"limit": limit, "offset": offset})
+        if resp.status_code != 200:
+            return meetings
+        data = resp.json()
+        page = data.get("meetings", [])
+        meetings.extend(page)
+        if not data.get("has_more") or not page:
+            return meetings
+        offset += len(page)
+
 # Estado de sesión
 if "user_email" not in st.session_state:
     st.session_state.user_email = None
@@ -17,6 +49,28 @@ if "id_meeting" not in st.session_state:
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+def stream_chat(payload, result):
+    """
+    Envía un turno a `/chat/conversation/stream` y va devolviendo los fragmentos
+    de texto según llegan, para usarlo con `st.write_stream`. Al terminar deja en
+    `result` el evento final (`done` con la respuesta completa y el debug, o `error`).
+    """
+    try:
+        with requests.post(f"{API_BASE_URL}/chat/conversation/stream", json=payload, stream=True, timeout=120) as resp:
+            if resp.status_code != 200:
+                result.update({"type": "error", "detail": resp.text})
+                return
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["type"] == "token":
+                    yield event["content"]
+                else:
+                    result.update(event)
+    except requests.exceptions.RequestException as e:
+        result.update({"type": "error", "detail": str(e)})
+
 # Configuración de la página
 st.set_page_config(
     page_title="ReuniCheck", 
@@ -324,14 +378,21 @@ with tab2:
     with st.container():
         # Cargar lista de usuarios 
         def load_users():
-            users_resp = requests.get(f"{API_BASE_URL}/questions/all_users")
-            if users_resp.status_code == 200 and users_resp.text.strip():
+            # El listado está paginado: se piden páginas hasta que no hay `next_cursor`
+            users, cursor = [], None
+            while True:
+                params = {"limit": 1000, "cursor": cursor} if cursor else {"limit": 1000}
+                users_resp = requests.get(f"{API_BASE_URL}/questions/all_users", params=params)
+                if users_resp.status_code != 200 or not users_resp.text.strip():
+                    return users
                 try:
-                    return users_resp.json().get("users", [])
+                    data = users_resp.json()
                 except requests.exceptions.JSONDecodeError:
-                    return []
-            else:
-                return []
+                    return users
+                users.extend(data.get("users", []))
+                cursor = data.get("next_cursor")
+                if not cursor:
+                    return users
 
         all_users = load_users()
         email_options = [u["email"] for u in all_users]
@@ -584,12 +645,9 @@ with tab4:
 
                     # 1.b) Llamar al endpoint que devuelve las reuniones con respuestas
                     url_meetings_responded = f"{API_BASE_URL}/answers/meetings_responded/{st.session_state.id_user}"
-                    resp_meetings = requests.get(url_meetings_responded)
-
-                    if resp_meetings.status_code == 200:
-                        data_meet = resp_meetings.json()
-                        meetings_responded = data_meet.get("meetings", [])
+                    meetings_responded = get_all_pages(url_meetings_responded, "meetings")
 
+                    if meetings_responded is not None:
                         if not meetings_responded:
                             st.info("No tienes reuniones con respuestas todavía.")
                             st.session_state.meeting_options_list = []
@@ -615,16 +673,17 @@ with tab4:
                 if st.button("Iniciar chat", use_container_width=True):
                     st.session_state.messages = []  # Limpiamos historial
                     
-                    with st.spinner("Iniciando chat con IA..."):
-                        payload_init = {
-                            "id_user": st.session_state.id_user,
-                            "id_meeting": st.session_state.id_meeting_chat,
-                            "user_response": "INICIO_AUTOMATICO_PROFUNDIZAR"
-                        }
-                        init_res = requests.post(f"{API_BASE_URL}/chat/conversation", json=payload_init)
+                    payload_init = {
+                        "id_user": st.session_state.id_user,
+                        "id_meeting": st.session_state.id_meeting_chat,
+                        "user_response": "INICIO_AUTOMATICO_PROFUNDIZAR"
+                    }
+                    data_init = {}
+                    # La respuesta de GPT se muestra a medida que llega
+                    with st.chat_message("assistant"):
+                        st.write_stream(stream_chat(payload_init, data_init))
                     
-                    if init_res.status_code == 200:
-                        data_init = init_res.json()
+                    if data_init.get("type") == "done":
                         ai_msg = data_init["ai_response"]
                         # Guardamos la respuesta de GPT en el historial
                         st.session_state.messages.append({"role": "assistant", "content": ai_msg})
@@ -650,21 +709,19 @@ with tab4:
             with st.chat_message("user"):
                 st.markdown(user_input_chat)
             
-            with st.spinner("La IA está procesando tu mensaje..."):
-                # Continuar la conversación con el chatbot
-                payload_user = {
-                    "id_user": st.session_state.id_user,
-                    "id_meeting": st.session_state.id_meeting_chat,
-                    "user_response": user_input_chat
-                }
-                resp_user_chat = requests.post(f"{API_BASE_URL}/chat/conversation", json=payload_user)
+            # Continuar la conversación con el chatbot, mostrando los tokens según llegan
+            payload_user = {
+                "id_user": st.session_state.id_user,
+                "id_meeting": st.session_state.id_meeting_chat,
+                "user_response": user_input_chat
+            }
+            data_ai = {}
+            with st.chat_message("assistant"):
+                st.write_stream(stream_chat(payload_user, data_ai))
             
-            if resp_user_chat.status_code == 200:
-                data_ai = resp_user_chat.json()
+            if data_ai.get("type") == "done":
                 ai_msg = data_ai["ai_response"]
                 st.session_state.messages.append({"role": "assistant", "content": ai_msg})
-                with st.chat_message("assistant"):
-                    st.markdown(ai_msg)
                 
                 # Mostrar información de debug si está disponible
                 if "debug" in data_ai and data_ai["debug"]:
@@ -716,22 +773,12 @@ with tab5:
                 else:
                     data = resp.json()
                     st.session_state.user_id = data["id_user"]  # Guardar user_id en sesión
-                    all_meetings = data["meetings"]
                     
-                    # Filtrar reuniones con todas las preguntas respondidas
+                    # Reuniones con todas las preguntas respondidas (calculado en el backend)
                     completed_meetings = []
                     
                     with st.spinner("Buscando reuniones completas..."):
-                        for m in all_meetings:
-                            pending_resp = requests.post(
-                                f"{API_BASE_URL}/questions/pending",
-                                json={"id_user": st.session_state.user_id, "id_meeting": str(m["id_meeting"])}
-                            )
-                            
-                            if pending_resp.status_code == 200:
-                                questions = pending_resp.json().get("questions", [])
-                                if questions and all(q["answered"] for q in questions):
-                                    completed_meetings.append(m)
+                        completed_meetings = get_ready_meetings(st.session_state.user_id)
                     
                     if completed_meetings:
                         st.markdown('<div class="success-box">✅ Se encontraron reuniones que pueden ser analizadas.</div>', unsafe_allow_html=True)
@@ -763,11 +810,17 @@ with tab5:
             
             if analyze_button:
                 with st.spinner("🔄 Procesando análisis, por favor espera..."):
+                    # El análisis se encola en el backend y se consulta hasta que termina
                     payload = {"id_user": st.session_state.user_id, "id_meeting": meeting_to_analyze}
-                    analysis_resp = requests.post(f"{API_BASE_URL}/analysis/analyze", json=payload)
+                    job_resp = requests.post(f"{API_BASE_URL}/analysis/jobs", json=payload)
+                    job = job_resp.json() if job_resp.status_code == 200 else {"status": "failed"}
+                    while job.get("status") in ("queued", "running"):
+                        time.sleep(2)
+                        poll_resp = requests.get(f"{API_BASE_URL}/analysis/jobs/{job['id_job']}")
+                        job = poll_resp.json() if poll_resp.status_code == 200 else {"status": "failed"}
                 
-                if analysis_resp.status_code == 200:
-                    result_data = analysis_resp.json()
+                if job.get("status") == "done":
+                    result_data = job["result"]
                     
                     # Mostrar resultados con mejor diseño
                     st.markdown("### 📋 Resultados del análisis")
@@ -820,6 +873,8 @@ with tab5:
                     st.markdown(f"<p style='text-align: right; color: #666; font-size: 0.8rem;'>Análisis generado el {now}</p>", unsafe_allow_html=True)
                 else:
                     st.markdown('<div class="error-box">⚠️ No se pudo obtener el análisis de la reunión.</div>', unsafe_allow_html=True)
+                    if job.get("error"):
+                        st.error(str(job["error"]))
 
 # Footer
 current_year = datetime.now().year
@@ -10,6 +10,37 @@ import os
 #API_BASE_URL = "https://reunicheck2-app-48606537894.us-central1.run.app"
 API_BASE_URL = "https://reunicheck-backend-48606537894.us-central1.run.app"
 
+def get_all_pages(url, key, limit=500):
+    """
+    Recorre un listado de la API paginado por cursor (`next_cursor`) y devuelve todos
+    sus elementos `key`, o None si alguna página falla.
+    """
+    items, cursor = [], None
+    while True:
+        params = {"limit": limit, "cursor": cursor} if cursor else {"limit": limit}
+        resp = requests.get(url, params=params)
+        if resp.status_code != 200:
+            return None
+        data = resp.json()
+        items.extend(data.get(key, []))
+        cursor = data.get("next_cursor")
+        if not cursor:
+            return items
+
+def get_ready_meetings(id_user, limit=200):
+    """Todas las reuniones listas para analizar, pidiendo páginas (`offset`) hasta que `has_more` es falso."""
+    meetings, offset = [], 0
+    while True:
+        resp = requests.get(f"{API_BASE_URL}/analysis/ready/{id_user}", params={"limit": limit, "offset": offset})
+        if resp.status_code != 200:
+            return meetings
+        data = resp.json()
+        page = data.get("meetings", [])
+        meetings.extend(page)
+        if not data.get("has_more") or not page:
+            return meetings
+        offset += len(page)
+
 
 
 
@@ -61,22 +92,23 @@ with tab2:
     # Cargar lista de usuarios automáticamente
     #@st.cache_data(ttl=60)
     def load_users():
-        users_resp = requests.get(f"{API_BASE_URL}/questions/all_users")
-
-        print("DEBUG status code:", users_resp.status_code)
-        print("DEBUG headers:", users_resp.headers)
-        print("DEBUG text:", repr(users_resp.text))  # Mostrar contenido exacto de la respuesta
-
-        if users_resp.status_code == 200 and users_resp.text.strip():  # Asegurar que no está vacío
+        # El listado está paginado: se piden páginas hasta que no hay `next_cursor`
+        users, cursor = [], None
+        while True:
+            params = {"limit": 1000, "cursor": cursor} if cursor else {"limit": 1000}
+            users_resp = requests.get(f"{API_BASE_URL}/questions/all_users", params=params)
+            if users_resp.status_code != 200 or not users_resp.text.strip():
+                print("ERROR en la API: Código", users_resp.status_code, "Respuesta vacía")
+                return users
             try:
-                return users_resp.json().get("users", [])
+                data = users_resp.json()
             except requests.exceptions.JSONDecodeError as e:
                 print("ERROR decodificando JSON:", e)
-                return []
-        else:
-            print("ERROR en la API: Código", users_resp.status_code, "Respuesta vacía")
-            return []
-      #  return users_resp.json().get("users", []) if users_resp.status_code == 200 else []
+                return users
+            users.extend(data.get("users", []))
+            cursor = data.get("next_cursor")
+            if not cursor:
+                return users
 
     all_users = load_users()
     email_options = [u["email"] for u in all_users]
@@ -194,15 +226,9 @@ with tab4:
         else:
             data = resp.json()
             st.session_state.user_id = data["id_user"]  # Guardar user_id en sesión
-            all_meetings = data["meetings"]
 
-            # Filtrar reuniones con todas las preguntas respondidas
-            completed_meetings = [
-                m for m in all_meetings if all(q["answered"] for q in requests.post(
-                    f"{API_BASE_URL}/questions/pending",
-                    json={"id_user": st.session_state.user_id, "id_meeting": str(m["id_meeting"])}
-                ).json().get("questions", []))
-            ]
+            # Reuniones con todas las preguntas respondidas (calculado en el backend)
+            completed_meetings = get_ready_meetings(st.session_state.user_id)
 
             if completed_meetings:
                 st.success(f"Se encontraron {len(completed_meetings)} reuniones completadas.")
@@ -289,12 +315,9 @@ with tab5:
 
                 # 1.b) Llamar al endpoint que devuelve las reuniones con respuestas
                 url_meetings_responded = f"{API_BASE_URL}/answers/meetings_responded/{st.session_state.id_user}"
-                resp_meetings = requests.get(url_meetings_responded)
-
-                if resp_meetings.status_code == 200:
-                    data_meet = resp_meetings.json()
-                    meetings_responded = data_meet.get("meetings", [])
+                meetings_responded = get_all_pages(url_meetings_responded, "meetings")
 
+                if meetings_responded is not None:
                     if not meetings_responded:
                         st.info("No tienes reuniones con respuestas todavía.")
                         st.session_state.meeting_options_list = []
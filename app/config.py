@@ -9,3 +9,72 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
     raise ValueError("Faltan variables de entorno para Supabase")
+
+# Número máximo de participantes que se procesan en paralelo al crear una reunión
+MEETING_FANOUT_WORKERS = int(os.getenv("MEETING_FANOUT_WORKERS", "8"))
+
+# Tiempo de vida (segundos) de la caché email -> id_user
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))
+
+# Caché de preguntas generadas por tema (memoria LRU + TTL y, opcionalmente, SQLite)
+QUESTION_CACHE_SIZE = int(os.getenv("QUESTION_CACHE_SIZE", "256"))
+QUESTION_CACHE_TTL = int(os.getenv("QUESTION_CACHE_TTL", "86400"))
+QUESTION_CACHE_PATH = os.getenv("QUESTION_CACHE_PATH")  # Si no se define, solo se usa la memoria
+
+# Caché de respuestas de OpenAI (app/modules/llm_cache.py): memoria LRU + TTL y, opcionalmente,
+# SQLite. Por defecto solo se cachean las llamadas con temperatura <= LLM_CACHE_MAX_TEMPERATURE
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")  # Si no se define, solo se usa la memoria
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0"))
+
+# Registro del consumo de OpenAI en `openai_requests` (app/modules/llm_usage.py): filas por
+# inserción, segundos entre volcados y máximo de filas pendientes si Supabase no responde
+LLM_USAGE_BATCH_SIZE = int(os.getenv("LLM_USAGE_BATCH_SIZE", "50"))
+LLM_USAGE_FLUSH_INTERVAL = float(os.getenv("LLM_USAGE_FLUSH_INTERVAL", "5"))
+LLM_USAGE_MAX_BUFFER = int(os.getenv("LLM_USAGE_MAX_BUFFER", "5000"))
+
+# Cliente HTTP de OpenAI (conexión persistente, timeouts y reintentos)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+
+# Cliente de la API REST de Supabase (app/database/client.py): timeouts en segundos,
+# tamaño del pool de conexiones y reintentos
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20"))
+SUPABASE_MAX_RETRIES = int(os.getenv("SUPABASE_MAX_RETRIES", "2"))
+
+# Historial de conversaciones del chat: "memory", "sqlite" o "supabase"
+CHAT_HISTORY_BACKEND = os.getenv("CHAT_HISTORY_BACKEND", "memory")
+CHAT_HISTORY_MAX_SESSIONS = int(os.getenv("CHAT_HISTORY_MAX_SESSIONS", "1000"))
+CHAT_HISTORY_IDLE_TTL = int(os.getenv("CHAT_HISTORY_IDLE_TTL", "3600"))
+CHAT_HISTORY_SQLITE_PATH = os.getenv("CHAT_HISTORY_SQLITE_PATH", "chat_history.db")
+
+# Compactación del historial del chat: turnos recientes literales + resumen del resto
+CHAT_HISTORY_KEEP_TURNS = int(os.getenv("CHAT_HISTORY_KEEP_TURNS", "4"))
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "3000"))
+CHAT_SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", "gpt-3.5-turbo")
+
+# Rehidratación del historial desde `questions`/`answers` cuando una sesión no está
+# en memoria (reinicio u otra réplica) con el backend "memory". 0 la desactiva
+CHAT_HISTORY_REHYDRATE_TOKENS = int(os.getenv("CHAT_HISTORY_REHYDRATE_TOKENS", str(CHAT_HISTORY_TOKEN_BUDGET)))
+
+# Cola de trabajos de análisis: "memory" o "sqlite" (duradera)
+JOBS_BACKEND = os.getenv("JOBS_BACKEND", "memory")
+JOBS_SQLITE_PATH = os.getenv("JOBS_SQLITE_PATH", "jobs.db")
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+
+# Análisis por lotes (/analysis/batch): llamadas a GPT simultáneas y tamaño máximo del lote
+ANALYSIS_BATCH_CONCURRENCY = int(os.getenv("ANALYSIS_BATCH_CONCURRENCY", "4"))
+ANALYSIS_BATCH_MAX_MEETINGS = int(os.getenv("ANALYSIS_BATCH_MAX_MEETINGS", "100"))
+
+# Caché de lecturas de Supabase compartida por el proceso (0 = desactivada; la caché
+# por petición siempre está activa). TTL en segundos y tablas que se cachean.
+DB_CACHE_TTL = float(os.getenv("DB_CACHE_TTL", "0"))
+DB_CACHE_MAX_ENTRIES = int(os.getenv("DB_CACHE_MAX_ENTRIES", "1024"))
+DB_CACHE_TABLES = set(os.getenv("DB_CACHE_TABLES", "meetings,questions,answers").split(","))
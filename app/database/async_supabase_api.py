@@ -0,0 +1,76 @@
+from app.database import cache
+from app.database.client import get_async_client
+from app.database.supabase_api import ID_COLUMNS, apply_select_options, encode_cursor, ilike_any, keyset_columns, select_columns
+
+# Versión asíncrona de `supabase_api`, para los endpoints `async def`.
+# Usa el cliente asíncrono compartido de `app.database.client`.
+
+async def ainsert_data(table: str, data: dict):
+    """Insertar un registro en una tabla de Supabase."""
+    cache.invalidate(table)
+    return await get_async_client().from_(table).insert(data).execute()
+
+async def ainsert_many(table: str, rows: list, chunk_size: int = 500, id_column: str = None):
+    """Inserción multi-fila por bloques; devuelve los IDs generados en el orden de `rows`."""
+    if not rows:
+        return []
+    if chunk_size < 1:
+        raise ValueError("chunk_size debe ser mayor que 0")
+
+    cache.invalidate(table)
+    id_column = id_column or ID_COLUMNS.get(table)
+    ids = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        response = await get_async_client().from_(table).insert(chunk).execute()
+        data = response.data or []
+        if len(data) != len(chunk):
+            raise RuntimeError(
+                f"Inserción incompleta en '{table}': {len(data)} de {len(chunk)} filas"
+            )
+        ids.extend(row.get(id_column) if id_column else None for row in data)
+    return ids
+
+async def aupdate_data(table: str, filters: dict, updates: dict):
+    """Actualizar registros en una tabla de Supabase."""
+    cache.invalidate(table)
+    query = get_async_client().from_(table).update(updates)
+    for key, value in filters.items():
+        query = query.eq(key, value)
+    return await query.execute()
+
+async def acall_rpc(function: str, params: dict = None):
+    """Ejecuta una función SQL (RPC) de Supabase."""
+    return await get_async_client().rpc(function, params or {}).execute()
+
+async def aselect_data(table: str, filters: dict = None, limit: int = None, order_by: str = None, ascending: bool = True,
+                       columns="*", offset: int = None, after: str = None):
+    """Selecciona registros con filtros opcionales (listas -> `in_`), ordenamiento, límite y paginación (ver `select_data`)."""
+    key = cache.make_key(table, filters, limit, order_by, ascending, select_columns(columns), offset, after)
+    response = cache.get(key)
+    if response is None:
+        query = apply_select_options(
+            get_async_client().from_(table).select(select_columns(columns)),
+            table, filters, limit, order_by, ascending, offset, after
+        )
+        response = await query.execute()
+        cache.put(key, response)
+    return response
+
+async def aselect_ilike(table: str, column: str, values: list, columns="*"):
+    """Versión asíncrona de `select_ilike`."""
+    return await get_async_client().from_(table).select(select_columns(columns)).or_(ilike_any(column, values)).execute()
+
+async def aselect_pages(table: str, filters: dict = None, page_size: int = 500, order_by: str = "created_at",
+                        ascending: bool = True, columns="*"):
+    """Versión asíncrona de `select_pages` (generador asíncrono de páginas)."""
+    columns = keyset_columns(columns, order_by, table)
+    after = None
+    while True:
+        response = await aselect_data(table, filters, page_size, order_by, ascending, columns, after=after)
+        rows = response.data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        after = encode_cursor(rows[-1], order_by, table)
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app.config import DB_CACHE_TTL, DB_CACHE_MAX_ENTRIES, DB_CACHE_TABLES
+
+# Caché de lecturas de `select_data`/`aselect_data` en dos niveles:
+# 1. Mapa de identidad por petición HTTP (lo activa `RequestCacheMiddleware`):
+#    la misma consulta dentro de una petición se resuelve una sola vez.
+# 2. Opcional, compartida por el proceso con TTL corto (`DB_CACHE_TTL` > 0) para
+#    las tablas de `DB_CACHE_TABLES`.
+# Toda escritura (`insert_data`, `insert_many`, `update_data`, `delete_data` y
+# sus versiones asíncronas) invalida las entradas de su tabla en ambos niveles.
+# Las respuestas se comparten entre llamadores: no deben modificarse.
+
+_request_cache = ContextVar("request_cache", default=None)
+
+_process_cache = OrderedDict()  # key -> (expires_at, response)
+_process_lock = threading.Lock()
+
+_stats = {"request_hits": 0, "process_hits": 0, "misses": 0, "invalidations": 0}
+
+def make_key(table: str, *options) -> tuple:
+    """Clave de una consulta: tabla y opciones, con los filtros en forma hashable."""
+    frozen = []
+    for option in options:
+        if isinstance(option, dict):
+            option = tuple(sorted(
+                (key, tuple(value) if isinstance(value, list) else value)
+                for key, value in option.items()
+            ))
+        elif isinstance(option, list):
+            option = tuple(option)
+        frozen.append(option)
+    return (table, *frozen)
+
+def get(key: tuple):
+    """Respuesta guardada para `key`, o None."""
+    cache = _request_cache.get()
+    if cache is not None and key in cache:
+        _stats["request_hits"] += 1
+        return cache[key]
+
+    if DB_CACHE_TTL > 0 and key[0] in DB_CACHE_TABLES:
+        with _process_lock:
+            entry = _process_cache.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    _process_cache.move_to_end(key)
+                    _stats["process_hits"] += 1
+                    if cache is not None:
+                        cache[key] = entry[1]
+                    return entry[1]
+                del _process_cache[key]
+
+    _stats["misses"] += 1
+    return None
+
+def put(key: tuple, response):
+    cache = _request_cache.get()
+    if cache is not None:
+        cache[key] = response
+
+    if DB_CACHE_TTL > 0 and key[0] in DB_CACHE_TABLES:
+        with _process_lock:
+            _process_cache[key] = (time.monotonic() + DB_CACHE_TTL, response)
+            _process_cache.move_to_end(key)
+            while len(_process_cache) > DB_CACHE_MAX_ENTRIES:
+                _process_cache.popitem(last=False)
+
+def invalidate(table: str):
+    """Descarta las lecturas guardadas de `table` (se llama en cada escritura)."""
+    _stats["invalidations"] += 1
+    cache = _request_cache.get()
+    if cache is not None:
+        for key in [k for k in cache if k[0] == table]:
+            del cache[key]
+    with _process_lock:
+        for key in [k for k in _process_cache if k[0] == table]:
+            del _process_cache[key]
+
+def clear():
+    """Vacía la caché del proceso."""
+    with _process_lock:
+        _process_cache.clear()
+
+def get_cache_stats() -> dict:
+    return {**_stats, "process_entries": len(_process_cache), "ttl": DB_CACHE_TTL}
+
+@contextmanager
+def request_scope():
+    """Abre un mapa de identidad vacío (una petición HTTP, un trabajo en segundo plano...)."""
+    token = _request_cache.set({})
+    try:
+        yield
+    finally:
+        _request_cache.reset(token)
+
+class RequestCacheMiddleware:
+    """Middleware ASGI que abre un mapa de identidad vacío para cada petición HTTP."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        with request_scope():
+            await self.app(scope, receive, send)
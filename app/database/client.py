@@ -0,0 +1,176 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+
+import httpx
+from postgrest import AsyncPostgrestClient, SyncPostgrestClient
+
+from app.config import (
+    SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, SUPABASE_TIMEOUT, SUPABASE_CONNECT_TIMEOUT,
+    SUPABASE_MAX_CONNECTIONS, SUPABASE_MAX_RETRIES,
+)
+
+# Único punto de acceso HTTP a Supabase (API REST / PostgREST). Todos los módulos
+# de `app.database` piden aquí su cliente, así que el tamaño del pool, los
+# timeouts, la política de reintentos y las métricas se ajustan en un solo sitio.
+#
+# Reintentos:
+# - Errores de conexión: cualquier método (la petición no llegó a enviarse).
+# - 429/502/503/504 y timeouts de lectura: solo lecturas (GET/HEAD), porque
+#   repetir un POST/PATCH podría duplicar escrituras.
+
+RETRY_STATUS = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD"}
+BACKOFF_BASE = 0.2
+BACKOFF_MAX = 5.0
+
+# Métricas acumuladas de E/S con la base de datos (ver `get_db_stats`)
+_stats = {"requests": 0, "retries": 0, "errors": 0, "total_seconds": 0.0}
+_stats_lock = threading.Lock()
+
+def _record(elapsed: float, retries: int, failed: bool):
+    with _stats_lock:
+        _stats["requests"] += 1
+        _stats["retries"] += retries
+        _stats["errors"] += failed
+        _stats["total_seconds"] += elapsed
+
+def get_db_stats() -> dict:
+    """Peticiones, reintentos, errores y latencia media de las llamadas a Supabase."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["avg_ms"] = round(stats["total_seconds"] * 1000 / stats["requests"], 2) if stats["requests"] else None
+    stats["total_seconds"] = round(stats["total_seconds"], 3)
+    stats["max_connections"] = SUPABASE_MAX_CONNECTIONS
+    return stats
+
+def _backoff(attempt: int, retry_after=None) -> float:
+    """`Retry-After` si el servidor lo indica; si no, backoff exponencial con jitter."""
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+def _should_retry(request: httpx.Request, response=None, error=None) -> bool:
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    if request.method not in IDEMPOTENT_METHODS:
+        return False
+    if error is not None:
+        return isinstance(error, (httpx.ReadTimeout, httpx.RemoteProtocolError, httpx.ReadError))
+    return response.status_code in RETRY_STATUS
+
+class RetryTransport(httpx.BaseTransport):
+    """Transporte síncrono con reintentos y métricas sobre un `httpx.HTTPTransport` con pool."""
+
+    def __init__(self, max_retries: int = SUPABASE_MAX_RETRIES, **kwargs):
+        self.max_retries = max_retries
+        self._transport = httpx.HTTPTransport(**kwargs)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.TransportError as e:
+                if last_attempt or not _should_retry(request, error=e):
+                    _record(time.perf_counter() - start, attempt, True)
+                    raise
+                time.sleep(_backoff(attempt))
+                continue
+            if not last_attempt and _should_retry(request, response):
+                response.close()
+                time.sleep(_backoff(attempt, response.headers.get("retry-after")))
+                continue
+            _record(time.perf_counter() - start, attempt, response.status_code >= 400)
+            return response
+
+    def close(self):
+        self._transport.close()
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    """Versión asíncrona de `RetryTransport`."""
+
+    def __init__(self, max_retries: int = SUPABASE_MAX_RETRIES, **kwargs):
+        self.max_retries = max_retries
+        self._transport = httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError as e:
+                if last_attempt or not _should_retry(request, error=e):
+                    _record(time.perf_counter() - start, attempt, True)
+                    raise
+                await asyncio.sleep(_backoff(attempt))
+                continue
+            if not last_attempt and _should_retry(request, response):
+                await response.aclose()
+                await asyncio.sleep(_backoff(attempt, response.headers.get("retry-after")))
+                continue
+            _record(time.perf_counter() - start, attempt, response.status_code >= 400)
+            return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+def _rest_url() -> str:
+    return f"{SUPABASE_URL}/rest/v1"
+
+def _headers() -> dict:
+    return {
+        "apikey": SUPABASE_SERVICE_ROLE_KEY,
+        "Authorization": f"Bearer {SUPABASE_SERVICE_ROLE_KEY}",
+    }
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(SUPABASE_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT)
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=SUPABASE_MAX_CONNECTIONS, max_keepalive_connections=SUPABASE_MAX_CONNECTIONS)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> SyncPostgrestClient:
+    """Cliente síncrono compartido; se crea en la primera llamada."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = httpx.Client(
+                    base_url=_rest_url(),
+                    headers=_headers(),
+                    timeout=_timeout(),
+                    transport=RetryTransport(limits=_limits()),
+                    follow_redirects=True,
+                )
+                _client = SyncPostgrestClient(_rest_url(), headers=_headers(), http_client=http_client)
+    return _client
+
+# Un cliente asíncrono por event loop: el pool de httpx no puede compartirse entre loops
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_async_client() -> AsyncPostgrestClient:
+    """Cliente asíncrono compartido por el event loop actual; se crea en la primera llamada."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        http_client = httpx.AsyncClient(
+            base_url=_rest_url(),
+            headers=_headers(),
+            timeout=_timeout(),
+            transport=AsyncRetryTransport(limits=_limits()),
+            follow_redirects=True,
+        )
+        client = AsyncPostgrestClient(_rest_url(), headers=_headers(), http_client=http_client)
+        _async_clients[loop] = client
+    return client
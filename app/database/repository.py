@@ -0,0 +1,107 @@
+from dataclasses import dataclass, fields
+from typing import Optional
+
+from app.database.supabase_api import select_data
+from app.database.async_supabase_api import aselect_data
+
+# Registros tipados y compactos para las tablas que usan los routers.
+# Las clases usan `__slots__` (sin `__dict__` por instancia) y cada consulta
+# pide solo las columnas de su registro, en lugar de guardar diccionarios con
+# todas las columnas (ver benchmarks/repository_memory.py).
+
+@dataclass(slots=True)
+class Meeting:
+    id_meeting: int
+    topic: str
+    id_user: Optional[int] = None
+    state: Optional[bool] = None
+
+@dataclass(slots=True)
+class Question:
+    id_question: int
+    id_meeting: int
+    id_user: Optional[int]
+    content: str
+    created_at: Optional[str] = None
+
+@dataclass(slots=True)
+class Answer:
+    id_answer: int
+    id_question: Optional[int]
+    id_meeting: int
+    id_user: Optional[int]
+    content: str
+    created_at: Optional[str] = None
+
+@dataclass(slots=True)
+class User:
+    id_user: int
+    email: str
+    name: Optional[str] = None
+
+# Tabla y columnas de cada registro
+TABLES = {Meeting: "meetings", Question: "questions", Answer: "answers", User: "user"}
+COLUMNS = {cls: ",".join(f.name for f in fields(cls)) for cls in TABLES}
+
+def _records(cls, rows) -> list:
+    names = [f.name for f in fields(cls)]
+    return [cls(*(row.get(name) for name in names)) for row in rows or []]
+
+def _fetch(cls, filters: dict, **options) -> list:
+    return _records(cls, select_data(TABLES[cls], filters, columns=COLUMNS[cls], **options).data)
+
+async def _afetch(cls, filters: dict, **options) -> list:
+    return _records(cls, (await aselect_data(TABLES[cls], filters, columns=COLUMNS[cls], **options)).data)
+
+# Consultas por patrón de acceso (síncronas y asíncronas con prefijo `a`)
+
+def meetings_by_user(id_user) -> list:
+    """Reuniones asignadas al usuario."""
+    return _fetch(Meeting, {"id_user": id_user}, order_by="id_meeting")
+
+async def ameetings_by_user(id_user) -> list:
+    return await _afetch(Meeting, {"id_user": id_user}, order_by="id_meeting")
+
+def questions_for(id_meeting, id_user) -> list:
+    """Preguntas del usuario en la reunión, de la más antigua a la más reciente."""
+    return _fetch(Question, {"id_meeting": id_meeting, "id_user": id_user}, order_by="created_at")
+
+async def aquestions_for(id_meeting, id_user) -> list:
+    return await _afetch(Question, {"id_meeting": id_meeting, "id_user": id_user}, order_by="created_at")
+
+def recent_questions(id_meeting, id_user, limit: int = 10) -> list:
+    """Las `limit` preguntas más recientes del usuario en la reunión."""
+    return _fetch(
+        Question, {"id_meeting": id_meeting, "id_user": id_user},
+        order_by="created_at", ascending=False, limit=limit
+    )
+
+async def arecent_questions(id_meeting, id_user, limit: int = 10) -> list:
+    return await _afetch(
+        Question, {"id_meeting": id_meeting, "id_user": id_user},
+        order_by="created_at", ascending=False, limit=limit
+    )
+
+def answers_for(id_meeting, id_user, id_questions: list = None) -> list:
+    """Respuestas del usuario en la reunión (opcionalmente solo a `id_questions`)."""
+    filters = {"id_meeting": id_meeting, "id_user": id_user}
+    if id_questions is not None:
+        filters["id_question"] = id_questions
+    return _fetch(Answer, filters)
+
+async def aanswers_for(id_meeting, id_user, id_questions: list = None) -> list:
+    filters = {"id_meeting": id_meeting, "id_user": id_user}
+    if id_questions is not None:
+        filters["id_question"] = id_questions
+    return await _afetch(Answer, filters)
+
+def users_by_ids(id_users: list) -> list:
+    """Usuarios con los IDs indicados."""
+    return _fetch(User, {"id_user": id_users}) if id_users else []
+
+async def ausers_by_ids(id_users: list) -> list:
+    return await _afetch(User, {"id_user": id_users}) if id_users else []
+
+def answer_map(answers: list) -> dict:
+    """`id_question -> contenido` de las respuestas asociadas a una pregunta (la última gana)."""
+    return {a.id_question: a.content for a in answers if a.id_question}
@@ -1,44 +1,216 @@
-import os
-from dotenv import load_dotenv
-from supabase import create_client, Client
+import base64
+import json
 
-# Cargar variables de entorno
-load_dotenv()
+from postgrest import APIError, CountMethod
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+from app.database import cache
+from app.database.client import get_client
 
-if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
-    raise ValueError("Missing Supabase URL or Service Role Key in environment variables.")
-
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+# Operaciones síncronas sobre Supabase. Todas lanzan la excepción de la consulta
+# (`APIError` de PostgREST o un error de red) en lugar de devolverla.
+# Las lecturas pasan por `app.database.cache`; las escrituras la invalidan.
 
 def insert_data(table: str, data: dict):
     """Insertar un registro en una tabla de Supabase."""
-    return supabase.table(table).insert(data).execute()
+    cache.invalidate(table)
+    return get_client().from_(table).insert(data).execute()
+
+# Columna de clave primaria de cada tabla, para devolver los IDs generados
+ID_COLUMNS = {
+    "user": "id_user",
+    "meetings": "id_meeting",
+    "questions": "id_question",
+    "answers": "id_answer",
+}
+
+def insert_many(table: str, rows: list, chunk_size: int = 500, id_column: str = None):
+    """
+    Inserta varios registros con inserciones multi-fila (una petición por bloque).
+    Los lotes grandes se dividen en bloques de `chunk_size` filas.
+    Devuelve la lista de IDs generados en el mismo orden que `rows`.
+    """
+    if not rows:
+        return []
+    if chunk_size < 1:
+        raise ValueError("chunk_size debe ser mayor que 0")
+
+    cache.invalidate(table)
+    id_column = id_column or ID_COLUMNS.get(table)
+    ids = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        response = get_client().from_(table).insert(chunk).execute()
+        data = response.data or []
+        if len(data) != len(chunk):
+            raise RuntimeError(
+                f"Inserción incompleta en '{table}': {len(data)} de {len(chunk)} filas"
+            )
+        ids.extend(row.get(id_column) if id_column else None for row in data)
+    return ids
 
 def update_data(table: str, filters: dict, updates: dict):
     """Actualizar registros en una tabla de Supabase."""
-    query = supabase.table(table).update(updates)
+    cache.invalidate(table)
+    query = get_client().from_(table).update(updates)
+    for key, value in filters.items():
+        query = query.eq(key, value)
+    return query.execute()
+
+def delete_data(table: str, filters: dict):
+    """Eliminar registros de una tabla de Supabase."""
+    cache.invalidate(table)
+    query = get_client().from_(table).delete()
     for key, value in filters.items():
         query = query.eq(key, value)
     return query.execute()
 
-def select_data(table: str, filters: dict = None, limit: int = None, order_by: str = None, ascending: bool = True):
-    """Selecciona registros de una tabla de Supabase con filtros opcionales, ordenamiento y límite de resultados."""
-    query = supabase.table(table).select("*")
+def call_rpc(function: str, params: dict = None):
+    """Ejecuta una función SQL (RPC) de Supabase."""
+    return get_client().rpc(function, params or {}).execute()
+
+# Códigos de "la función no existe": PostgREST no la encuentra (PGRST202) o
+# Postgres no tiene esa firma (42883)
+MISSING_FUNCTION_CODES = {"PGRST202", "42883"}
+
+def is_missing_function(error: Exception) -> bool:
+    """
+    True si `error` indica que la función SQL (RPC) no está instalada. Solo en ese
+    caso se pasa a las consultas separadas: un timeout u otro error no significa
+    que falte la función (y la llamada pudo llegar a ejecutarse).
+    """
+    return isinstance(error, APIError) and error.code in MISSING_FUNCTION_CODES
+
+# Códigos de "la tabla no existe" (migración sin aplicar)
+MISSING_TABLE_CODES = {"PGRST205", "42P01"}
+
+def is_missing_table(error: Exception) -> bool:
+    """True si `error` indica que la tabla consultada no existe."""
+    return isinstance(error, APIError) and error.code in MISSING_TABLE_CODES
+
+def select_columns(columns) -> str:
+    return ",".join(columns) if isinstance(columns, (list, tuple)) else columns
+
+def encode_cursor(row: dict, order_by: str, table: str) -> str:
+    """Cursor opaco con la posición de `row` para la paginación por clave (keyset)."""
+    id_column = ID_COLUMNS.get(table)
+    position = [row.get(order_by), row.get(id_column) if id_column and id_column != order_by else None]
+    return base64.urlsafe_b64encode(json.dumps(position, default=str).encode("utf-8")).decode("ascii")
 
+def decode_cursor(cursor: str):
+    """Inverso de `encode_cursor`; lanza ValueError si el cursor no es válido."""
+    try:
+        value, id_value = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Cursor de paginación no válido")
+    return value, id_value
+
+def next_cursor(rows: list, limit: int, order_by: str, table: str):
+    """Cursor de la página siguiente, o None si `rows` es la última página."""
+    if not rows or not limit or len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1], order_by, table)
+
+def apply_select_options(query, table: str, filters: dict = None, limit: int = None, order_by: str = None,
+                         ascending: bool = True, offset: int = None, after: str = None):
+    """
+    Aplica filtros, orden, paginación por rango (`offset`) o por clave (`after`,
+    un cursor de `encode_cursor`) y límite. Común a `select_data` y `aselect_data`.
+    """
     if filters:
         for key, value in filters.items():
             query = query.eq(key, value) if not isinstance(value, list) else query.in_(key, value)
-    
+
+    id_column = ID_COLUMNS.get(table)
+    tie_breaker = id_column if order_by and id_column and id_column != order_by else None
+
+    if after:
+        if not order_by:
+            raise ValueError("La paginación por cursor necesita `order_by`")
+        value, id_value = decode_cursor(after)
+        op = "gt" if ascending else "lt"
+        if tie_breaker and id_value is not None:
+            # (order_by, id) > (valor, id): las filas con el mismo valor no se pierden ni se repiten
+            query = query.or_(
+                f'{order_by}.{op}."{value}",and({order_by}.eq."{value}",{tie_breaker}.{op}.{id_value})'
+            )
+        else:
+            query = getattr(query, op)(order_by, value)
+
     if order_by:
-        query = query.order(order_by, ascending=ascending)
+        query = query.order(order_by, desc=not ascending)
+        if tie_breaker:
+            query = query.order(tie_breaker, desc=not ascending)
 
-    if limit:
+    if offset:
+        # Paginación por rango: filas [offset, offset + limit)
+        query = query.range(offset, offset + limit - 1) if limit else query.offset(offset)
+    elif limit:
         query = query.limit(limit)
 
-    try:
-        return query.execute()
-    except Exception as e:
-        return {"error": str(e)}
+    return query
+
+def select_data(table: str, filters: dict = None, limit: int = None, order_by: str = None, ascending: bool = True,
+                columns="*", offset: int = None, after: str = None):
+    """
+    Selecciona registros de una tabla de Supabase con filtros opcionales, ordenamiento y límite de resultados.
+    `columns` limita las columnas devueltas (texto "a,b" o lista); `offset` pagina por rango y
+    `after` (cursor de `encode_cursor`) pagina por clave sobre `order_by`.
+    """
+    key = cache.make_key(table, filters, limit, order_by, ascending, select_columns(columns), offset, after)
+    response = cache.get(key)
+    if response is None:
+        query = apply_select_options(
+            get_client().from_(table).select(select_columns(columns)),
+            table, filters, limit, order_by, ascending, offset, after
+        )
+        response = query.execute()
+        cache.put(key, response)
+    return response
+
+def count_data(table: str, filters: dict = None) -> int:
+    """Número de filas que cumplen los filtros (sin caché: para comprobar si un dato ha cambiado)."""
+    query = get_client().from_(table).select("*", count=CountMethod.exact, head=True)
+    for key, value in (filters or {}).items():
+        query = query.eq(key, value) if not isinstance(value, list) else query.in_(key, value)
+    return query.execute().count or 0
+
+def ilike_any(column: str, values: list) -> str:
+    """
+    Filtro `or` de PostgREST: `column` coincide con alguno de `values` sin
+    distinguir mayúsculas. Los comodines de LIKE se escapan (coincidencia exacta).
+    """
+    conditions = []
+    for value in values:
+        pattern = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        quoted = pattern.replace("\\", "\\\\").replace('"', '\\"')
+        conditions.append(f'{column}.ilike."{quoted}"')
+    return ",".join(conditions)
+
+def select_ilike(table: str, column: str, values: list, columns="*"):
+    """Filas cuyo `column` coincide con alguno de `values` sin distinguir mayúsculas (sin caché)."""
+    return get_client().from_(table).select(select_columns(columns)).or_(ilike_any(column, values)).execute()
+
+def keyset_columns(columns, order_by: str, table: str):
+    """`columns` más las columnas que necesita el cursor (`order_by` y el id de la tabla)."""
+    names = [c.strip() for c in (columns.split(",") if isinstance(columns, str) else columns)]
+    if "*" in names:
+        return columns
+    return list(dict.fromkeys(names + [c for c in (order_by, ID_COLUMNS.get(table)) if c]))
+
+def select_pages(table: str, filters: dict = None, page_size: int = 500, order_by: str = "created_at",
+                 ascending: bool = True, columns="*"):
+    """
+    Generador que recorre una tabla página a página (paginación por clave), pidiendo
+    cada página solo cuando se consume la anterior. Las filas incluyen siempre las
+    columnas del cursor, aunque no estén en `columns`.
+    """
+    columns = keyset_columns(columns, order_by, table)
+    after = None
+    while True:
+        response = select_data(table, filters, page_size, order_by, ascending, columns, after=after)
+        rows = response.data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        after = encode_cursor(rows[-1], order_by, table)
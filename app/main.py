@@ -1,8 +1,20 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.routers import questions, chat, analysis, answers
+from app.database.cache import RequestCacheMiddleware, get_cache_stats
+from app.database.client import get_db_stats
+from app.modules.llm_cache import llm_cache
+from app.modules.llm_usage import UsageEndpointMiddleware, usage_recorder
 from starlette.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="ReuniCheck API", version="1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Colas de trabajos en segundo plano: workers y trabajos pendientes desde el arranque
+    await analysis.analysis_jobs.start()
+    yield
+    await analysis.analysis_jobs.stop()
+
+app = FastAPI(title="ReuniCheck API", version="1.0", lifespan=lifespan)
 print("hola print")
 # Incluir routers
 
@@ -14,6 +26,16 @@ app.include_router(analysis.router)
 @app.get("/")
 def root():
     return {"message": "Hola Mundooo"}
+
+@app.get("/metrics/db")
+def db_metrics():
+    """Peticiones, reintentos, errores y latencia media de las llamadas a Supabase, y aciertos de la caché."""
+    return {**get_db_stats(), "cache": get_cache_stats()}
+
+@app.get("/metrics/llm")
+def llm_metrics():
+    """Caché de respuestas de OpenAI y consumo (tokens, coste, latencia) por endpoint desde el arranque."""
+    return {"cache": llm_cache.stats(), "usage": usage_recorder.stats()}
 # CORS middleware example
 app.add_middleware(
     CORSMiddleware,
@@ -22,6 +44,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Caché de lecturas de la base de datos por petición (ver app/database/cache.py)
+app.add_middleware(RequestCacheMiddleware)
+# Endpoint de origen de cada llamada a OpenAI (ver app/modules/llm_usage.py)
+app.add_middleware(UsageEndpointMiddleware)
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8080)
@@ -23,6 +23,8 @@ class UserCreate(BaseModel):
 class MeetingCreate(BaseModel):
     topic: str = Field(..., min_length=3, description="Tema de la reunión")
     users: List[str] = Field(..., description="Lista de correos electrónicos de los participantes")
+    concurrent: bool = Field(default=True, description="Procesa a los participantes en paralelo")
+    per_user_questions: bool = Field(default=False, description="Genera preguntas distintas para cada participante en lugar de compartirlas por tema")
 
 # Esquema para devolver información de una reunión
 class Meeting(BaseModel):
@@ -47,11 +49,19 @@ class ChatResponse(BaseModel):
 class AnalysisRequest(BaseModel):
     id_user: str = Field(..., description="ID del usuario que solicita el análisis")
     id_meeting: str = Field(..., description="ID de la reunión a analizar")
+    force: bool = Field(default=False, description="Repite el análisis aunque no hayan cambiado preguntas ni respuestas")
 
 class AnalysisResponse(BaseModel):
     message: str = Field(..., description="Estado del análisis")
     conclusions: str = Field(..., description="Análisis de ChatGPT")
     is_meeting_needed: bool = Field(..., description="Indica si la reunión es necesaria")
+    cached: bool = Field(default=False, description="True si se devolvió un análisis guardado con el mismo contenido")
+
+class BatchAnalysisRequest(BaseModel):
+    id_user: str = Field(..., description="ID del usuario que solicita el análisis")
+    id_meetings: List[str] = Field(..., description="IDs de las reuniones a analizar")
+    force: bool = Field(default=False, description="Repite el análisis aunque no hayan cambiado preguntas ni respuestas")
+    concurrency: Optional[int] = Field(default=None, description="Análisis simultáneos (como máximo ANALYSIS_BATCH_CONCURRENCY)")
 
 class PendingQuestionsRequest(BaseModel):
     id_user: str
@@ -1,11 +1,19 @@
 # app/modules/analysis.py
+import asyncio
+import hashlib
 import os
 from datetime import datetime
 from dotenv import load_dotenv
 import json
+import re
 
 from langchain_openai import ChatOpenAI
-from app.database.supabase_api import insert_data, select_data
+from app.database.supabase_api import APIError, call_rpc, insert_data, is_missing_function, select_data
+from app.database.async_supabase_api import acall_rpc, ainsert_data, aselect_data
+from app.modules.context_builder import build_analysis_context
+from app.modules.llm_cache import install_langchain_cache
+from app.modules.llm_usage import usage_callback
+from app.modules.user_resolver import resolve_email
 
 def load_environment():
     """Carga las variables de entorno desde el archivo .env"""
@@ -18,20 +26,27 @@ def load_environment():
 # Cargar las variables
 load_environment()
 
-# Configuramos el modelo GPT-4
-chat = ChatOpenAI(model_name="gpt-4", temperature=0.5)
+# Configuramos el modelo GPT-4 (las respuestas pasan por la caché de `llm_cache`
+# y el consumo se registra con `llm_usage`)
+install_langchain_cache()
+chat = ChatOpenAI(model_name="gpt-4", temperature=0.5, callbacks=[usage_callback])
+
+# Versión del prompt de análisis: incrementarla al cambiar `_build_analysis_prompt`
+# invalida los resultados memorizados
+PROMPT_VERSION = "1"
+
+# Contadores de la memoización de análisis (ver `meeting_fingerprint`)
+analysis_cache_stats = {"hits": 0, "misses": 0, "forced": 0}
 
 def get_completed_meetings(email: str):
     """
     Obtiene las reuniones donde un usuario con 'email' ya respondió al menos una pregunta.
     (Opcionalmente puedes filtrar solo las completadas si lo deseas).
     """
-    user_data = select_data("user", {"email": email})
-    if not user_data.data:
+    user_id = resolve_email(email)
+    if user_id is None:
         return None
 
-    user_id = user_data.data[0]["id_user"]
-
     # Buscar answers por ese usuario
     answers_response = select_data("answers", {"id_user": user_id})
     if not answers_response.data:
@@ -45,61 +60,237 @@ def get_completed_meetings(email: str):
 
     return meetings_response.data
 
-def get_meeting_analysis(meeting_id: str) -> str:
+# Reuniones listas para analizar, calculadas en la base de datos
+# (sql/004_ready_meetings.sql); sin la función se calculan con tres consultas.
+READY_RPC = "ready_meetings"
+_ready_rpc_available = True
+
+async def aget_ready_meetings(id_user: str, limit: int = 50, offset: int = 0):
     """
-    Construye el contexto con:
-    - El tema de la reunión
-    - Las preguntas y sus respuestas
-    Retorna un texto largo (string) que se le pasará a GPT.
+    Reuniones del usuario en las que ha respondido todas sus preguntas.
+    Devuelve `(reuniones, total)`, con `reuniones` paginadas por `limit`/`offset`
+    y ordenadas de la más reciente a la más antigua.
     """
-    questions_response = select_data("questions", {"id_meeting": meeting_id})
-    answers_response   = select_data("answers",   {"id_meeting": meeting_id})
-    users_response     = select_data("user")
-    meeting_info       = select_data("meetings",  {"id_meeting": meeting_id}).data
+    global _ready_rpc_available
+    if _ready_rpc_available:
+        try:
+            response = await acall_rpc(READY_RPC, {"p_id_user": id_user, "p_limit": limit, "p_offset": offset})
+            rows = response.data or []
+            total = rows[0]["total_count"] if rows else 0
+            if not rows and offset:
+                # Página fuera de rango: el total se obtiene desde el principio
+                first = (await acall_rpc(READY_RPC, {"p_id_user": id_user, "p_limit": 1, "p_offset": 0})).data
+                total = first[0]["total_count"] if first else 0
+            return [{k: v for k, v in r.items() if k != "total_count"} for r in rows], total
+        except APIError as e:
+            if not is_missing_function(e):
+                raise
+            print(f"⚠️ RPC {READY_RPC} no disponible, se usan consultas separadas: {e}")
+            _ready_rpc_available = False
+
+    meetings_response, questions_response, answers_response = await asyncio.gather(
+        aselect_data("meetings",  {"id_user": id_user}),
+        aselect_data("questions", {"id_user": id_user}),
+        aselect_data("answers",   {"id_user": id_user}),
+    )
+    answered_ids = {a["id_question"] for a in answers_response.data or [] if a["id_question"]}
+    progress = {}
+    for q in questions_response.data or []:
+        counts = progress.setdefault(q["id_meeting"], [0, 0])
+        counts[0] += 1
+        counts[1] += q["id_question"] in answered_ids
+
+    ready = [
+        {
+            "id_meeting": m["id_meeting"],
+            "topic": m["topic"],
+            "total_questions": progress[m["id_meeting"]][0],
+            "answered_questions": progress[m["id_meeting"]][1],
+        }
+        for m in meetings_response.data or []
+        if m["id_meeting"] in progress and progress[m["id_meeting"]][0] == progress[m["id_meeting"]][1]
+    ]
+    ready.sort(key=lambda m: m["id_meeting"], reverse=True)
+    return ready[offset:offset + limit], len(ready)
+
+# Función SQL que devuelve reunión + preguntas + respuestas (con email) en una
+# sola llamada (sql/003_meeting_analysis_context.sql). Si no está instalada se
+# usan consultas dirigidas y no se vuelve a intentar; cualquier otro error se propaga.
+CONTEXT_RPC = "meeting_analysis_context"
+_context_rpc_available = True
+
+def _bundle_from_rpc(data) -> dict:
+    data = data or {}
+    return {
+        "meeting": data.get("meeting"),
+        "questions": data.get("questions") or [],
+        "answers": data.get("answers") or [],
+    }
+
+def _bundle_from_rows(meeting_rows, questions, answers, users) -> dict:
+    """Une las filas de las consultas separadas en el mismo formato que la RPC."""
+    user_map = {u["id_user"]: u["email"] for u in users} if users else {}
+    return {
+        "meeting": meeting_rows[0] if meeting_rows else None,
+        "questions": questions or [],
+        "answers": [{**a, "email": user_map.get(a["id_user"])} for a in answers or []],
+    }
+
+def _answer_user_ids(answers) -> list:
+    return list({a["id_user"] for a in answers or []})
+
+def fetch_meeting_bundle(meeting_id: str) -> dict:
+    """
+    Devuelve `{"meeting": fila o None, "questions": [...], "answers": [...]}`,
+    donde cada respuesta lleva el `email` de su autor.
+    """
+    global _context_rpc_available
+    if _context_rpc_available:
+        try:
+            return _bundle_from_rpc(call_rpc(CONTEXT_RPC, {"p_id_meeting": meeting_id}).data)
+        except APIError as e:
+            if not is_missing_function(e):
+                raise
+            print(f"⚠️ RPC {CONTEXT_RPC} no disponible, se usan consultas separadas: {e}")
+            _context_rpc_available = False
+
+    questions = select_data("questions", {"id_meeting": meeting_id}).data
+    answers   = select_data("answers",   {"id_meeting": meeting_id}).data
+    meeting   = select_data("meetings",  {"id_meeting": meeting_id}).data
+    # Solo los usuarios que respondieron, no la tabla entera
+    user_ids = _answer_user_ids(answers)
+    users = select_data("user", {"id_user": user_ids}).data if user_ids else []
+
+    return _bundle_from_rows(meeting, questions, answers, users)
+
+async def afetch_meeting_bundle(meeting_id: str) -> dict:
+    """Versión asíncrona de `fetch_meeting_bundle`."""
+    global _context_rpc_available
+    if _context_rpc_available:
+        try:
+            response = await acall_rpc(CONTEXT_RPC, {"p_id_meeting": meeting_id})
+            return _bundle_from_rpc(response.data)
+        except APIError as e:
+            if not is_missing_function(e):
+                raise
+            print(f"⚠️ RPC {CONTEXT_RPC} no disponible, se usan consultas separadas: {e}")
+            _context_rpc_available = False
+
+    questions_response, answers_response, meeting_response = await asyncio.gather(
+        aselect_data("questions", {"id_meeting": meeting_id}),
+        aselect_data("answers",   {"id_meeting": meeting_id}),
+        aselect_data("meetings",  {"id_meeting": meeting_id}),
+    )
+    user_ids = _answer_user_ids(answers_response.data)
+    users = (await aselect_data("user", {"id_user": user_ids})).data if user_ids else []
+
+    return _bundle_from_rows(meeting_response.data, questions_response.data, answers_response.data, users)
+
+async def afetch_meeting_bundles(meeting_ids: list) -> dict:
+    """
+    Igual que `afetch_meeting_bundle` para varias reuniones a la vez: una consulta
+    `in_` por tabla en lugar de una ronda por reunión.
+    Devuelve `{id_meeting (str): bundle}`; las reuniones inexistentes tienen `meeting=None`.
+    """
+    if not meeting_ids:
+        return {}
+
+    meetings_response, questions_response, answers_response = await asyncio.gather(
+        aselect_data("meetings",  {"id_meeting": meeting_ids}),
+        aselect_data("questions", {"id_meeting": meeting_ids}),
+        aselect_data("answers",   {"id_meeting": meeting_ids}),
+    )
+    answers = answers_response.data or []
+    user_ids = _answer_user_ids(answers)
+    users = (await aselect_data("user", {"id_user": user_ids})).data if user_ids else []
+
+    # Repartir las filas por reunión
+    rows = {str(m_id): ([], [], []) for m_id in meeting_ids}
+    for index, data in enumerate((meetings_response.data, questions_response.data, answers)):
+        for row in data or []:
+            key = str(row["id_meeting"])
+            if key in rows:
+                rows[key][index].append(row)
 
-    if (not questions_response.data or
-        not answers_response.data or
-        not meeting_info):
+    return {
+        key: _bundle_from_rows(meeting, questions, answers, users)
+        for key, (meeting, questions, answers) in rows.items()
+    }
+
+def format_meeting_context(bundle: dict) -> str:
+    """Arma el texto de contexto a partir del resultado de `fetch_meeting_bundle`."""
+    meeting_info = bundle["meeting"]
+    questions = bundle["questions"]
+    answers = bundle["answers"]
+    if not questions or not answers or not meeting_info:
         # Falta info o no hay nada
         return ""
 
-    topic = meeting_info[0]["topic"]
+    return build_analysis_context(meeting_info["topic"], questions, answers)
 
-    # Construimos el texto
-    context = f"""
-    Tema de la reunión: {topic}
-
-    Preguntas y respuestas de los asistentes:
+def get_meeting_analysis(meeting_id: str) -> str:
     """
+    Construye el contexto con:
+    - El tema de la reunión
+    - Las preguntas y sus respuestas
+    Retorna un texto largo (string) que se le pasará a GPT.
+    """
+    return format_meeting_context(fetch_meeting_bundle(meeting_id))
 
-    # Mapeo id_user -> email
-    user_map = {u["id_user"]: u["email"] for u in users_response.data} if users_response.data else {}
+async def aget_meeting_analysis(meeting_id: str) -> str:
+    """Versión asíncrona de `get_meeting_analysis`."""
+    return format_meeting_context(await afetch_meeting_bundle(meeting_id))
 
-    for q in questions_response.data:
-        context += f"\nPregunta: {q['content']}\n"
-        # Filtrar answers
-        q_answers = [a for a in answers_response.data if a["id_question"] == q["id_question"]]
-        if q_answers:
-            for ans in q_answers:
-                user_email = user_map.get(ans["id_user"], "Usuario desconocido")
-                context += f"Respuesta de {user_email}: {ans['content']}\n"
-        else:
-            context += "Sin respuesta registrada.\n"
+def meeting_fingerprint(topic: str, questions: list, answers: list) -> str:
+    """
+    Huella del contenido de una reunión: tema, preguntas, respuestas, modelo y versión del prompt.
+    Si no cambia, el análisis guardado en `results` sigue siendo válido.
+    """
+    payload = {
+        "topic": topic,
+        "questions": sorted([str(q["id_question"]), q["content"]] for q in questions or []),
+        "answers": sorted([str(a["id_question"]), str(a["id_user"]), a["content"]] for a in answers or []),
+        "model": chat.model_name,
+        "temperature": chat.temperature,
+        "prompt_version": PROMPT_VERSION,
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
-    return context
+async def afind_cached_result(meeting_id: str, fingerprint: str):
+    """Último análisis guardado en `results` con la misma huella, o None."""
+    response = await aselect_data(
+        "results",
+        {"id_meeting": meeting_id, "fingerprint": fingerprint},
+        order_by="created_at",
+        ascending=False,
+        limit=1
+    )
+    return response.data[0] if response.data else None
 
-def analyze_meeting(context: str, meeting_id: str):
+async def afind_cached_results(fingerprints: dict) -> dict:
     """
-    Llama a GPT-4 con 'context' para ver si la reunión es necesaria.
-    Guarda en 'results' la conclusión completa (campo 'conclusions') y un boolean en 'analysis'.
+    Versión por lotes de `afind_cached_result`: recibe `{id_meeting: huella}` y
+    devuelve `{id_meeting: último análisis guardado con esa huella}` en una consulta.
     """
-    if not context:
-        return {
-            "conclusions": "No hay suficiente información para analizar esta reunión.",
-            "analysis": False
-        }
+    if not fingerprints:
+        return {}
+
+    response = await aselect_data(
+        "results",
+        {"id_meeting": list(fingerprints), "fingerprint": list(fingerprints.values())},
+        order_by="created_at",
+        ascending=False
+    )
+    cached = {}
+    for row in response.data or []:
+        key = str(row["id_meeting"])
+        if key not in cached and fingerprints.get(key) == row.get("fingerprint"):
+            cached[key] = row
+    return cached
 
-    prompt = f"""
+def _build_analysis_prompt(context: str) -> str:
+    return f"""
     Eres un asistente especializado en optimización de reuniones.
     Se te proporciona el contexto de una reunión, incluyendo su tema, preguntas y respuestas de los participantes:
     {context}
@@ -117,33 +308,87 @@ def analyze_meeting(context: str, meeting_id: str):
     }}
     """
 
+_CODE_FENCE = re.compile(r"^```[a-zA-Z]*\s*(.*?)\s*```$", re.DOTALL)
 
-    response = chat.invoke(prompt)
+def _strip_code_fence(content: str) -> str:
+    """Quita el bloque ```json ... ``` con el que GPT suele envolver el JSON."""
+    content = (content or "").strip()
+    match = _CODE_FENCE.match(content)
+    return match.group(1) if match else content
 
+def _parse_analysis(content: str, meeting_id: str, fingerprint: str = None) -> dict:
+    """
+    Interpreta la respuesta de GPT y prepara la fila para `results`.
+    Si la respuesta no es JSON válido la fila se guarda sin huella, para que el
+    siguiente análisis de la reunión vuelva a llamar a GPT en lugar de reutilizar el error.
+    """
     try:
         # Intentar convertir la respuesta en JSON
-        response_json = json.loads(response.content)
+        response_json = json.loads(_strip_code_fence(content))
+        if not isinstance(response_json, dict):
+            raise ValueError("La respuesta no es un objeto JSON")
 
         # Extraer valores del JSON
         is_needed = response_json.get("is_meeting_needed", "No") == "Sí"  # Convertir "Sí"/"No" en True/False
         conclusions = response_json.get("conclusions", "No se pudo generar una conclusión.")
+        parsed = True
 
-    except json.JSONDecodeError:
+    except ValueError:  # incluye json.JSONDecodeError
         # Si hay un error en el formato JSON, asumimos que la reunión NO es necesaria
         is_needed = False
         conclusions = "Error en el análisis de la reunión. Intenta de nuevo."
+        parsed = False
 
-        # Guardar en DB
     result_data = {
         "id_meeting": meeting_id,
         "conclusions": conclusions,  # Guardamos la conclusión exacta
         "analysis": is_needed,  # Guardamos el booleano correcto
         "created_at": datetime.utcnow().isoformat(),
     }
+    if fingerprint and parsed:
+        result_data["fingerprint"] = fingerprint
+    return result_data
+
+NO_CONTEXT_RESULT = {
+    "conclusions": "No hay suficiente información para analizar esta reunión.",
+    "analysis": False
+}
+
+def analyze_meeting(context: str, meeting_id: str, fingerprint: str = None):
+    """
+    Llama a GPT-4 con 'context' para ver si la reunión es necesaria.
+    Guarda en 'results' la conclusión completa (campo 'conclusions'), un boolean en 'analysis'
+    y, si se indica, la huella del contenido analizado (campo 'fingerprint').
+    """
+    if not context:
+        return dict(NO_CONTEXT_RESULT)
+
+    response = chat.invoke(_build_analysis_prompt(context))
+
+    # Guardar en DB
+    result_data = _parse_analysis(response.content, meeting_id, fingerprint)
     insert_data("results", result_data)
 
     return {
-        "conclusions": conclusions,
-        "analysis": is_needed
+        "conclusions": result_data["conclusions"],
+        "analysis": result_data["analysis"]
     }
 
+async def aanalyze_meeting_row(context: str, meeting_id: str, fingerprint: str = None) -> dict:
+    """Llama a GPT y devuelve la fila para `results` sin guardarla (para inserciones por lotes)."""
+    response = await chat.ainvoke(_build_analysis_prompt(context))
+    return _parse_analysis(response.content, meeting_id, fingerprint)
+
+async def aanalyze_meeting(context: str, meeting_id: str, fingerprint: str = None):
+    """Versión asíncrona de `analyze_meeting` (usa `ainvoke` y escritura asíncrona)."""
+    if not context:
+        return dict(NO_CONTEXT_RESULT)
+
+    # Guardar en DB
+    result_data = await aanalyze_meeting_row(context, meeting_id, fingerprint)
+    await ainsert_data("results", result_data)
+
+    return {
+        "conclusions": result_data["conclusions"],
+        "analysis": result_data["analysis"]
+    }
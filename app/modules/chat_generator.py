@@ -3,15 +3,25 @@
 
 from app.database.supabase_api import insert_data, select_data
 from langchain_openai import ChatOpenAI
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.runnables import RunnableWithMessageHistory
+from langchain_core.chat_history import BaseChatMessageHistory
+from app.modules.chat_history import build_history_store, session_id_for
+from app.modules.history_compaction import HistoryCompactor
+from app.modules.llm_cache import install_langchain_cache
+from app.modules.llm_usage import usage_callback
+from app.config import CHAT_HISTORY_KEEP_TURNS, CHAT_HISTORY_TOKEN_BUDGET, CHAT_SUMMARY_MODEL
+from langchain_core.runnables import RunnableLambda, RunnableWithMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 
 import os
 
+# Caché de respuestas compartida (solo las llamadas deterministas, p. ej. los resúmenes);
+# el consumo de cada llamada se registra con `usage_callback` (con `stream_usage`
+# también en /chat/conversation/stream)
+install_langchain_cache()
+
 # Configurar modelo de chat (GPT-4)
-chat = ChatOpenAI(model_name="gpt-4", temperature=0.7)
+chat = ChatOpenAI(model_name="gpt-4", temperature=0.7, stream_usage=True, callbacks=[usage_callback])
 
 # Configurar prompt con memoria
 prompt = ChatPromptTemplate.from_messages([
@@ -22,15 +32,15 @@ prompt = ChatPromptTemplate.from_messages([
 
 # Configurar la cadena de conversación con historial
 chain = prompt | chat
-session_histories = {}
+
+# Historiales por sesión: LRU acotado en memoria, con persistencia opcional (CHAT_HISTORY_BACKEND)
+history_store = build_history_store()
 
 # Obtener historial de conversación por usuario
-def get_session_history(session_id: str) -> ChatMessageHistory:
-    if session_id not in session_histories:
-        session_histories[session_id] = ChatMessageHistory()
-    return session_histories[session_id]
+def get_session_history(session_id: str) -> BaseChatMessageHistory:
+    return history_store.get(session_id)
 
-chat = ChatOpenAI(model_name="gpt-4", temperature=0.7)
+chat = ChatOpenAI(model_name="gpt-4", temperature=0.7, stream_usage=True, callbacks=[usage_callback])
 
 prompt = ChatPromptTemplate.from_messages([
     ("system", """Eres un asistente especializado en optimización de reuniones.
@@ -42,7 +52,16 @@ realmente falte contexto. Sigue el hilo usando la memoria."""),
     ("human", "{input}"),
 ])
 
-chain = prompt | chat
+# Compactación del historial antes de cada llamada: últimos turnos literales,
+# resumen incremental del resto y presupuesto de tokens por llamada
+compactor = HistoryCompactor(
+    ChatOpenAI(model_name=CHAT_SUMMARY_MODEL, temperature=0, callbacks=[usage_callback]),
+    history_store,
+    keep_turns=CHAT_HISTORY_KEEP_TURNS,
+    max_tokens=CHAT_HISTORY_TOKEN_BUDGET,
+)
+
+chain = RunnableLambda(compactor.compact_inputs, afunc=compactor.acompact_inputs) | prompt | chat
 
 conversation = RunnableWithMessageHistory(
     chain,
@@ -118,7 +137,7 @@ def chatbot_with_gpt():
     print("\n🤖 Chatbot Iniciado...")
     print(f"Eres un asistente de reuniones. Este es el usuario {email}, tiene una reunión sobre '{topic}'.\n")
 
-    session_id = f"user_{user_id}_meeting_{meeting_id}"  # ID de sesión único
+    session_id = session_id_for(user_id, meeting_id)  # ID de sesión único
     responses = []
 
     for q in questions:
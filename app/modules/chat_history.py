@@ -0,0 +1,352 @@
+# app/modules/chat_history.py
+import asyncio
+import heapq
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage, messages_from_dict, messages_to_dict
+
+from app.database.supabase_api import (
+    APIError, call_rpc, count_data, delete_data, insert_many, is_missing_function, select_data, select_pages,
+)
+from app.modules.history_compaction import count_tokens
+from app.config import (
+    CHAT_HISTORY_BACKEND, CHAT_HISTORY_MAX_SESSIONS,
+    CHAT_HISTORY_IDLE_TTL, CHAT_HISTORY_SQLITE_PATH, CHAT_HISTORY_REHYDRATE_TOKENS,
+)
+
+_SESSION_ID = re.compile(r"^user_(?P<id_user>.+)_meeting_(?P<id_meeting>[^_]+)$")
+
+def session_id_for(id_user, id_meeting) -> str:
+    """`session_id` del chat de un usuario en una reunión."""
+    return f"user_{id_user}_meeting_{id_meeting}"
+
+def parse_session_id(session_id: str):
+    """Inverso de `session_id_for`: (id_user, id_meeting), o None si no tiene ese formato."""
+    match = _SESSION_ID.match(session_id)
+    return (match["id_user"], match["id_meeting"]) if match else None
+
+class SQLiteHistoryBackend:
+    """
+    Persistencia local de los mensajes en un fichero SQLite. El orden lo da el id
+    autoincremental, así que varios procesos pueden compartir el fichero sin pisarse.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chat_messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, message TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chat_messages_session_idx ON chat_messages (session_id, id)")
+        self._db.commit()
+
+    def load(self, session_id: str) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT message FROM chat_messages WHERE session_id = ? ORDER BY id",
+                (session_id,),
+            ).fetchall()
+        return messages_from_dict([json.loads(row[0]) for row in rows])
+
+    def count(self, session_id: str) -> int:
+        with self._lock:
+            row = self._db.execute("SELECT COUNT(*) FROM chat_messages WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0]
+
+    def append(self, session_id: str, messages: list):
+        rows = [(session_id, json.dumps(message)) for message in messages_to_dict(messages)]
+        with self._lock:
+            self._db.executemany("INSERT INTO chat_messages (session_id, message) VALUES (?, ?)", rows)
+            self._db.commit()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+            self._db.commit()
+
+class SupabaseHistoryBackend:
+    """
+    Persistencia en la tabla `chat_messages` de Supabase (ver sql/001_chat_messages.sql).
+    El orden lo da `id_message`, asignado por la base de datos.
+    """
+
+    table = "chat_messages"
+
+    def load(self, session_id: str) -> list:
+        response = select_data(self.table, {"session_id": session_id}, order_by="id_message")
+        return messages_from_dict([row["message"] for row in response.data or []])
+
+    def count(self, session_id: str) -> int:
+        return count_data(self.table, {"session_id": session_id})
+
+    def append(self, session_id: str, messages: list):
+        insert_many(self.table, [
+            {"session_id": session_id, "message": message}
+            for message in messages_to_dict(messages)
+        ], id_column="id_message")
+
+    def delete(self, session_id: str):
+        delete_data(self.table, {"session_id": session_id})
+
+def _transcript_key(row: dict) -> tuple:
+    """Clave de orden cronológico de un mensaje de la conversación: (created_at, rol, id)."""
+    return row["created_at"] or "", row["role"] == "ai", row.get("id_question") or row.get("id_answer") or 0
+
+class TranscriptRehydrator:
+    """
+    Reconstruye el historial de una sesión a partir de las filas ya guardadas:
+    las preguntas de `questions` son mensajes de GPT y las respuestas de `answers`
+    mensajes del usuario. Lee de la más reciente a la más antigua, por páginas
+    (paginación por clave), y se detiene al llenar `max_tokens`: así la memoria
+    sobrevive a un reinicio sin reenviar el contexto completo de la reunión.
+    """
+
+    rpc = "chat_transcript"  # sql/008_chat_transcript.sql
+
+    def __init__(self, max_tokens: int, page_size: int = 50):
+        self.max_tokens = max_tokens
+        self.page_size = page_size
+        self._rpc_available = True
+
+    def load(self, session_id: str) -> list:
+        keys = parse_session_id(session_id)
+        if keys is None:
+            return []
+        id_user, id_meeting = keys
+
+        messages, tokens = [], 0
+        try:
+            for row in self._rows(id_user, id_meeting):
+                tokens += count_tokens(row["content"] or "") + 4
+                if tokens > self.max_tokens:
+                    break
+                message_class = AIMessage if row["role"] == "ai" else HumanMessage
+                messages.append(message_class(content=row["content"] or ""))
+        except Exception as e:
+            # La memoria es una ayuda: sin ella la conversación sigue desde cero
+            print(f"⚠️ No se pudo rehidratar el historial de {session_id}: {e}")
+            return []
+        messages.reverse()
+        return messages
+
+    def _rows(self, id_user, id_meeting):
+        """Filas `{role, content, created_at}` de la más reciente a la más antigua, página a página."""
+        if self._rpc_available:
+            try:
+                yield from self._rpc_rows(id_user, id_meeting)
+                return
+            except APIError as e:
+                # Otros errores llegan a `load`, que sigue sin memoria en esa petición
+                if not is_missing_function(e):
+                    raise
+                print(f"⚠️ RPC {self.rpc} no disponible, se usan consultas separadas: {e}")
+                self._rpc_available = False
+
+        # Sin la RPC: las dos tablas en orden descendente, mezcladas de forma perezosa
+        filters = {"id_meeting": id_meeting, "id_user": id_user}
+        columns = {"questions": "id_question,content,created_at", "answers": "id_answer,content,created_at"}
+
+        def table_rows(table: str, role: str):
+            for page in select_pages(table, filters, self.page_size, "created_at", False, columns[table]):
+                for row in page:
+                    yield {**row, "role": role}
+
+        # Mismo orden que la RPC: a igual `created_at`, la respuesta antes que la pregunta
+        yield from heapq.merge(
+            table_rows("questions", "ai"), table_rows("answers", "human"),
+            key=_transcript_key, reverse=True,
+        )
+
+    def _rpc_rows(self, id_user, id_meeting):
+        params = {"p_id_meeting": id_meeting, "p_id_user": id_user, "p_limit": self.page_size}
+        while True:
+            rows = call_rpc(self.rpc, params).data or []
+            yield from rows
+            if len(rows) < self.page_size:
+                return
+            last = rows[-1]
+            params = {**params, "p_before": last["created_at"], "p_before_role": last["role"], "p_before_id": last["id"]}
+
+class StoredChatMessageHistory(BaseChatMessageHistory):
+    """
+    Historial en memoria de una sesión que escribe cada mensaje nuevo en el backend.
+    También guarda el estado de la compactación (ver `history_compaction`): el resumen
+    de los mensajes anteriores a `summarized_upto` y el último informe de tokens,
+    y la pregunta abierta del chat (`open_question`, ver `chat_turn`).
+    """
+
+    def __init__(self, session_id: str, messages: list = None, backend=None):
+        self.session_id = session_id
+        self.messages = list(messages or [])
+        self.summary = ""
+        self.summarized_upto = 0
+        self.compaction = None
+        self.open_question = None
+        self.open_question_loaded = False
+        self._backend = backend
+
+    def add_messages(self, messages) -> None:
+        messages = list(messages)
+        self.messages.extend(messages)
+        if self._backend is not None:
+            self._backend.append(self.session_id, messages)
+
+    def clear(self) -> None:
+        self.messages = []
+        self.summary = ""
+        self.summarized_upto = 0
+        if self._backend is not None:
+            self._backend.delete(self.session_id)
+
+class ChatHistoryStore:
+    """
+    Historiales de chat por `session_id` en una caché LRU acotada a `max_sessions`,
+    con expulsión de las sesiones inactivas más de `idle_ttl` segundos.
+    Con un `backend` duradero, una sesión expulsada (o perdida tras un reinicio
+    o en otra réplica) se reconstruye de forma perezosa en el primer acceso.
+    Sin backend, `rehydrator` (p. ej. `TranscriptRehydrator`) la reconstruye desde
+    las preguntas y respuestas guardadas.
+    """
+
+    def __init__(self, backend=None, max_sessions: int = 1000, idle_ttl: int = 3600, rehydrator=None):
+        self.backend = backend
+        self.rehydrator = rehydrator
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()  # session_id -> (último acceso, historial)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._loads = 0
+        self._rehydrations = 0
+        self._reloads = 0
+        self._evictions = 0
+
+    def _cached(self, session_id: str, now: float):
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._hits += 1
+            history = entry[1]
+            self._sessions[session_id] = (now, history)
+            self._sessions.move_to_end(session_id)
+            return history
+
+    async def aget(self, session_id: str, refresh: bool = False) -> StoredChatMessageHistory:
+        """
+        Versión asíncrona de `get`: si la sesión no está en memoria, la reconstrucción
+        (consultas síncronas al backend o al rehidratador) se hace en un hilo para no
+        bloquear el bucle de eventos. Las rutas `async` la llaman antes de invocar la
+        cadena, de modo que el `get` síncrono de LangChain encuentra la sesión en memoria.
+        Con `refresh=True` se comprueba además que la copia en memoria no se haya
+        quedado atrás respecto al backend (ver `refresh`).
+        """
+        history = self._cached(session_id, time.monotonic())
+        if history is None:
+            return await asyncio.to_thread(self.get, session_id)
+        if refresh and self.backend is not None:
+            await asyncio.to_thread(self.refresh, history)
+        return history
+
+    def refresh(self, history: StoredChatMessageHistory):
+        """
+        Recarga la sesión si el backend tiene otro número de mensajes que la copia en
+        memoria: con un backend compartido, otro proceso pudo añadir mensajes a la sesión.
+        """
+        if self.backend is None or self.backend.count(history.session_id) == len(history.messages):
+            return
+        history.messages = self.backend.load(history.session_id)
+        # El puntero a la pregunta abierta pudo moverse en el otro proceso
+        history.open_question, history.open_question_loaded = None, False
+        with self._lock:
+            self._reloads += 1
+
+    def get(self, session_id: str) -> StoredChatMessageHistory:
+        now = time.monotonic()
+        history = self._cached(session_id, now)
+        if history is not None:
+            return history
+
+        # Reconstrucción fuera del lock: puede implicar una consulta al backend
+        rehydrated = False
+        if self.backend is not None:
+            messages = self.backend.load(session_id)
+        elif self.rehydrator is not None:
+            messages = self.rehydrator.load(session_id)
+            rehydrated = bool(messages)
+        else:
+            messages = []
+        history = StoredChatMessageHistory(session_id, messages, self.backend)
+        with self._lock:
+            # Otra petición pudo cargarla mientras tanto
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                history = entry[1]
+            else:
+                self._loads += 1
+                self._rehydrations += rehydrated
+            self._sessions[session_id] = (now, history)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._evictions += 1
+        return history
+
+    def evict(self, session_id: str):
+        """Saca una sesión de memoria (sin borrarla del backend)."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _evict_idle(self, now: float):
+        # Las sesiones están ordenadas por último acceso: basta con mirar las primeras
+        while self._sessions:
+            session_id, (last_access, _) = next(iter(self._sessions.items()))
+            if now - last_access <= self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+            self._evictions += 1
+
+    def stats(self) -> dict:
+        """Métricas de uso: sesiones y mensajes en memoria y tamaño aproximado en bytes."""
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            histories = [history for _, history in self._sessions.values()]
+            stats = {
+                "backend": type(self.backend).__name__ if self.backend is not None else "memory",
+                "sessions": len(histories),
+                "max_sessions": self.max_sessions,
+                "idle_ttl": self.idle_ttl,
+                "hits": self._hits,
+                "loads": self._loads,
+                "rehydrations": self._rehydrations,
+                "reloads": self._reloads,
+                "evictions": self._evictions,
+            }
+        messages = [m for history in histories for m in history.messages]
+        stats["messages"] = len(messages)
+        stats["memory_bytes"] = sum(sys.getsizeof(m.content) for m in messages) + sum(
+            sys.getsizeof(history.messages) for history in histories
+        )
+        return stats
+
+def build_history_store() -> ChatHistoryStore:
+    """Crea el almacén según `CHAT_HISTORY_BACKEND`."""
+    if CHAT_HISTORY_BACKEND == "sqlite":
+        backend = SQLiteHistoryBackend(CHAT_HISTORY_SQLITE_PATH)
+    elif CHAT_HISTORY_BACKEND == "supabase":
+        backend = SupabaseHistoryBackend()
+    elif CHAT_HISTORY_BACKEND == "memory":
+        backend = None
+    else:
+        raise ValueError(f"CHAT_HISTORY_BACKEND no válido: {CHAT_HISTORY_BACKEND}")
+    rehydrator = TranscriptRehydrator(CHAT_HISTORY_REHYDRATE_TOKENS) if CHAT_HISTORY_REHYDRATE_TOKENS > 0 else None
+    return ChatHistoryStore(backend, CHAT_HISTORY_MAX_SESSIONS, CHAT_HISTORY_IDLE_TTL, rehydrator)
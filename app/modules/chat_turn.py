@@ -0,0 +1,107 @@
+# app/modules/chat_turn.py
+import asyncio
+from typing import Optional
+
+from app.database import cache, repository
+from app.database.async_supabase_api import acall_rpc, ainsert_data
+from app.database.supabase_api import APIError, is_missing_function
+from app.modules.progress import arecord_answer, arecord_questions
+
+# Escritura de un turno de /chat/conversation: respuesta del usuario a la pregunta
+# abierta + respuesta de GPT como nueva pregunta + contadores de progreso.
+# Con la RPC `commit_chat_turn` (sql/006 y sql/007) es una sola llamada y una sola
+# transacción; si la función no existe se usa `_acommit_turn_local`, que hace lo
+# mismo con consultas separadas (sin atomicidad). Cualquier otro error de la RPC
+# (p. ej. un timeout, tras el cual el turno puede estar ya guardado) se propaga:
+# repetir el turno por la vía local lo duplicaría.
+#
+# La pregunta abierta es un puntero que se mueve en cada turno, así que
+# encontrarla no depende de la longitud de la conversación: en la RPC es la
+# columna `meeting_progress.open_question_id`; en la versión local se guarda en
+# la sesión del chat (`StoredChatMessageHistory.open_question`).
+COMMIT_RPC = "commit_chat_turn"
+_commit_rpc_available = True
+
+async def acommit_turn(id_meeting, id_user, answer: Optional[str], question: str, session=None) -> dict:
+    """
+    Guarda el turno y devuelve `id_answer`, `id_question` (la pregunta respondida),
+    `new_id_question` y `selected_question` (para el debug). Con `answer=None`
+    (inicio automático) solo guarda la pregunta. `session` es el historial del chat,
+    donde la versión local guarda el puntero a la pregunta abierta.
+    """
+    global _commit_rpc_available
+    if _commit_rpc_available:
+        try:
+            response = await acall_rpc(COMMIT_RPC, {
+                "p_id_meeting": id_meeting,
+                "p_id_user": id_user,
+                "p_answer": answer,
+                "p_question": question,
+            })
+            for table in ("answers", "questions", "meeting_progress"):
+                cache.invalidate(table)
+            return response.data
+        except APIError as e:
+            if not is_missing_function(e):
+                raise
+            print(f"⚠️ RPC {COMMIT_RPC} no disponible, se usan consultas separadas: {e}")
+            _commit_rpc_available = False
+
+    return await _acommit_turn_local(id_meeting, id_user, answer, question, session)
+
+async def _aload_open_question(id_meeting, id_user):
+    """Pregunta más reciente sin respuesta entre las 10 últimas (valor inicial del puntero)."""
+    questions, answers = await asyncio.gather(
+        repository.arecent_questions(id_meeting, id_user, limit=10),
+        repository.aanswers_for(id_meeting, id_user),
+    )
+    answered_question_ids = {a.id_question for a in answers if a.id_question}
+    return next((q for q in questions if q.id_question not in answered_question_ids), None)
+
+async def _acommit_turn_local(id_meeting, id_user, answer: Optional[str], question: str, session=None) -> dict:
+    """Misma semántica que la RPC `commit_chat_turn` con consultas separadas."""
+    result = {"id_answer": None, "id_question": None, "new_id_question": None, "selected_question": None}
+
+    if answer is not None:
+        # Solo la primera vez que se usa la sesión (o sin sesión) se busca la pregunta abierta
+        if session is not None and session.open_question_loaded:
+            open_question = session.open_question
+        else:
+            open_question = await _aload_open_question(id_meeting, id_user)
+
+        if open_question is not None:
+            result["id_question"] = open_question.id_question
+            result["selected_question"] = {
+                "id": open_question.id_question,
+                "content": open_question.content,
+                "created_at": open_question.created_at,
+            }
+
+        answer_resp = await ainsert_data("answers", {
+            "id_question": result["id_question"],
+            "id_user": id_user,
+            "id_meeting": id_meeting,
+            "content": answer,
+        })
+        if answer_resp.data:
+            result["id_answer"] = answer_resp.data[0].get("id_answer")
+        await arecord_answer(id_meeting, id_user, result["id_question"])
+
+    question_resp = await ainsert_data("questions", {
+        "id_meeting": id_meeting,
+        "id_user": id_user,
+        "content": question,
+    })
+    new_question = None
+    if question_resp.data:
+        row = question_resp.data[0]
+        result["new_id_question"] = row.get("id_question")
+        new_question = repository.Question(row.get("id_question"), id_meeting, id_user, question, row.get("created_at"))
+    await arecord_questions(id_meeting, id_user)
+
+    # La nueva pregunta de GPT pasa a ser la pregunta abierta
+    if session is not None:
+        session.open_question = new_question
+        session.open_question_loaded = True
+
+    return result
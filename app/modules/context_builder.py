@@ -0,0 +1,60 @@
+# app/modules/context_builder.py
+from collections import defaultdict
+
+# Construcción de los textos de contexto que se pasan a GPT (análisis y chat).
+# Las respuestas se agrupan una sola vez por pregunta y el texto se arma en una
+# lista de fragmentos unida al final, en lugar de recorrer todas las respuestas
+# por cada pregunta y concatenar con `+=`.
+
+def group_answers(answers) -> dict:
+    """Agrupa las respuestas por `id_question` conservando su orden original."""
+    grouped = defaultdict(list)
+    for answer in answers or []:
+        grouped[answer["id_question"]].append(answer)
+    return grouped
+
+def build_analysis_context(topic: str, questions, answers) -> str:
+    """
+    Texto para el análisis de una reunión: cada pregunta con las respuestas de
+    todos los asistentes. Cada respuesta puede traer el `email` de su autor.
+    """
+    grouped = group_answers(answers)
+    parts = [f"""
+    Tema de la reunión: {topic}
+
+    Preguntas y respuestas de los asistentes:
+    """]
+
+    for q in questions or []:
+        parts.append(f"\nPregunta: {q['content']}\n")
+        q_answers = grouped.get(q["id_question"])
+        if q_answers:
+            for ans in q_answers:
+                user_email = ans.get("email") or "Usuario desconocido"
+                parts.append(f"Respuesta de {user_email}: {ans['content']}\n")
+        else:
+            parts.append("Sin respuesta registrada.\n")
+
+    return "".join(parts)
+
+def build_chat_context(topic: str, questions, answers) -> str:
+    """Texto para el chat: las preguntas oficiales de un usuario con sus respuestas numeradas."""
+    grouped = group_answers(answers)
+    parts = [f"=== CONTEXTO DE LA REUNIÓN ===\nTema: {topic}\n\n"]
+
+    for q in questions or []:
+        parts.append(f"Pregunta: {q['content']}\n")
+        q_answers = grouped.get(q["id_question"])
+        if q_answers:
+            for idx, ans in enumerate(q_answers, start=1):
+                parts.append(f"   Respuesta #{idx}: {ans['content']}\n")
+        else:
+            parts.append("   (Sin respuesta)\n")
+        parts.append("\n")
+
+    parts.append(
+        "=== FIN DEL CONTEXTO ===\n\n"
+        "Basándote en este contexto, profundiza en posibles inconsistencias, mejoras, "
+        "o información adicional que el usuario podría aportar.\n"
+    )
+    return "".join(parts)
@@ -0,0 +1,147 @@
+# app/modules/history_compaction.py
+from langchain_core.messages import HumanMessage, SystemMessage
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken es opcional: sin él se usa una estimación
+    _encoding = None
+
+def count_tokens(content) -> int:
+    """
+    Cuenta los tokens de un texto o de una lista de mensajes.
+    Sin `tiktoken` se estima en 1 token cada 4 caracteres.
+    """
+    if isinstance(content, list):
+        # ~4 tokens de formato por mensaje en la API de chat
+        return sum(count_tokens(m.content) + 4 for m in content)
+    text = content if isinstance(content, str) else str(content)
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    Recorta `text` a unos `max_tokens` conservando el principio y el final
+    (en el inicio automático, el contexto de la reunión y la instrucción final).
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    marker = "\n[...]\n"
+    budget = max(0, max_tokens - count_tokens(marker))
+    head, tail = budget - budget // 2, budget // 2
+    if _encoding is not None:
+        tokens = _encoding.encode(text)
+        return _encoding.decode(tokens[:head]) + marker + (_encoding.decode(tokens[-tail:]) if tail else "")
+    return text[:head * 4] + marker + (text[-tail * 4:] if tail else "")
+
+def turn_starts(messages) -> list:
+    """
+    Índices donde empieza cada turno: un mensaje del usuario tras uno que no lo es
+    (y siempre el primero). No se asume que los mensajes alternen de dos en dos.
+    """
+    return [
+        i for i, message in enumerate(messages)
+        if i == 0 or (message.type == "human" and messages[i - 1].type != "human")
+    ]
+
+SUMMARY_PROMPT = """Resume de forma concisa la siguiente conversación entre un usuario y un asistente
+especializado en optimización de reuniones. Conserva los datos concretos, decisiones, dudas
+abiertas y contradicciones que el asistente deba recordar. Responde solo con el resumen.
+
+Resumen previo:
+{summary}
+
+Nuevos mensajes:
+{messages}"""
+
+class HistoryCompactor:
+    """
+    Paso previo al prompt del chat que limita el historial enviado a GPT:
+    conserva literalmente los últimos `keep_turns` turnos (pregunta + respuesta),
+    sustituye los anteriores por un resumen que se actualiza de forma incremental
+    y garantiza que historial + entrada quepan en `max_tokens`.
+
+    El estado del resumen (`summary`, `summarized_upto`) y el último informe de
+    tokens (`compaction`) se guardan en el propio historial de la sesión.
+    """
+
+    def __init__(self, llm, history_store, keep_turns: int = 4, max_tokens: int = 3000):
+        self.llm = llm
+        self.history_store = history_store
+        self.keep_turns = keep_turns
+        self.max_tokens = max_tokens
+
+    @staticmethod
+    def _summary_message(summary: str) -> SystemMessage:
+        return SystemMessage(content=f"Resumen de la conversación anterior:\n{summary}")
+
+    def _summary_tokens(self, summary: str) -> int:
+        return count_tokens([self._summary_message(summary)]) if summary else 0
+
+    def _input_budget(self, summary: str) -> int:
+        # La entrada puede ocupar lo que deja el resumen, y al menos la mitad del presupuesto
+        return max(self.max_tokens - self._summary_tokens(summary), self.max_tokens // 2)
+
+    def _plan(self, history, user_input: str):
+        """Decide qué mensajes pasan al resumen. Devuelve (índice desde el que se conservan, pendientes de resumir)."""
+        messages = history.messages
+        if history.summarized_upto > len(messages):
+            # El historial se ha vaciado: se descarta el resumen anterior
+            history.summary, history.summarized_upto = "", 0
+        summarized_upto = history.summarized_upto
+        summary = history.summary
+
+        # Solo se corta por el inicio de un turno: los últimos `keep_turns` se conservan
+        starts = [i for i in turn_starts(messages) if i > summarized_upto] + [len(messages)]
+        keep_from = max(summarized_upto, starts[-self.keep_turns - 1] if len(starts) > self.keep_turns else 0)
+        fixed = self._summary_tokens(summary) + min(count_tokens(user_input), self._input_budget(summary))
+        # Si no cabe en el presupuesto, se pasan turnos completos al resumen
+        while keep_from < len(messages) and fixed + count_tokens(messages[keep_from:]) > self.max_tokens:
+            keep_from = next(i for i in starts if i > keep_from)
+        return keep_from, messages[summarized_upto:keep_from]
+
+    def _summary_prompt(self, history, pending) -> str:
+        lines = "\n".join(f"{'Usuario' if m.type == 'human' else 'Asistente'}: {m.content}" for m in pending)
+        return SUMMARY_PROMPT.format(summary=history.summary or "(ninguno)", messages=lines)
+
+    def _finish(self, history, inputs: dict, keep_from: int) -> dict:
+        messages = history.messages
+        user_input = inputs.get("input", "")
+        # Una entrada que no cabe sola en el presupuesto (p. ej. el contexto de una
+        # reunión muy larga) se recorta; el resumen (recién generado, su tamaño no se
+        # conocía al planificar) se recorta a lo que dejan la entrada y los turnos conservados
+        llm_input = truncate_tokens(user_input, self._input_budget(history.summary))
+        compacted = list(messages[keep_from:])
+        summary = history.summary
+        if summary:
+            room = self.max_tokens - count_tokens(llm_input) - count_tokens(compacted) - self._summary_tokens(" ")
+            summary = truncate_tokens(summary, room) if room > 0 else ""
+        if summary:
+            compacted.insert(0, self._summary_message(summary))
+
+        history.compaction = {
+            "tokens_before": count_tokens(list(messages)) + count_tokens(user_input),
+            "tokens_after": count_tokens(compacted) + count_tokens(llm_input),
+            "messages_summarized": keep_from,
+            "messages_kept": len(messages) - keep_from,
+            "input_truncated": llm_input != user_input,
+            "token_budget": self.max_tokens,
+        }
+        return {**inputs, "input": llm_input, "history": compacted}
+
+    def compact_inputs(self, inputs: dict, config) -> dict:
+        history = self.history_store.get(config["configurable"]["session_id"])
+        keep_from, pending = self._plan(history, inputs.get("input", ""))
+        if pending:
+            response = self.llm.invoke([HumanMessage(content=self._summary_prompt(history, pending))])
+            history.summary, history.summarized_upto = response.content, keep_from
+        return self._finish(history, inputs, keep_from)
+
+    async def acompact_inputs(self, inputs: dict, config) -> dict:
+        history = await self.history_store.aget(config["configurable"]["session_id"])
+        keep_from, pending = self._plan(history, inputs.get("input", ""))
+        if pending:
+            response = await self.llm.ainvoke([HumanMessage(content=self._summary_prompt(history, pending))])
+            history.summary, history.summarized_upto = response.content, keep_from
+        return self._finish(history, inputs, keep_from)
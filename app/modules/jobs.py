@@ -0,0 +1,272 @@
+# app/modules/jobs.py
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+
+from app.database.cache import request_scope
+from app.modules.llm_usage import usage_endpoint
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+@dataclass
+class Job:
+    id_job: str
+    key: str
+    payload: dict
+    status: str = QUEUED
+    result: dict = None
+    error: str = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+class SQLiteJobStore:
+    """
+    Persistencia de los trabajos en SQLite, para no perder la cola en un reinicio.
+    El fichero puede compartirse entre varios procesos: un índice único parcial
+    impide dos trabajos activos con la misma `key` y `claim` toma un trabajo de
+    forma atómica, así que cada trabajo se ejecuta una sola vez.
+    """
+
+    def __init__(self, path: str, stale_after: float = 600):
+        # Un trabajo "running" sin cambios en `stale_after` segundos se da por
+        # abandonado (su proceso cayó) y vuelve a la cola al arrancar
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id_job TEXT PRIMARY KEY, key TEXT NOT NULL, "
+            "status TEXT NOT NULL, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status)")
+        self._db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_key_idx ON jobs (key) "
+            f"WHERE status IN ('{QUEUED}', '{RUNNING}')"
+        )
+        self._db.commit()
+
+    def add(self, job: Job):
+        """
+        Guarda un trabajo nuevo. Si ya hay uno activo con la misma `key` (de este
+        o de otro proceso) no lo guarda y devuelve ese; si no, devuelve None.
+        """
+        with self._lock:
+            while True:
+                try:
+                    self._db.execute(
+                        "INSERT INTO jobs (id_job, key, status, data, updated_at) VALUES (?, ?, ?, ?, ?)",
+                        (job.id_job, job.key, job.status, json.dumps(job.to_dict(), default=str), job.updated_at),
+                    )
+                    self._db.commit()
+                    return None
+                except sqlite3.IntegrityError:
+                    self._db.rollback()
+                row = self._db.execute(
+                    "SELECT data FROM jobs WHERE key = ? AND status IN (?, ?)", (job.key, QUEUED, RUNNING)
+                ).fetchone()
+                if row is not None:
+                    return Job(**json.loads(row[0]))
+                # El trabajo activo terminó entre medias: se vuelve a intentar
+
+    def claim(self, id_job: str) -> bool:
+        """Pasa un trabajo de `queued` a `running` si ningún otro worker lo ha tomado antes."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, data = json_set(data, '$.status', ?, '$.updated_at', ?) "
+                "WHERE id_job = ? AND status = ?",
+                (RUNNING, now, RUNNING, now, id_job, QUEUED),
+            )
+            self._db.commit()
+        return cursor.rowcount == 1
+
+    def save(self, job: Job):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, data = ?, updated_at = ? WHERE id_job = ?",
+                (job.status, json.dumps(job.to_dict(), default=str), job.updated_at, job.id_job),
+            )
+            self._db.commit()
+
+    def get(self, id_job: str):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM jobs WHERE id_job = ?", (id_job,)).fetchone()
+        return Job(**json.loads(row[0])) if row else None
+
+    def pending(self) -> list:
+        """Trabajos en cola, incluidos los abandonados en curso (ver `stale_after`)."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, data = json_set(data, '$.status', ?) WHERE status = ? AND updated_at < ?",
+                (QUEUED, QUEUED, RUNNING, time.time() - self.stale_after),
+            )
+            self._db.commit()
+            rows = self._db.execute(
+                "SELECT data FROM jobs WHERE status = ? ORDER BY updated_at", (QUEUED,)
+            ).fetchall()
+        return [Job(**json.loads(row[0])) for row in rows]
+
+class JobQueue:
+    """
+    Cola de trabajos en proceso sobre `asyncio.Queue`, drenada por `workers` tareas
+    que ejecutan `handler(payload)`. Los envíos con la misma `key` mientras hay un
+    trabajo en curso devuelven ese mismo trabajo. Con un `store` duradero los
+    trabajos pendientes se recuperan al arrancar, la deduplicación cubre a todos
+    los procesos que comparten el store y cada trabajo lo ejecuta un solo worker.
+    Las llamadas al store son bloqueantes y se hacen en un hilo (`asyncio.to_thread`).
+    `start()` y `stop()` se llaman al arrancar y al parar la aplicación.
+    """
+
+    def __init__(self, handler, workers: int = 2, store=None, keep_finished: int = 1000, poll_interval: float = 1.0):
+        self.handler = handler
+        self.workers = workers
+        self.store = store
+        self.keep_finished = keep_finished
+        # Cada cuánto se relee del store un trabajo de otro proceso en `wait`
+        self.poll_interval = poll_interval
+        self._jobs = OrderedDict()  # id_job -> Job
+        self._in_flight = {}  # key -> id_job
+        self._events = {}  # id_job -> asyncio.Event
+        self._queue = None
+        self._tasks = []
+
+    async def start(self):
+        """Arranca los workers en el event loop actual y encola los trabajos pendientes del store."""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        if self.store is not None:
+            for job in await asyncio.to_thread(self.store.pending):
+                self._track(job)
+                self._queue.put_nowait(job.id_job)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancela los workers; los trabajos interrumpidos vuelven a la cola del store."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def _track(self, job: Job):
+        self._jobs[job.id_job] = job
+        self._in_flight[job.key] = job.id_job
+        self._events[job.id_job] = asyncio.Event()
+
+    def _untrack(self, job: Job):
+        self._jobs.pop(job.id_job, None)
+        if self._in_flight.get(job.key) == job.id_job:
+            del self._in_flight[job.key]
+        event = self._events.pop(job.id_job, None)
+        if event is not None:
+            event.set()
+
+    async def submit(self, key: str, payload: dict) -> tuple:
+        """Encola un trabajo. Devuelve `(job, deduplicado)`."""
+        if self._queue is None:
+            raise RuntimeError("La cola de trabajos no está arrancada (falta `start()`)")
+        id_job = self._in_flight.get(key)
+        if id_job is not None:
+            return self._jobs[id_job], True
+
+        job = Job(id_job=uuid.uuid4().hex, key=key, payload=payload)
+        if self.store is not None:
+            existing = await asyncio.to_thread(self.store.add, job)
+            if existing is not None:
+                # Trabajo activo de otro proceso, o de un envío de este que se
+                # guardó mientras se esperaba al store
+                return self._jobs.get(existing.id_job, existing), True
+        self._track(job)
+        self._queue.put_nowait(job.id_job)
+        return job, False
+
+    async def aget(self, id_job: str):
+        """El trabajo en memoria o, si no está, el guardado en el store."""
+        job = self._jobs.get(id_job)
+        if job is None and self.store is not None:
+            job = await asyncio.to_thread(self.store.get, id_job)
+        return job
+
+    async def wait(self, id_job: str, timeout: float = None):
+        """Espera a que termine el trabajo (o a `timeout`) y lo devuelve."""
+        event = self._events.get(id_job)
+        if event is not None:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return await self.aget(id_job)
+
+        # Trabajo de otro proceso (solo está en el store): se relee periódicamente
+        deadline = None if timeout is None else time.monotonic() + timeout
+        job = await self.aget(id_job)
+        while job is not None and not job.finished and self.store is not None:
+            remaining = self.poll_interval if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(self.poll_interval, remaining))
+            job = await self.aget(id_job)
+        return job
+
+    def stats(self) -> dict:
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        counts["queue_size"] = self._queue.qsize() if self._queue is not None else 0
+        return counts
+
+    async def _worker(self):
+        while True:
+            id_job = await self._queue.get()
+            job = self._jobs[id_job]
+            if self.store is not None and not await asyncio.to_thread(self.store.claim, id_job):
+                # Otro proceso lo tomó antes: su estado se sigue desde el store
+                self._untrack(job)
+                self._queue.task_done()
+                continue
+            job.status, job.updated_at = RUNNING, time.time()
+            try:
+                # Cada trabajo lee la base de datos con su propio mapa de identidad
+                # y su consumo de OpenAI se atribuye a la cola, no a la petición que la arrancó
+                with request_scope(), usage_endpoint(f"job {self.handler.__name__}"):
+                    job.result = await self.handler(job.payload)
+                job.status = DONE
+            except asyncio.CancelledError:
+                # Parada de la aplicación: otro arranque lo retomará
+                job.status, job.updated_at = QUEUED, time.time()
+                await self._save(job)
+                raise
+            except Exception as e:
+                job.error = getattr(e, "detail", None) or str(e)
+                job.status = FAILED
+            job.updated_at = time.time()
+            await self._save(job)
+            self._in_flight.pop(job.key, None)
+            self._events.pop(id_job).set()
+            self._forget_old()
+            self._queue.task_done()
+
+    async def _save(self, job: Job):
+        if self.store is not None:
+            await asyncio.to_thread(self.store.save, job)
+
+    def _forget_old(self):
+        # Solo se conservan en memoria los `keep_finished` trabajos terminados más recientes
+        finished = [id_job for id_job, job in self._jobs.items() if job.finished]
+        for id_job in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[id_job]
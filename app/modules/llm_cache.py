@@ -0,0 +1,195 @@
+# app/modules/llm_cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from langchain_core.caches import BaseCache
+from langchain_core.globals import get_llm_cache, set_llm_cache
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration
+
+from app.config import (
+    LLM_CACHE_ENABLED, LLM_CACHE_SIZE, LLM_CACHE_TTL, LLM_CACHE_PATH, LLM_CACHE_MAX_TEMPERATURE,
+)
+
+# Caché de respuestas de OpenAI compartida por todos los módulos que llaman al modelo:
+# - Los modelos de LangChain (`chat_generator`, `analysis`, compactación del
+#   historial) a través de la caché global de LangChain (`install_langchain_cache`).
+# - El cliente HTTP propio (`OpenAIClient.chat_completion`, usado por `GeneradorPreguntas`).
+# La clave es el hash de (modelo y parámetros, incluida la temperatura; mensajes).
+# Por defecto solo se cachean las llamadas deterministas (temperatura <=
+# LLM_CACHE_MAX_TEMPERATURE, 0 por defecto); `use_llm_cache(True/False)` fuerza o
+# desactiva la caché para las llamadas hechas dentro del bloque.
+
+_override = ContextVar("llm_cache_override", default=None)
+
+@contextmanager
+def use_llm_cache(enabled: Optional[bool]):
+    """Activa (`True`) o desactiva (`False`) la caché en el bloque; `None` deja la política por defecto."""
+    token = _override.set(enabled)
+    try:
+        yield
+    finally:
+        _override.reset(token)
+
+def should_cache(temperature) -> bool:
+    """Política de la caché para una llamada con esa temperatura (sin temperatura explícita no se cachea)."""
+    override = _override.get()
+    if override is not None:
+        return override
+    return LLM_CACHE_ENABLED and temperature is not None and float(temperature) <= LLM_CACHE_MAX_TEMPERATURE
+
+def make_key(*parts) -> str:
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """
+    Respuestas serializadas (texto) por clave. Nivel en memoria LRU con TTL y, si
+    se indica `path`, un segundo nivel persistente en SQLite que sobrevive a reinicios.
+    """
+
+    def __init__(self, max_entries=512, ttl=86400, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> (expires_at, valor)
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+
+            row = None
+            if self._db is not None:
+                row = self._db.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] <= now:
+                    self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                    row = None
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._remember(key, row[1], row[0])
+            return row[0]
+
+    def set(self, key: str, value: str):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._stats["writes"] += 1
+            self._remember(key, expires_at, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at),
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._memory),
+                "ttl": self.ttl,
+                "persistent": self._db is not None,
+                "max_temperature": LLM_CACHE_MAX_TEMPERATURE,
+            }
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+llm_cache = LLMCache(max_entries=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, path=LLM_CACHE_PATH)
+
+# Cliente HTTP propio: el payload de `/chat/completions` es la clave
+
+def get_completion(payload: dict, use_cache: Optional[bool] = None) -> Optional[dict]:
+    """Respuesta guardada para `payload`, o None. `use_cache=False` la ignora."""
+    if use_cache is False or not should_cache(payload.get("temperature")):
+        return None
+    value = llm_cache.get(make_key("openai", payload))
+    return json.loads(value) if value is not None else None
+
+def set_completion(payload: dict, response: dict, use_cache: Optional[bool] = None):
+    if use_cache is False or not should_cache(payload.get("temperature")):
+        return
+    llm_cache.set(make_key("openai", payload), json.dumps(response, ensure_ascii=False))
+
+# Modelos de LangChain
+
+def _temperature(llm_string: str):
+    """Temperatura del modelo a partir de su representación serializada (`llm_string`)."""
+    try:
+        return json.loads(llm_string.split("---", 1)[0])["kwargs"].get("temperature")
+    except Exception:
+        return None
+
+class LangChainLLMCache(BaseCache):
+    """Adaptador de `llm_cache` a la interfaz de caché de LangChain."""
+
+    def lookup(self, prompt: str, llm_string: str):
+        if not should_cache(_temperature(llm_string)):
+            return None
+        value = llm_cache.get(make_key("langchain", llm_string, prompt))
+        if value is None:
+            return None
+        messages = messages_from_dict(json.loads(value))
+        for message in messages:
+            # Una respuesta de la caché no consume tokens (ver `llm_usage`)
+            if getattr(message, "usage_metadata", None):
+                message.usage_metadata = None
+        return [ChatGeneration(message=message) for message in messages]
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        if not should_cache(_temperature(llm_string)):
+            return
+        # Solo se guardan los mensajes de las generaciones de modelos de chat
+        messages = [generation.message for generation in return_val if isinstance(generation, ChatGeneration)]
+        if len(messages) == len(return_val):
+            llm_cache.set(make_key("langchain", llm_string, prompt), json.dumps(messages_to_dict(messages), ensure_ascii=False))
+
+    def clear(self, **kwargs) -> None:
+        llm_cache.clear()
+
+    # Las consultas son locales (memoria o SQLite): no hace falta pasar por un hilo
+    async def alookup(self, prompt: str, llm_string: str):
+        return self.lookup(prompt, llm_string)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val) -> None:
+        self.update(prompt, llm_string, return_val)
+
+def install_langchain_cache():
+    """Registra la caché como caché global de LangChain (una sola vez)."""
+    if not isinstance(get_llm_cache(), LangChainLLMCache):
+        set_llm_cache(LangChainLLMCache())
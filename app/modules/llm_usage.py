@@ -0,0 +1,216 @@
+# app/modules/llm_usage.py
+import atexit
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.database.supabase_api import insert_many
+from app.config import LLM_USAGE_BATCH_SIZE, LLM_USAGE_FLUSH_INTERVAL, LLM_USAGE_MAX_BUFFER
+
+# Registro del consumo de todas las llamadas a OpenAI en `openai_requests`
+# (sql/009_openai_requests_usage.sql): modelo, tokens, latencia, coste y endpoint
+# de la API que originó la llamada.
+# - Modelos de LangChain: `usage_callback` (se pasa en `callbacks=` al crearlos).
+# - Cliente HTTP propio: `OpenAIClient.chat_completion` llama a `record_completion`.
+# `record` solo añade la fila a un búfer en memoria; un hilo de fondo lo vuelca
+# con una inserción multi-fila cada LLM_USAGE_FLUSH_INTERVAL segundos o al llegar
+# a LLM_USAGE_BATCH_SIZE filas, fuera del camino de la petición.
+
+# Precio en dólares por cada 1000 tokens (entrada, salida); el más largo que coincida gana
+PRICES = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+}
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Coste estimado de una llamada (0 si el modelo no está en `PRICES`)."""
+    matches = [name for name in PRICES if model and model.startswith(name)]
+    if not matches:
+        return 0.0
+    input_price, output_price = PRICES[max(matches, key=len)]
+    return round((input_tokens * input_price + output_tokens * output_price) / 1000, 6)
+
+_endpoint = ContextVar("llm_usage_endpoint", default=None)
+
+@contextmanager
+def usage_endpoint(name: str):
+    """Atribuye a `name` las llamadas a OpenAI hechas dentro del bloque."""
+    token = _endpoint.set(name)
+    try:
+        yield
+    finally:
+        _endpoint.reset(token)
+
+class UsageEndpointMiddleware:
+    """Middleware ASGI que atribuye las llamadas a OpenAI al endpoint de la petición HTTP."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        with usage_endpoint(f"{scope['method']} {scope['path']}"):
+            await self.app(scope, receive, send)
+
+class UsageRecorder:
+    """Búfer de filas de `openai_requests` con volcado por lotes en un hilo de fondo."""
+
+    table = "openai_requests"
+
+    def __init__(self, batch_size: int = 50, flush_interval: float = 5.0, max_buffer: int = 5000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Si la base de datos no responde se descartan las filas más antiguas
+        self._buffer = deque(maxlen=max_buffer)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stats = {"recorded": 0, "flushed": 0, "failed_flushes": 0, "dropped": 0}
+        self._endpoints = {}  # endpoint -> acumulados en memoria
+
+    def record(self, model: str, input_tokens: int, output_tokens: int, latency: float, endpoint: str = None):
+        endpoint = endpoint or _endpoint.get() or "background"
+        input_tokens, output_tokens = input_tokens or 0, output_tokens or 0
+        row = {
+            "model": model,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "cost": estimate_cost(model, input_tokens, output_tokens),
+            "latency_ms": int(latency * 1000),
+            "endpoint": endpoint,
+        }
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self._stats["dropped"] += 1
+            self._buffer.append(row)
+            self._stats["recorded"] += 1
+            totals = self._endpoints.setdefault(endpoint, {"calls": 0, "total_tokens": 0, "cost": 0.0, "latency_ms": 0})
+            totals["calls"] += 1
+            totals["total_tokens"] += row["total_tokens"]
+            totals["cost"] += row["cost"]
+            totals["latency_ms"] += row["latency_ms"]
+            pending = len(self._buffer)
+        self._ensure_started()
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Inserta las filas pendientes; devuelve cuántas se guardaron."""
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._buffer)
+                self._buffer.clear()
+            if not rows:
+                return 0
+            try:
+                insert_many(self.table, rows)
+            except Exception as e:
+                print(f"⚠️ No se pudo guardar el consumo de OpenAI ({len(rows)} filas): {e}")
+                with self._lock:
+                    self._stats["failed_flushes"] += 1
+                    # Se reintentan en el siguiente volcado, por delante de las nuevas
+                    overflow = max(0, len(rows) + len(self._buffer) - self._buffer.maxlen)
+                    self._stats["dropped"] += overflow
+                    self._buffer.extendleft(reversed(rows[overflow:]))
+                return 0
+            with self._lock:
+                self._stats["flushed"] += len(rows)
+            return len(rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "pending": len(self._buffer),
+                "endpoints": {
+                    endpoint: {
+                        **totals,
+                        "cost": round(totals["cost"], 6),
+                        "avg_latency_ms": round(totals["latency_ms"] / totals["calls"]),
+                    }
+                    for endpoint, totals in self._endpoints.items()
+                },
+            }
+
+    def _ensure_started(self):
+        # Arranque perezoso del hilo de volcado (y volcado final al salir)
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="llm-usage-flush", daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+usage_recorder = UsageRecorder(LLM_USAGE_BATCH_SIZE, LLM_USAGE_FLUSH_INTERVAL, LLM_USAGE_MAX_BUFFER)
+
+def record_completion(payload: dict, response: dict, latency: float):
+    """Registra una respuesta de `/chat/completions` del cliente HTTP propio."""
+    usage = response.get("usage") or {}
+    usage_recorder.record(
+        response.get("model") or payload.get("model"),
+        usage.get("prompt_tokens"), usage.get("completion_tokens"), latency,
+    )
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Callback de LangChain que registra cada llamada de un modelo de chat."""
+
+    # Solo toma tiempos y añade al búfer: se ejecuta en línea también en las llamadas asíncronas
+    run_inline = True
+
+    def __init__(self):
+        self._runs = {}  # run_id -> (inicio, modelo, endpoint)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model")
+        # El endpoint se captura aquí: al terminar un stream el contexto puede ser otro
+        self._runs[run_id] = (time.perf_counter(), model, _endpoint.get())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        start, model, endpoint = run
+
+        llm_output = response.llm_output or {}
+        token_usage = llm_output.get("token_usage") or {}
+        input_tokens = token_usage.get("prompt_tokens")
+        output_tokens = token_usage.get("completion_tokens")
+        if input_tokens is None:
+            # Streaming: el consumo llega en los metadatos del mensaje (`stream_usage=True`)
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    input_tokens = (input_tokens or 0) + usage.get("input_tokens", 0)
+                    output_tokens = (output_tokens or 0) + usage.get("output_tokens", 0)
+        if not input_tokens and not output_tokens:
+            # Respuesta servida desde `llm_cache`: no ha consumido tokens
+            return
+
+        usage_recorder.record(
+            llm_output.get("model_name") or model, input_tokens, output_tokens,
+            time.perf_counter() - start, endpoint,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._runs.pop(run_id, None)
+
+usage_callback = UsageCallbackHandler()
@@ -1,21 +1,253 @@
-import requests
-from supabase import create_client, Client
-from ..config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, OPENAI_API_KEY
+import asyncio
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
 
-# Inicializar cliente de Supabase
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+import httpx
+from app.modules.llm_cache import get_completion, set_completion
+from app.modules.llm_usage import record_completion
+from ..config import (
+    OPENAI_API_KEY,
+    QUESTION_CACHE_SIZE, QUESTION_CACHE_TTL, QUESTION_CACHE_PATH,
+    OPENAI_BASE_URL, OPENAI_TIMEOUT, OPENAI_CONNECT_TIMEOUT,
+    OPENAI_MAX_RETRIES, OPENAI_MAX_CONNECTIONS,
+)
+
+class QuestionCache:
+    """
+    Caché de preguntas generadas. Nivel en memoria LRU con TTL y, si se indica
+    `path`, un segundo nivel persistente en SQLite que sobrevive a reinicios.
+    """
+
+    def __init__(self, max_entries=256, ttl=86400, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> (expires_at, preguntas)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS question_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(tema, num_preguntas, model, temperature):
+        """Clave a partir del tema normalizado, el número de preguntas, el modelo y la temperatura."""
+        normalized = " ".join(tema.lower().split())
+        raw = json.dumps([normalized, num_preguntas, model, temperature])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, preguntas = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    return list(preguntas)
+                del self._memory[key]
+
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT value, expires_at FROM question_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._db.execute("DELETE FROM question_cache WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            preguntas = json.loads(row[0])
+            self._remember(key, row[1], preguntas)
+            return list(preguntas)
+
+    def set(self, key, preguntas):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, list(preguntas))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO question_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(preguntas), expires_at),
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM question_cache")
+                self._db.commit()
+
+    def _remember(self, key, expires_at, preguntas):
+        self._memory[key] = (expires_at, preguntas)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+question_cache = QuestionCache(
+    max_entries=QUESTION_CACHE_SIZE,
+    ttl=QUESTION_CACHE_TTL,
+    path=QUESTION_CACHE_PATH,
+)
+
+class OpenAIError(Exception):
+    """Error devuelto por la API de OpenAI (o agotados los reintentos)."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class OpenAIClient:
+    """
+    Cliente asíncrono para la API de OpenAI sobre `httpx`.
+    Mantiene un pool de conexiones persistente por event loop, aplica timeouts
+    configurables y reintenta los errores 429/5xx y de red con backoff
+    exponencial y jitter. `base_url` permite apuntarlo a un servidor falso local.
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, api_key, base_url=OPENAI_BASE_URL, timeout=OPENAI_TIMEOUT,
+                 connect_timeout=OPENAI_CONNECT_TIMEOUT, max_retries=OPENAI_MAX_RETRIES,
+                 max_connections=OPENAI_MAX_CONNECTIONS, backoff_base=0.5, backoff_max=8.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Un httpx.AsyncClient solo puede usarse en el loop en el que se creó
+        self._clients = weakref.WeakKeyDictionary()
+        self._sync_loop = None
+        self._sync_lock = threading.Lock()
+
+    def _get_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                timeout=self.timeout,
+                limits=self.limits,
+            )
+            self._clients[loop] = client
+        return client
+
+    def _backoff(self, attempt, retry_after=None):
+        """Espera antes del siguiente intento: `Retry-After` si existe, si no backoff exponencial con jitter."""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def chat_completion(self, payload: dict, use_cache: bool = None) -> dict:
+        """
+        Llama a `/chat/completions` y devuelve el JSON de respuesta. Pasa por la caché
+        compartida de `llm_cache` (`use_cache=False` la desactiva para esta llamada);
+        una respuesta servida desde la caché lleva `"cached": True`. El consumo de
+        cada llamada real se registra con `llm_usage`.
+        """
+        cached = get_completion(payload, use_cache)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+        client = self._get_client()
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = await client.post("/chat/completions", json=payload)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                if last_attempt:
+                    raise OpenAIError(f"Error de conexión con OpenAI: {e}") from e
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code == 200:
+                data = response.json()
+                record_completion(payload, data, time.perf_counter() - start)
+                set_completion(payload, data, use_cache)
+                return data
+            if response.status_code in self.RETRY_STATUS and not last_attempt:
+                await asyncio.sleep(self._backoff(attempt, response.headers.get("retry-after")))
+                continue
+            raise OpenAIError(f"{response.status_code} - {response.text}", status_code=response.status_code)
+
+    def run_sync(self, coro):
+        """
+        Ejecuta una corrutina del cliente desde código síncrono.
+        Usa un event loop propio en un hilo de fondo para que el pool de conexiones
+        se reutilice entre llamadas.
+        """
+        with self._sync_lock:
+            if self._sync_loop is None:
+                self._sync_loop = asyncio.new_event_loop()
+                threading.Thread(target=self._sync_loop.run_forever, name="openai-client", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._sync_loop).result()
+
+    def chat_completion_sync(self, payload: dict, use_cache: bool = None) -> dict:
+        """Envoltorio síncrono de `chat_completion`."""
+        return self.run_sync(self.chat_completion(payload, use_cache))
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+_openai_clients = {}
+_openai_clients_lock = threading.Lock()
+
+def get_openai_client(api_key=OPENAI_API_KEY) -> OpenAIClient:
+    """Devuelve el cliente compartido para `api_key`, creándolo la primera vez."""
+    with _openai_clients_lock:
+        client = _openai_clients.get(api_key)
+        if client is None:
+            client = _openai_clients[api_key] = OpenAIClient(api_key)
+        return client
 
 class GeneradorPreguntas:
-    def __init__(self, api_key):
+    def __init__(self, api_key, model="gpt-3.5-turbo", temperature=0.7, client: OpenAIClient = None):
         self.api_key = api_key
-        self.url = "https://api.openai.com/v1/chat/completions"
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        self.model = model
+        self.temperature = temperature
+        self.client = client or get_openai_client(api_key)
+
+    def generar_preguntas(self, tema, num_preguntas=2, use_cache=True):
+        """Versión síncrona de `agenerar_preguntas`, para los llamadores existentes."""
+        return self.client.run_sync(self.agenerar_preguntas(tema, num_preguntas, use_cache))
+
+    async def agenerar_preguntas(self, tema, num_preguntas=2, use_cache=True):
+        """
+        Genera una lista de preguntas relevantes basadas en el tema dado.
+        Con `use_cache=True` reutiliza las preguntas ya generadas para el mismo tema,
+        número de preguntas, modelo y temperatura; con `use_cache=False` tampoco se
+        usa la caché de respuestas de `llm_cache`.
+        """
+        cache_key = QuestionCache.make_key(tema, num_preguntas, self.model, self.temperature)
+        if use_cache:
+            cached = question_cache.get(cache_key)
+            if cached is not None:
+                return cached
 
-    def generar_preguntas(self, tema, num_preguntas=2):
-        """Genera una lista de preguntas relevantes basadas en el tema dado."""
         prompt = (
             f"Genera {num_preguntas} preguntas clave para evaluar el estado actual y posibles soluciones "
             f"sobre el siguiente tema sin necesidad de reunión: \"{tema}\"."
@@ -27,40 +259,35 @@ class GeneradorPreguntas:
         ]
 
         payload = {
-            "model": "gpt-3.5-turbo",
+            "model": self.model,
             "messages": messages,
             "max_tokens": 200,
-            "temperature": 0.7
+            "temperature": self.temperature
         }
 
-        response = requests.post(self.url, headers=self.headers, json=payload)
-
-        if response.status_code == 200:
-            response_data = response.json()
-            preguntas_generadas = response_data["choices"][0]["message"]["content"]
-
-            # Obtener estadísticas de uso
-            input_tokens = response_data["usage"]["prompt_tokens"]
-            output_tokens = response_data["usage"]["completion_tokens"]
-            total_tokens = response_data["usage"]["total_tokens"]
-            cost = (input_tokens * 0.0005 + output_tokens * 0.0015)  # Cálculo del costo
-
-            # Guardar en Supabase
-            data = {
-                "model": payload["model"],
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
-                "total_tokens": total_tokens,
-                "cost": round(cost, 6)
-            }
-            supabase.table("openai_requests").insert(data).execute()
-            return preguntas_generadas.split("\n")  # Retorna la lista de preguntas
-        else:
-            print(f"Error: {response.status_code} - {response.text}")
+        try:
+            response_data = await self.client.chat_completion(payload, use_cache=None if use_cache else False)
+        except OpenAIError as e:
+            print(f"Error: {e}")
             return None
 
+        preguntas_generadas = response_data["choices"][0]["message"]["content"]
+        preguntas = preguntas_generadas.split("\n")  # Lista de preguntas
+        if use_cache:
+            question_cache.set(cache_key, preguntas)
+        return preguntas
+
 class AnalizadorReunion:
+    def __init__(self, api_key=OPENAI_API_KEY, model="gpt-3.5-turbo", temperature=0.5, client: OpenAIClient = None):
+        self.model = model
+        self.temperature = temperature
+        self.client = client or get_openai_client(api_key)
+
     def analizar_necesidad_reunion(self, contexto):
+        """Versión síncrona de `aanalizar_necesidad_reunion`."""
+        return self.client.run_sync(self.aanalizar_necesidad_reunion(contexto))
+
+    async def aanalizar_necesidad_reunion(self, contexto):
         """Analiza la necesidad de una reunión basándose en el contexto proporcionado."""
         messages = [
             {"role": "system",
@@ -69,16 +296,16 @@ class AnalizadorReunion:
         ]
 
         payload = {
-            "model": "gpt-3.5-turbo",
+            "model": self.model,
             "messages": messages,
             "max_tokens": 500,
-            "temperature": 0.5
+            "temperature": self.temperature
         }
 
-        response = requests.post(self.url, headers=self.headers, json=payload)
+        try:
+            response_data = await self.client.chat_completion(payload)
+        except OpenAIError as e:
+            print(f"Error en la solicitud a OpenAI: {e}")
+            return None
 
-        if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"].strip()
-        else:
-            print(f"Error en la solicitud a OpenAI: {response.status_code} - {response.text}")
-            return None
\ No newline at end of file
+        return response_data["choices"][0]["message"]["content"].strip()
@@ -0,0 +1,116 @@
+# app/modules/progress.py
+import argparse
+
+from app.database.supabase_api import APIError, call_rpc, is_missing_function, is_missing_table
+from app.database.async_supabase_api import acall_rpc, aselect_data
+
+# Contadores de progreso por (reunión, usuario) en `meeting_progress`
+# (sql/005_meeting_progress.sql). Se actualizan en las rutas que crean preguntas
+# y respuestas, para saber si una reunión está completa con una sola lectura.
+# Son datos derivados: si una actualización falla se avisa y se sigue, y
+# `reconcile()` los reconstruye desde `questions` y `answers`. Solo se dejan de
+# actualizar si las funciones no están instaladas; un error puntual (timeout,
+# red) no desactiva los contadores del proceso.
+_progress_available = True
+
+def _handle_error(e: Exception):
+    global _progress_available
+    if is_missing_function(e) or is_missing_table(e):
+        print(f"⚠️ Contadores de progreso no disponibles (¿falta sql/005_meeting_progress.sql?): {e}")
+        _progress_available = False
+    else:
+        print(f"⚠️ No se pudo actualizar el progreso (se corrige con --reconcile): {e}")
+
+async def arecord_questions(id_meeting, id_user, count: int = 1):
+    """Suma `count` preguntas nuevas al progreso del usuario en la reunión."""
+    if not _progress_available or not count:
+        return
+    try:
+        await acall_rpc("bump_meeting_progress", {"p_id_meeting": id_meeting, "p_id_user": id_user, "p_questions": count})
+    except Exception as e:
+        _handle_error(e)
+
+def record_answer(id_meeting, id_user, id_question):
+    """Registra una respuesta ya guardada; solo la primera a cada pregunta cuenta como respondida."""
+    if not _progress_available or not id_question:
+        return
+    try:
+        call_rpc("record_answer_progress", {"p_id_meeting": id_meeting, "p_id_user": id_user, "p_id_question": id_question})
+    except Exception as e:
+        _handle_error(e)
+
+async def arecord_answer(id_meeting, id_user, id_question):
+    """Versión asíncrona de `record_answer`."""
+    if not _progress_available or not id_question:
+        return
+    try:
+        await acall_rpc("record_answer_progress", {"p_id_meeting": id_meeting, "p_id_user": id_user, "p_id_question": id_question})
+    except Exception as e:
+        _handle_error(e)
+
+def _progress_row(data, id_meeting, id_user) -> dict:
+    row = data[0] if data else {
+        "id_meeting": id_meeting, "id_user": id_user,
+        "total_questions": 0, "answered_questions": 0, "last_activity": None,
+    }
+    return {**row, "complete": row["total_questions"] > 0 and row["answered_questions"] >= row["total_questions"]}
+
+async def aget_progress(id_meeting, id_user) -> dict:
+    """Progreso del usuario en la reunión (ceros si todavía no hay preguntas)."""
+    response = await aselect_data("meeting_progress", {"id_meeting": id_meeting, "id_user": id_user}, limit=1)
+    return _progress_row(response.data, id_meeting, id_user)
+
+async def aget_progress_if_available(id_meeting, id_user):
+    """`aget_progress`, o None si los contadores no están disponibles (hay que calcularlo a mano)."""
+    if not _progress_available:
+        return None
+    try:
+        return await aget_progress(id_meeting, id_user)
+    except APIError as e:
+        if not is_missing_table(e):
+            raise
+        _handle_error(e)
+        return None
+
+async def ameetings_progress(meeting_ids: list):
+    """
+    Progreso de varias reuniones con una sola lectura, sumando todos sus participantes:
+    `{id_meeting: {"total_questions", "answered_questions", "complete"}}` (las
+    reuniones sin preguntas no aparecen). None si los contadores no están
+    disponibles: entonces se comprueba con las preguntas y respuestas.
+    """
+    if not _progress_available:
+        return None
+    try:
+        response = await aselect_data(
+            "meeting_progress", {"id_meeting": list(meeting_ids)},
+            columns="id_meeting,total_questions,answered_questions",
+        )
+    except APIError as e:
+        if not is_missing_table(e):
+            raise
+        _handle_error(e)
+        return None
+
+    totals = {}
+    for row in response.data or []:
+        total = totals.setdefault(str(row["id_meeting"]), {"total_questions": 0, "answered_questions": 0})
+        total["total_questions"] += row["total_questions"]
+        total["answered_questions"] += row["answered_questions"]
+    for total in totals.values():
+        total["complete"] = total["total_questions"] > 0 and total["answered_questions"] >= total["total_questions"]
+    return totals
+
+def reconcile() -> int:
+    """Reconstruye todos los contadores en la base de datos; devuelve las filas escritas."""
+    return call_rpc("rebuild_meeting_progress").data
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Contadores de progreso de las reuniones")
+    parser.add_argument("--reconcile", action="store_true", help="Reconstruye meeting_progress desde questions y answers")
+    args = parser.parse_args()
+
+    if args.reconcile:
+        print(f"✅ Contadores reconstruidos: {reconcile()} filas")
+    else:
+        parser.print_help()
@@ -1,4 +1,4 @@
-from app.database.supabase_api import insert_data, select_data
+from app.database.supabase_api import insert_data, insert_many, select_data
 from app.modules.open_ai import GeneradorPreguntas
 
 class QuestionGenerator:
@@ -18,8 +18,7 @@ class QuestionGenerator:
         meeting_id = meeting_response.data[0]["id_meeting"]
 
         # Asignar usuarios a la reunión
-        for user_id in users:
-            insert_data("meeting_users", {"id_meeting": meeting_id, "id_user": user_id})
+        insert_many("meeting_users", [{"id_meeting": meeting_id, "id_user": user_id} for user_id in users])
 
         # Generar preguntas con OpenAI
         preguntas = self.generador.generar_preguntas(topic)
@@ -27,7 +26,6 @@ class QuestionGenerator:
             return None
 
         # Insertar preguntas en la base de datos
-        for pregunta in preguntas:
-            insert_data("questions", {"id_meeting": meeting_id, "content": pregunta})
+        insert_many("questions", [{"id_meeting": meeting_id, "content": pregunta} for pregunta in preguntas])
 
         return {"topic": topic, "questions": preguntas}
@@ -0,0 +1,117 @@
+# app/modules/user_resolver.py
+import threading
+import time
+
+from app.config import USER_CACHE_TTL
+from app.database.async_supabase_api import acall_rpc, aselect_ilike
+from app.database.supabase_api import APIError, call_rpc, is_missing_function, select_ilike
+
+# Los correos se comparan sin distinguir mayúsculas: con la RPC `users_by_emails`
+# (sql/010, usa el índice sobre lower(email)) o, si no está instalada, con un
+# filtro `ilike` por correo.
+EMAILS_RPC = "users_by_emails"
+_emails_rpc_available = True
+
+# Caché en proceso: email normalizado -> (id_user, instante de expiración)
+_cache = {}
+_lock = threading.Lock()
+
+def normalize_email(email: str) -> str:
+    """Normaliza un correo para compararlo sin importar mayúsculas ni espacios."""
+    return email.strip().lower()
+
+def _get_cached(email: str):
+    with _lock:
+        entry = _cache.get(email)
+        if entry is None:
+            return None
+        id_user, expires_at = entry
+        if expires_at < time.monotonic():
+            del _cache[email]
+            return None
+        return id_user
+
+def _store(email: str, id_user):
+    with _lock:
+        _cache[email] = (id_user, time.monotonic() + USER_CACHE_TTL)
+
+def invalidate(email: str = None):
+    """Elimina un correo de la caché, o la caché completa si no se indica ninguno."""
+    with _lock:
+        if email is None:
+            _cache.clear()
+        else:
+            _cache.pop(normalize_email(email), None)
+
+def _split_cached(emails: list) -> tuple:
+    """Separa los correos normalizados en los que están en caché y los que hay que consultar."""
+    normalized = list(dict.fromkeys(normalize_email(e) for e in emails if e and e.strip()))
+    found = {}
+    missing = []
+    for email in normalized:
+        id_user = _get_cached(email)
+        if id_user is None:
+            missing.append(email)
+        else:
+            found[email] = id_user
+    return normalized, found, missing
+
+def _disable_rpc(error: Exception):
+    global _emails_rpc_available
+    print(f"⚠️ RPC {EMAILS_RPC} no disponible, se usa un filtro ilike: {error}")
+    _emails_rpc_available = False
+
+def _lookup(missing: list) -> list:
+    if _emails_rpc_available:
+        try:
+            return call_rpc(EMAILS_RPC, {"p_emails": missing}).data
+        except APIError as e:
+            if not is_missing_function(e):
+                raise
+            _disable_rpc(e)
+    return select_ilike("user", "email", missing, columns=["id_user", "email"]).data
+
+async def _alookup(missing: list) -> list:
+    if _emails_rpc_available:
+        try:
+            return (await acall_rpc(EMAILS_RPC, {"p_emails": missing})).data
+        except APIError as e:
+            if not is_missing_function(e):
+                raise
+            _disable_rpc(e)
+    return (await aselect_ilike("user", "email", missing, columns=["id_user", "email"])).data
+
+def _merge_rows(rows: list, found: dict, missing: list):
+    for row in rows or []:
+        email = normalize_email(row["email"])
+        if email in missing and email not in found:
+            found[email] = row["id_user"]
+            _store(email, row["id_user"])
+
+def resolve_emails(emails: list) -> tuple:
+    """
+    Resuelve una lista de correos a sus `id_user` con una sola consulta a la tabla `user`
+    (solo para los que no están en caché), sin distinguir mayúsculas.
+    Devuelve `(encontrados, desconocidos)`: un dict email normalizado -> id_user y la lista
+    de correos normalizados que no existen, en el orden de entrada.
+    """
+    normalized, found, missing = _split_cached(emails)
+    if missing:
+        _merge_rows(_lookup(missing), found, missing)
+
+    unknown = [e for e in normalized if e not in found]
+    return found, unknown
+
+async def aresolve_emails(emails: list) -> tuple:
+    """Versión asíncrona de `resolve_emails`."""
+    normalized, found, missing = _split_cached(emails)
+    if missing:
+        _merge_rows(await _alookup(missing), found, missing)
+
+    unknown = [e for e in normalized if e not in found]
+    return found, unknown
+
+def resolve_email(email: str):
+    """Devuelve el `id_user` de un correo, o None si no existe."""
+    found, _ = resolve_emails([email])
+    return found.get(normalize_email(email))
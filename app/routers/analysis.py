@@ -1,49 +1,334 @@
 # app/routers/analysis.py
 
-from fastapi import APIRouter, HTTPException
-from app.modules.analysis import get_meeting_analysis, analyze_meeting
-from app.database.supabase_api import select_data
-from app.models.schemas import AnalysisRequest, AnalysisResponse
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+import json
+import asyncio
+from app.config import (
+    ANALYSIS_BATCH_CONCURRENCY, ANALYSIS_BATCH_MAX_MEETINGS,
+    ANALYSIS_WORKERS, JOBS_BACKEND, JOBS_SQLITE_PATH,
+)
+from app.modules.jobs import JobQueue, SQLiteJobStore
+from app.modules.llm_cache import use_llm_cache
+from app.modules.progress import ameetings_progress
+from app.modules.analysis import (
+    afetch_meeting_bundle, afetch_meeting_bundles, aget_ready_meetings, aanalyze_meeting, aanalyze_meeting_row,
+    afind_cached_result, afind_cached_results, analysis_cache_stats,
+    format_meeting_context, meeting_fingerprint, NO_CONTEXT_RESULT,
+)
+from app.database.async_supabase_api import ainsert_many
+from app.models.schemas import AnalysisRequest, AnalysisResponse, BatchAnalysisRequest
 
 router = APIRouter(prefix="/analysis", tags=["Analysis"])
 
-@router.post("/analyze", response_model=AnalysisResponse)
-def analyze_meeting_api(request: AnalysisRequest):
+def _progress_error(progress):
     """
-    Endpoint que verifica si todas las preguntas de la reunión tienen respuesta
-    y, si es así, llama a GPT para analizar la necesidad de la reunión.
+    Comprobación de que la reunión está completa con los contadores de `meeting_progress`.
+    Sin preguntas contadas no decide: `_bundle_error` distingue si la reunión existe.
     """
-    id_user = request.id_user
-    id_meeting = request.id_meeting
+    if not progress or not progress["total_questions"] or progress["complete"]:
+        return None
+    missing = progress["total_questions"] - progress["answered_questions"]
+    return 400, f"Faltan respuestas para {missing} de {progress['total_questions']} preguntas"
 
+def _bundle_error(bundle: dict, check_answers: bool = True):
+    """
+    Devuelve `(status_code, detalle)` si la reunión no se puede analizar, o None.
+    `check_answers=False` cuando los contadores ya han confirmado que está completa.
+    """
     # 1) Verificar si la reunión existe
-    meeting_data = select_data("meetings", {"id_meeting": id_meeting})
-    if not meeting_data.data:
-        raise HTTPException(status_code=404, detail="No existe la reunión")
+    if not bundle["meeting"]:
+        return 404, "No existe la reunión"
 
     # 2) Verificar si todas las preguntas tienen respuesta
-    questions = select_data("questions", {"id_meeting": id_meeting}).data
+    questions = bundle["questions"]
     if not questions:
-        raise HTTPException(status_code=400, detail="No hay preguntas en esta reunión")
+        return 400, "No hay preguntas en esta reunión"
+    if not check_answers:
+        return None
 
-    answers = select_data("answers", {"id_meeting": id_meeting}).data
-    answered_ids = {a["id_question"] for a in answers} if answers else set()
+    # Sin contadores (falta sql/005): se comparan preguntas y respuestas
+    answered_ids = {a["id_question"] for a in bundle["answers"]}
     missing_questions = [q["id_question"] for q in questions if q["id_question"] not in answered_ids]
     if missing_questions:
+        return 400, f"Faltan respuestas para las preguntas: {missing_questions}"
+
+    return None
+
+async def run_analysis(id_meeting: str, force: bool = False) -> dict:
+    """
+    Verifica que todas las preguntas de la reunión tengan respuesta y, si es así,
+    llama a GPT para analizar la necesidad de la reunión.
+    Si ya existe en `results` un análisis con la misma huella de contenido se
+    devuelve ese, salvo con `force=True`.
+    Devuelve `{"conclusions": ..., "analysis": True/False, "cached": bool}`;
+    lanza HTTPException si no se puede analizar.
+    """
+    # Completitud con una lectura de los contadores, antes de cargar la reunión
+    progress = await ameetings_progress([id_meeting])
+    if progress is not None:
+        error = _progress_error(progress.get(str(id_meeting)))
+        if error:
+            raise HTTPException(status_code=error[0], detail=error[1])
+
+    # Reunión, preguntas y respuestas en un solo viaje; sirve tanto para
+    # validar como para construir el contexto
+    bundle = await afetch_meeting_bundle(id_meeting)
+
+    error = _bundle_error(bundle, check_answers=progress is None)
+    if error:
+        raise HTTPException(status_code=error[0], detail=error[1])
+
+    questions = bundle["questions"]
+    answers = bundle["answers"]
+
+    # 3) Reutilizar el análisis guardado si el contenido no ha cambiado
+    fingerprint = meeting_fingerprint(bundle["meeting"]["topic"], questions, answers)
+    if force:
+        analysis_cache_stats["forced"] += 1
+    else:
+        cached = await afind_cached_result(id_meeting, fingerprint)
+        if cached:
+            analysis_cache_stats["hits"] += 1
+            return {"conclusions": cached["conclusions"], "analysis": cached["analysis"], "cached": True}
+        analysis_cache_stats["misses"] += 1
+
+    # 4) Construir el contexto con los datos ya consultados
+    context = format_meeting_context(bundle)
+
+    # 5) Analizar con GPT (con `force` tampoco se reutilizan respuestas de `llm_cache`)
+    with use_llm_cache(False if force else None):
+        analysis_dict = await aanalyze_meeting(context, id_meeting, fingerprint)
+    # analysis_dict = {"conclusions": "...", "analysis": True/False}
+
+    return {**analysis_dict, "cached": False}
+
+@router.get("/ready/{id_user}")
+async def get_ready_meetings(
+    id_user: str,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Reuniones del usuario con todas sus preguntas respondidas, es decir, las que
+    se pueden analizar. Sustituye a consultar `/questions/pending` reunión por reunión.
+    """
+    meetings, total = await aget_ready_meetings(id_user, limit, offset)
+    return {
+        "id_user": id_user,
+        "meetings": meetings,
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "has_more": offset + len(meetings) < total
+    }
+
+@router.post("/analyze", response_model=AnalysisResponse)
+async def analyze_meeting_api(request: AnalysisRequest):
+    """
+    Endpoint que verifica si todas las preguntas de la reunión tienen respuesta
+    y, si es así, llama a GPT para analizar la necesidad de la reunión.
+    """
+    analysis_dict = await run_analysis(request.id_meeting, request.force)
+
+    return AnalysisResponse(
+        message="Análisis completado",
+        conclusions=analysis_dict["conclusions"],
+        is_meeting_needed=analysis_dict["analysis"],
+        cached=analysis_dict["cached"]
+    )
+
+# Referencias a los lotes en curso para que no los recoja el recolector de basura
+_batch_tasks = set()
+
+async def _run_batch(id_meetings: list, force: bool, concurrency: int, queue: asyncio.Queue):
+    """
+    Analiza varias reuniones: precarga todo con consultas `in_`, lanza como mucho
+    `concurrency` llamadas a GPT a la vez, publica cada resultado en `queue` en
+    cuanto termina y guarda todas las filas nuevas de `results` en una sola inserción.
+    """
+    summary = {"type": "summary", "total": len(id_meetings), "analyzed": 0, "cached": 0, "failed": 0, "saved": 0}
+    new_rows = []
+    try:
+        # Las reuniones incompletas según los contadores no se llegan a cargar
+        progress = await ameetings_progress(id_meetings)
+        errors = {}
+        if progress is not None:
+            for id_meeting in id_meetings:
+                error = _progress_error(progress.get(id_meeting))
+                if error:
+                    errors[id_meeting] = error
+        bundles = await afetch_meeting_bundles([m_id for m_id in id_meetings if m_id not in errors])
+
+        # Validar y calcular huellas de todas las reuniones antes de llamar a GPT
+        fingerprints = {}
+        for id_meeting in id_meetings:
+            error = errors.get(id_meeting) or _bundle_error(bundles[id_meeting], check_answers=progress is None)
+            if error:
+                summary["failed"] += 1
+                await queue.put({"type": "error", "id_meeting": id_meeting, "status_code": error[0], "detail": error[1]})
+                continue
+            bundle = bundles[id_meeting]
+            fingerprints[id_meeting] = meeting_fingerprint(bundle["meeting"]["topic"], bundle["questions"], bundle["answers"])
+
+        if force:
+            analysis_cache_stats["forced"] += len(fingerprints)
+            cached = {}
+        else:
+            cached = await afind_cached_results(fingerprints)
+            analysis_cache_stats["hits"] += len(cached)
+            analysis_cache_stats["misses"] += len(fingerprints) - len(cached)
+
+        for id_meeting, row in cached.items():
+            summary["cached"] += 1
+            await queue.put({
+                "type": "result", "id_meeting": id_meeting, "conclusions": row["conclusions"],
+                "is_meeting_needed": row["analysis"], "cached": True
+            })
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def analyze_one(id_meeting: str):
+            context = format_meeting_context(bundles[id_meeting])
+            try:
+                if context:
+                    async with semaphore:
+                        row = await aanalyze_meeting_row(context, id_meeting, fingerprints[id_meeting])
+                    new_rows.append(row)
+                else:
+                    row = NO_CONTEXT_RESULT
+            except Exception as e:
+                print(f"⚠️ Error analizando la reunión {id_meeting}: {e}")
+                summary["failed"] += 1
+                await queue.put({"type": "error", "id_meeting": id_meeting, "status_code": 500, "detail": str(e)})
+                return
+            summary["analyzed"] += 1
+            await queue.put({
+                "type": "result", "id_meeting": id_meeting, "conclusions": row["conclusions"],
+                "is_meeting_needed": row["analysis"], "cached": False
+            })
+
+        with use_llm_cache(False if force else None):
+            await asyncio.gather(*(analyze_one(m_id) for m_id in fingerprints if m_id not in cached))
+
+        # Una sola inserción multi-fila con todos los análisis nuevos
+        if new_rows:
+            await ainsert_many("results", new_rows)
+            summary["saved"] = len(new_rows)
+    except Exception as e:
+        print(f"⚠️ Error en el análisis por lotes: {e}")
+        summary["error"] = str(e)
+    finally:
+        await queue.put(summary)
+
+@router.post("/batch")
+async def analyze_meetings_batch(request: BatchAnalysisRequest):
+    """
+    Analiza varias reuniones y devuelve los resultados en NDJSON a medida que terminan:
+    una línea `result` o `error` por reunión y una línea final `summary`.
+    El lote sigue ejecutándose y guardándose aunque el cliente se desconecte.
+    """
+    # Sin duplicados, conservando el orden
+    id_meetings = list(dict.fromkeys(str(m_id) for m_id in request.id_meetings))
+    if not id_meetings:
+        raise HTTPException(status_code=400, detail="No se indicaron reuniones")
+    if len(id_meetings) > ANALYSIS_BATCH_MAX_MEETINGS:
         raise HTTPException(
             status_code=400,
-            detail=f"Faltan respuestas para las preguntas: {missing_questions}"
+            detail=f"Como máximo {ANALYSIS_BATCH_MAX_MEETINGS} reuniones por lote"
         )
 
-    # 3) Obtener contexto
-    context = get_meeting_analysis(id_meeting)
+    concurrency = min(request.concurrency or ANALYSIS_BATCH_CONCURRENCY, ANALYSIS_BATCH_CONCURRENCY)
+    queue = asyncio.Queue()
+    task = asyncio.create_task(_run_batch(id_meetings, request.force, max(concurrency, 1), queue))
+    _batch_tasks.add(task)
+    task.add_done_callback(_batch_tasks.discard)
 
-    # 4) Analizar con GPT
-    analysis_dict = analyze_meeting(context, id_meeting)
-    # analysis_dict = {"conclusions": "...", "analysis": True/False}
+    async def lines():
+        while True:
+            item = await queue.get()
+            yield json.dumps(item, ensure_ascii=False, default=str) + "\n"
+            if item["type"] == "summary":
+                break
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
+async def _analysis_job(payload: dict) -> dict:
+    analysis_dict = await run_analysis(payload["id_meeting"], payload.get("force", False))
     return AnalysisResponse(
         message="Análisis completado",
         conclusions=analysis_dict["conclusions"],
-        is_meeting_needed=analysis_dict["analysis"]
-    )
+        is_meeting_needed=analysis_dict["analysis"],
+        cached=analysis_dict["cached"]
+    ).dict()
+
+# Cola de análisis en segundo plano; un solo trabajo en curso por reunión
+analysis_jobs = JobQueue(
+    _analysis_job,
+    workers=ANALYSIS_WORKERS,
+    store=SQLiteJobStore(JOBS_SQLITE_PATH) if JOBS_BACKEND == "sqlite" else None,
+)
+
+@router.post("/jobs")
+async def submit_analysis_job(request: AnalysisRequest):
+    """
+    Encola el análisis de una reunión y devuelve inmediatamente el `id_job`.
+    Si ya hay un análisis en curso para la misma reunión (y el mismo `force`) se
+    devuelve ese trabajo: uno normal no cubre una petición que pide ignorar la caché.
+    El resultado se consulta en `GET /analysis/jobs/{id_job}` o se recibe por
+    eventos en `GET /analysis/jobs/{id_job}/events`.
+    """
+    key = f"{request.id_meeting}:{'force' if request.force else 'cached'}"
+    job, deduplicated = await analysis_jobs.submit(key, {
+        "id_meeting": request.id_meeting,
+        "id_user": request.id_user,
+        "force": request.force,
+    })
+    return {"id_job": job.id_job, "status": job.status, "deduplicated": deduplicated}
+
+@router.get("/jobs/{id_job}")
+async def get_analysis_job(id_job: str):
+    """Estado del trabajo (`queued`, `running`, `done`, `failed`) y su resultado o error."""
+    job = await analysis_jobs.aget(id_job)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No existe el trabajo")
+    return job.to_dict()
+
+@router.get("/jobs/{id_job}/events")
+async def stream_analysis_job(id_job: str):
+    """
+    Server-Sent Events: envía el estado actual y, cuando termina, el resultado.
+    Si el trabajo deja de estar disponible se envía un evento `error` y se cierra.
+    """
+    job = await analysis_jobs.aget(id_job)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No existe el trabajo")
+
+    async def events():
+        current = await analysis_jobs.aget(id_job)
+        if current is not None:
+            yield f"data: {json.dumps(current.to_dict(), default=str)}\n\n"
+        while current is not None and not current.finished:
+            # Se espera en tramos cortos para mantener viva la conexión
+            current = await analysis_jobs.wait(id_job, timeout=15)
+            if current is None:
+                break
+            if current.finished:
+                yield f"data: {json.dumps(current.to_dict(), default=str)}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+        if current is None:
+            # Sin almacén duradero, un trabajo terminado puede salir de memoria (`keep_finished`)
+            detail = {"id_job": id_job, "detail": "El trabajo ya no está disponible"}
+            yield f"event: error\ndata: {json.dumps(detail)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@router.get("/cache/stats")
+def get_analysis_cache_stats():
+    """Aciertos y fallos de la memoización de análisis por huella de contenido."""
+    total = analysis_cache_stats["hits"] + analysis_cache_stats["misses"]
+    return {
+        **analysis_cache_stats,
+        "hit_ratio": round(analysis_cache_stats["hits"] / total, 3) if total else None
+    }
@@ -1,6 +1,10 @@
 # app/routers/answers.py
-from fastapi import APIRouter, HTTPException
-from app.database.supabase_api import select_data, insert_data
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from app.database.supabase_api import (
+    APIError, call_rpc, decode_cursor, insert_data, is_missing_function, next_cursor, select_data, select_pages,
+)
+from app.modules.progress import aget_progress, record_answer
 from app.models.schemas import AnswerCreate
 
 router = APIRouter(prefix="/answers", tags=["Answers"])
@@ -9,50 +13,77 @@ router = APIRouter(prefix="/answers", tags=["Answers"])
 def create_answer(answer: AnswerCreate):
     data_to_insert = answer.dict()
     print("Insertando en 'answers':", data_to_insert)  # Depuración
-    response = insert_data("answers", data_to_insert)
+    try:
+        response = insert_data("answers", data_to_insert)
+    except APIError as e:
+        print("⚠️ Error de Supabase:", e)  # Mas info
+        raise HTTPException(status_code=400, detail=str(e))
     print("Respuesta de Supabase al insertar 'answers':", response)  # Depuración
 
-    if hasattr(response, "error") and response.error:
-        print("⚠️ Error de Supabase:", response.error)  # Mas info
-        raise HTTPException(status_code=400, detail=str(response.error))
+    record_answer(answer.id_meeting, answer.id_user, answer.id_question)
     return {"message": "Respuesta creada con éxito"}
 
+# Reuniones con respuestas del usuario, calculadas en la base de datos
+# (sql/011_meetings_responded.sql); sin la función se recorren sus respuestas.
+RESPONDED_RPC = "meetings_responded"
+_responded_rpc_available = True
+
 @router.get("/meetings_responded/{id_user}")
-def get_meetings_responded(id_user: str):
+def get_meetings_responded(
+    id_user: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None
+):
     """
     Devuelve todas las reuniones (id_meeting, topic) en las que
     el usuario (id_user) tenga al menos una respuesta registrada.
+    Paginado por `id_meeting`: `cursor=next_cursor` pide la página siguiente.
     """
+    global _responded_rpc_available
+    if _responded_rpc_available:
+        try:
+            after = decode_cursor(cursor)[0] if cursor else None
+            response = call_rpc(RESPONDED_RPC, {"p_id_user": id_user, "p_limit": limit, "p_after": after})
+            result = response.data or []
+            return {"meetings": result, "next_cursor": next_cursor(result, limit, "id_meeting", "meetings")}
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except APIError as e:
+            if not is_missing_function(e):
+                raise HTTPException(status_code=400, detail=str(e))
+            print(f"⚠️ RPC {RESPONDED_RPC} no disponible, se recorren las respuestas: {e}")
+            _responded_rpc_available = False
 
-    # 1) Obtener todas las respuestas del usuario en 'answers'
-    answers_resp = select_data("answers", {"id_user": id_user})
-    if hasattr(answers_resp, "error") and answers_resp.error:
+    # 1) Reunir los ids de reuniones en los que ha respondido
+    #    (solo la columna id_meeting, recorriendo las respuestas por páginas)
+    meeting_ids = set()
+    try:
+        for page in select_pages("answers", {"id_user": id_user}, order_by="id_answer", columns="id_meeting"):
+            meeting_ids.update(ans["id_meeting"] for ans in page)
+    except APIError as e:
         # Manejo de error si supabase da error
-        raise HTTPException(status_code=400, detail=str(answers_resp.error))
+        raise HTTPException(status_code=400, detail=str(e))
 
-    answers_data = answers_resp.data if answers_resp and answers_resp.data else []
-    if not answers_data:
+    if not meeting_ids:
         # El usuario no tiene ni una respuesta
-        return {"meetings": []}
-
-    # 2) Reunir los ids de reuniones en los que ha respondido
-    meeting_ids = list({ans["id_meeting"] for ans in answers_data})
-
-    # 3) Consultar la tabla 'meetings' para obtener sus datos
-    meeting_resp = select_data("meetings", {"id_meeting": meeting_ids})
-    if hasattr(meeting_resp, "error") and meeting_resp.error:
-        raise HTTPException(status_code=400, detail=str(meeting_resp.error))
+        return {"meetings": [], "next_cursor": None}
 
-    meeting_data = meeting_resp.data if meeting_resp and meeting_resp.data else []
-    # 4) Estructurar la respuesta en forma de lista de diccionarios {id_meeting, topic}
-    result = []
-    for m in meeting_data:
-        result.append({
-            "id_meeting": m["id_meeting"],
-            "topic": m["topic"]
-        })
+    # 2) Consultar la tabla 'meetings' para obtener sus datos (una página)
+    try:
+        meeting_resp = select_data(
+            "meetings",
+            {"id_meeting": sorted(meeting_ids)},
+            limit=limit,
+            order_by="id_meeting",
+            columns="id_meeting,topic",
+            after=cursor
+        )
+    except (ValueError, APIError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return {"meetings": result}
+    # 3) Estructurar la respuesta en forma de lista de diccionarios {id_meeting, topic}
+    result = meeting_resp.data or []
+    return {"meetings": result, "next_cursor": next_cursor(result, limit, "id_meeting", "meetings")}
 
 @router.get("/user_meeting/{id_user}/{id_meeting}")
 def get_user_meeting_answers(id_user: str, id_meeting: str):
@@ -60,10 +91,19 @@ def get_user_meeting_answers(id_user: str, id_meeting: str):
     Devuelve todas las respuestas de un usuario específico para una reunión específica.
     """
     # Obtener todas las respuestas del usuario para la reunión dada
-    answers_resp = select_data("answers", {"id_user": id_user, "id_meeting": id_meeting})
-    if hasattr(answers_resp, "error") and answers_resp.error:
+    try:
+        answers_resp = select_data("answers", {"id_user": id_user, "id_meeting": id_meeting})
+    except APIError as e:
         # Manejo de error si supabase da error
-        raise HTTPException(status_code=400, detail=str(answers_resp.error))
+        raise HTTPException(status_code=400, detail=str(e))
 
     answers_data = answers_resp.data if answers_resp and answers_resp.data else []
-    return {"answers": answers_data}
\ No newline at end of file
+    return {"answers": answers_data}
+
+@router.get("/progress/{id_user}/{id_meeting}")
+async def get_user_meeting_progress(id_user: str, id_meeting: str):
+    """
+    Progreso del usuario en la reunión: preguntas totales, respondidas, última
+    actividad y si está completa. Una sola lectura de `meeting_progress`.
+    """
+    return await aget_progress(id_meeting, id_user)
@@ -1,11 +1,20 @@
 from fastapi import APIRouter, HTTPException
-from app.modules.chat_generator import conversation
-from app.database.supabase_api import select_data, insert_data
+from fastapi.responses import StreamingResponse
+from app.database import repository
+from app.modules.chat_generator import conversation, history_store
+from app.modules.chat_history import session_id_for
+from app.modules.context_builder import build_chat_context
+from app.modules.chat_turn import acommit_turn
+from app.modules.user_resolver import resolve_email
+import asyncio
+import json
+from app.database.supabase_api import select_data
+from app.database.async_supabase_api import aselect_data
 from app.models.schemas import ChatRequest, ChatResponse, ChatStartRequest
 from typing import List
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
-def build_context_from_db(id_user: str, id_meeting: str) -> str:
+async def build_context_from_db(id_user: str, id_meeting: str) -> str:
     """
     Retorna un string que contiene:
     - El tema de la reunión.
@@ -13,45 +22,24 @@ def build_context_from_db(id_user: str, id_meeting: str) -> str:
     - (Opcional) Un breve resumen o instructivo para GPT.
     """
 
-    # 1. Obtener el tema de la reunión
-    meeting_resp = select_data("meetings", {"id_meeting": id_meeting})
+    # Tema de la reunión, preguntas y respuestas (consultas en paralelo)
+    meeting_resp, questions_resp, answers_resp = await asyncio.gather(
+        aselect_data("meetings", {"id_meeting": id_meeting}),
+        aselect_data("questions", {"id_meeting": id_meeting, "id_user": id_user}),
+        aselect_data("answers", {"id_meeting": id_meeting, "id_user": id_user}),
+    )
+
+    # 1. Tema de la reunión
     meeting_data = meeting_resp.data if meeting_resp and meeting_resp.data else []
     topic = meeting_data[0]["topic"] if meeting_data else "Tema desconocido"
 
-    # 2. Obtener las preguntas
-    questions_resp = select_data("questions", {"id_meeting": id_meeting, "id_user": id_user})
+    # 2. Preguntas
     questions_data = questions_resp.data if questions_resp and questions_resp.data else []
 
-    # 3. Obtener las respuestas
-    answers_resp = select_data("answers", {"id_meeting": id_meeting, "id_user": id_user})
+    # 3. Respuestas
     answers_data = answers_resp.data if answers_resp and answers_resp.data else []
 
-    # Crear un mapa id_question -> [respuestas...]
-    from collections import defaultdict
-    answer_map = defaultdict(list)
-    for ans in answers_data:
-        qid = ans["id_question"]
-        # Podrías concatenar si hay múltiples respuestas para la misma pregunta
-        answer_map[qid].append(ans["content"])
-
-    # Armar un "contexto" en texto.
-    context = f"=== CONTEXTO DE LA REUNIÓN ===\nTema: {topic}\n\n"
-    for q in questions_data:
-        qid = q["id_question"]
-        context += f"Pregunta: {q['content']}\n"
-        if qid in answer_map:
-            for idx, ans_txt in enumerate(answer_map[qid], start=1):
-                context += f"   Respuesta #{idx}: {ans_txt}\n"
-        else:
-            context += "   (Sin respuesta)\n"
-        context += "\n"
-    context += (
-        "=== FIN DEL CONTEXTO ===\n\n"
-        "Basándote en este contexto, profundiza en posibles inconsistencias, mejoras, "
-        "o información adicional que el usuario podría aportar.\n"
-    )
-
-    return context
+    return build_chat_context(topic, questions_data, answers_data)
 
 @router.post("/start")
 def start_chat(request: ChatStartRequest):
@@ -61,21 +49,19 @@ def start_chat(request: ChatStartRequest):
 
     user_email = request.user_email
 
-    # Verificar usuario en la base de datos
-    user_response = select_data("user", {"email": user_email})
+    # Verificar usuario (caché email -> id_user, con consulta a la base de datos si no está)
+    id_user = resolve_email(user_email)
 
-    if not user_response.data:
+    if id_user is None:
         raise HTTPException(status_code=404, detail="Usuario no encontrado.")
 
-    id_user = user_response.data[0]["id_user"]
-
     # Obtener reuniones asignadas al usuario
-    meetings_response = select_data("meetings", {"id_user": id_user})
+    user_meetings = repository.meetings_by_user(id_user)
 
-    if not meetings_response.data:
+    if not user_meetings:
         raise HTTPException(status_code=404, detail="No tienes reuniones asignadas.")
 
-    meetings = [{"id_meeting": m["id_meeting"], "topic": m["topic"]} for m in meetings_response.data]
+    meetings = [{"id_meeting": m.id_meeting, "topic": m.topic} for m in user_meetings]
 
     return {
         "message": "Reuniones disponibles",
@@ -84,164 +70,137 @@ def start_chat(request: ChatStartRequest):
     }
 
 
-@router.post("/conversation", response_model=ChatResponse)
-def chat_with_bot(request: ChatRequest):
-    id_user = request.id_user
-    id_meeting = request.id_meeting
-    user_message = request.user_response
-    session_id = f"user_{id_user}_meeting_{id_meeting}"
-    
+AUTO_START_MESSAGE = "INICIO_AUTOMATICO_PROFUNDIZAR"
+
+def _truncate(text: str, length: int) -> str:
+    return text[:length] + "..." if text and len(text) > length else (text or "")
+
+def _new_debug_info() -> dict:
     # Valores por defecto para la información de debug
-    debug_info = {
+    return {
         "message": "Inicio de procesamiento",
-        "recent_questions": [],
-        "answered_questions": [],
         "selected_question": None
     }
 
+async def _prepare_turn(id_user: str, id_meeting: str, user_message: str, debug_info: dict) -> str:
+    """
+    Prepara un turno del chat y devuelve el texto que se envía a GPT.
+    En el inicio automático construye el contexto de la reunión; en un turno
+    normal el mensaje del usuario se envía tal cual y se guarda en `_finish_turn`.
+    """
     # Caso especial: Inicio automático
-    if user_message == "INICIO_AUTOMATICO_PROFUNDIZAR":
-        # 1) Construir el contexto con las respuestas antiguas
-        context_text = build_context_from_db(id_user, id_meeting)
-
-        # 2) Llamar a la cadena con ese contexto: GPT empezará la conversación
-        ai_response = conversation.invoke(
-            {
-                "input": f"""{context_text}
+    if user_message == AUTO_START_MESSAGE:
+        # Construir el contexto con las respuestas antiguas: GPT empezará la conversación
+        context_text = await build_context_from_db(id_user, id_meeting)
+        debug_info["message"] = "Inicio automático completado"
+        return f"""{context_text}
 
 El usuario ya completó las preguntas oficiales. Inicia la conversación 
 profundizando y pidiendo aclaraciones donde veas huecos o áreas de mejora.
-""",
-            },
-            config={"configurable": {"session_id": session_id}}
-        )
-        
-        # 3) Guardar lo que GPT dice en la tabla `questions`
-        new_question_data = {
-            "id_meeting": id_meeting,
-            "id_user": id_user,
-            "content": ai_response.content
-        }
-        question_resp = insert_data("questions", new_question_data)
-        
-        # Extraer el ID de la nueva pregunta para registro en debug
-        new_question_id = None
-        if question_resp.data and len(question_resp.data) > 0:
-            new_question_id = question_resp.data[0].get("id_question")
-        
-        debug_info["message"] = "Inicio automático completado"
+"""
+
+    # CASO NORMAL: El usuario está respondiendo en una conversación en curso
+    return user_message
+
+async def _finish_turn(id_user: str, id_meeting: str, session_id: str, user_message: str, ai_content: str,
+                       debug_info: dict):
+    """
+    Guarda el turno con una sola llamada (`acommit_turn`): la respuesta del usuario
+    asociada a la pregunta abierta y lo que dice GPT como nueva pregunta en `questions`.
+    """
+    answer = None if user_message == AUTO_START_MESSAGE else user_message
+    history = await history_store.aget(session_id)
+    turn = await acommit_turn(id_meeting, id_user, answer, ai_content, history)
+
+    if answer is not None:
+        selected = turn.get("selected_question")
+        if selected:
+            debug_info["selected_question"] = {**selected, "content": _truncate(selected["content"], 100)}
+            debug_info["message"] = "Se encontró una pregunta sin responder"
+        else:
+            debug_info["message"] = "No se encontró ninguna pregunta sin responder"
+
+    # Tokens del historial antes y después de la compactación
+    debug_info["history_tokens"] = history.compaction
+
+    # Actualizar el debug con información sobre la nueva pregunta
+    if turn.get("new_id_question"):
         debug_info["new_question"] = {
-            "id": new_question_id,
-            "content": ai_response.content[:100] + "..." if len(ai_response.content) > 100 else ai_response.content
+            "id": turn["new_id_question"],
+            "content": _truncate(ai_content, 100)
         }
 
-        return ChatResponse(
-            message="Chat iniciado con contexto",
-            ai_response=ai_response.content,
-            debug=debug_info
-        )
+@router.post("/conversation", response_model=ChatResponse)
+async def chat_with_bot(request: ChatRequest):
+    id_user = request.id_user
+    id_meeting = request.id_meeting
+    user_message = request.user_response
+    session_id = session_id_for(id_user, id_meeting)
+    debug_info = _new_debug_info()
 
-    # CASO NORMAL: El usuario está respondiendo en una conversación en curso
-    
-    # 1. Obtener todas las preguntas recientes para este usuario y reunión
-    questions_resp = select_data(
-        "questions", 
-        {"id_meeting": id_meeting, "id_user": id_user},
-        order_by="created_at",
-        ascending=False,
-        limit=10
-    )
-    
-    # Extraer IDs de las preguntas recientes para debug
-    recent_questions = []
-    if questions_resp.data:
-        for q in questions_resp.data[:3]:  # Solo mostramos las 3 más recientes en el debug
-            recent_questions.append({
-                "id": q.get("id_question"),
-                "content": q.get("content", "")[:50] + "..." if q.get("content") and len(q.get("content")) > 50 else q.get("content", ""),
-                "created_at": q.get("created_at")
-            })
-    debug_info["recent_questions"] = recent_questions
-    
-    # 2. Obtener las respuestas existentes
-    answers_resp = select_data(
-        "answers",
-        {"id_meeting": id_meeting, "id_user": id_user}
-    )
-    
-    # Crear un mapa de preguntas respondidas
-    answered_question_ids = {}
-    answered_questions_debug = []
-    
-    if answers_resp.data:
-        for answer in answers_resp.data:
-            q_id = answer.get("id_question")
-            if q_id:  # Solo si tiene una pregunta asociada
-                answered_question_ids[q_id] = True
-                answered_questions_debug.append({
-                    "id_question": q_id,
-                    "id_answer": answer.get("id_answer"),
-                    "content": answer.get("content", "")[:50] + "..." if answer.get("content") and len(answer.get("content")) > 50 else answer.get("content", "")
-                })
-    
-    debug_info["answered_questions"] = answered_questions_debug[:3]  # Limitamos a 3 para el debug
-    
-    # 3. Encontrar la primera pregunta sin respuesta
-    last_question_id = None
-    for question in questions_resp.data:
-        q_id = question.get("id_question")
-        if q_id and q_id not in answered_question_ids:
-            last_question_id = q_id
-            debug_info["selected_question"] = {
-                "id": q_id,
-                "content": question.get("content", "")[:100] + "..." if question.get("content") and len(question.get("content")) > 100 else question.get("content", ""),
-                "created_at": question.get("created_at")
-            }
-            break
-    
-    # Si no encontramos una pregunta sin respuesta, registramos ese hecho
-    if not last_question_id:
-        debug_info["message"] = "No se encontró ninguna pregunta sin responder"
-    else:
-        debug_info["message"] = "Se encontró una pregunta sin responder"
-    
-    # 4. Guardar la respuesta del usuario
-    new_answer_data = {
-        "id_question": last_question_id,  # Puede ser None si no encontramos una pregunta sin respuesta
-        "id_user": id_user,
-        "id_meeting": id_meeting,
-        "content": user_message
-    }
-    answer_resp = insert_data("answers", new_answer_data)
-    
-    # 5. Obtener la respuesta de la IA
-    ai_response = conversation.invoke(
-        {"input": user_message},
+    llm_input = await _prepare_turn(id_user, id_meeting, user_message, debug_info)
+    # Carga la sesión fuera del bucle de eventos antes de que LangChain la pida con `get`
+    # (y la recarga si otro proceso le ha añadido mensajes)
+    await history_store.aget(session_id, refresh=True)
+
+    # Obtener la respuesta de la IA
+    ai_response = await conversation.ainvoke(
+        {"input": llm_input},
         config={"configurable": {"session_id": session_id}}
     )
-    
-    # 6. Guardar la respuesta de la IA como una nueva pregunta
-    new_question_data = {
-        "id_meeting": id_meeting,
-        "id_user": id_user,
-        "content": ai_response.content
-    }
-    new_question_resp = insert_data("questions", new_question_data)
-    
-    # Actualizar el debug con información sobre la nueva pregunta
-    if new_question_resp.data and len(new_question_resp.data) > 0:
-        new_question_id = new_question_resp.data[0].get("id_question")
-        debug_info["new_question"] = {
-            "id": new_question_id,
-            "content": ai_response.content[:100] + "..." if len(ai_response.content) > 100 else ai_response.content
-        }
-    
+
+    await _finish_turn(id_user, id_meeting, session_id, user_message, ai_response.content, debug_info)
+
     return ChatResponse(
-        message="Conversación en curso",
+        message="Chat iniciado con contexto" if user_message == AUTO_START_MESSAGE else "Conversación en curso",
         ai_response=ai_response.content,
         debug=debug_info
     )
 
+@router.post("/conversation/stream")
+async def chat_with_bot_stream(request: ChatRequest):
+    """
+    Variante en streaming de `/chat/conversation`. Devuelve NDJSON: una línea
+    `{"type": "token", "content": ...}` por fragmento que llega de GPT y, al final,
+    `{"type": "done", "message", "ai_response", "debug"}` (o `{"type": "error", "detail"}`).
+    El turno (respuesta del usuario y nueva pregunta) se guarda cuando termina el stream.
+    """
+    id_user = request.id_user
+    id_meeting = request.id_meeting
+    user_message = request.user_response
+    session_id = session_id_for(id_user, id_meeting)
+    debug_info = _new_debug_info()
+
+    llm_input = await _prepare_turn(id_user, id_meeting, user_message, debug_info)
+    # Carga la sesión fuera del bucle de eventos antes de que LangChain la pida con `get`
+    # (y la recarga si otro proceso le ha añadido mensajes)
+    await history_store.aget(session_id, refresh=True)
+
+    async def events():
+        chunks = []
+        try:
+            async for chunk in conversation.astream(
+                {"input": llm_input},
+                config={"configurable": {"session_id": session_id}}
+            ):
+                if chunk.content:
+                    chunks.append(chunk.content)
+                    yield json.dumps({"type": "token", "content": chunk.content}, ensure_ascii=False) + "\n"
+
+            ai_content = "".join(chunks)
+            await _finish_turn(id_user, id_meeting, session_id, user_message, ai_content, debug_info)
+            yield json.dumps({
+                "type": "done",
+                "message": "Chat iniciado con contexto" if user_message == AUTO_START_MESSAGE else "Conversación en curso",
+                "ai_response": ai_content,
+                "debug": debug_info
+            }, ensure_ascii=False, default=str) + "\n"
+        except Exception as e:
+            print(f"⚠️ Error en el stream del chat: {e}")
+            yield json.dumps({"type": "error", "detail": str(e)}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 
 @router.post("/context")
 def get_chat_context(id_user: str, id_meeting: str):
@@ -262,3 +221,11 @@ def get_chat_context(id_user: str, id_meeting: str):
         pairs.append({"question": question_text, "answer": answer_text})
 
     return {"pairs": pairs}
+
+@router.get("/metrics")
+def get_chat_metrics():
+    """
+    Métricas del almacén de historiales del chat: sesiones y mensajes en memoria,
+    tamaño aproximado, aciertos, cargas desde el backend y expulsiones.
+    """
+    return history_store.stats()
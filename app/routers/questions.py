@@ -1,13 +1,28 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from app.modules.question_generator import QuestionGenerator
 from app.modules.open_ai import GeneradorPreguntas
-from app.database.supabase_api import insert_data, select_data
+from app.modules.progress import aget_progress_if_available, arecord_questions
+from app.modules.user_resolver import invalidate as invalidate_user_cache, normalize_email, aresolve_emails
+from app.database import repository
+from app.database.supabase_api import APIError, count_data, insert_data, next_cursor, select_data
+from app.database.async_supabase_api import ainsert_data, ainsert_many
 from app.models.schemas import QuestionCreate, MeetingCreate, UserCreate, PendingQuestionsRequest
-from app.config import OPENAI_API_KEY
-from typing import List
+from app.config import OPENAI_API_KEY, MEETING_FANOUT_WORKERS
+import asyncio
+from typing import List, Optional
 
 router = APIRouter(prefix="/questions", tags=["Questions"])
 
+# Columnas que necesitan los clientes del listado de usuarios
+USER_COLUMNS = "id_user,name,email"
+
+def _select_page(table: str, filters, limit: int, order_by: str, ascending: bool, columns, cursor):
+    """`select_data` paginado por cursor; un cursor no válido o un error de la consulta es un 400."""
+    try:
+        return select_data(table, filters, limit, order_by, ascending, columns, after=cursor)
+    except (ValueError, APIError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/")
 def generate_questions(request: QuestionCreate):
     generator = QuestionGenerator()
@@ -21,137 +36,209 @@ def generate_questions(request: QuestionCreate):
 def create_new_user(user: UserCreate):  # 📌 Se usa `UserCreate` para recibir JSON en el body
     """ Endpoint para crear un nuevo usuario con Request Body """
     user_data = {"name": user.name, "email": user.email, "rol": "participant"}
-    response = insert_data("user", user_data)
+    try:
+        insert_data("user", user_data)
+    except APIError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    if hasattr(response, "error") and response.error:
-        raise HTTPException(status_code=400, detail=str(response.error))
+    # El correo puede haber estado cacheado como parte de otra resolución
+    invalidate_user_cache(user.email)
 
     return {
         "message": "Usuario creado exitosamente",
         "user": user_data
     }
 @router.get("/all_users")
-def get_all_users():
-    resp = select_data("user")
+def get_all_users(
+    limit: int = Query(200, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    """
+    Lista de usuarios paginada por `id_user`. Para la página siguiente se pasa
+    `cursor=next_cursor` de la respuesta anterior (None en la última página).
+    """
+    resp = _select_page("user", None, limit, "id_user", True, USER_COLUMNS, cursor)
     users = resp.data if resp.data else []
-    return {"users": users}  # Siempre devolver JSON
+    return {"users": users, "next_cursor": next_cursor(users, limit, "id_user", "user")}  # Siempre devolver JSON
 
-@router.post("/meetings/")
-def create_meeting(meeting: MeetingCreate):
+async def _create_meeting_for_user(topic: str, email: str, id_user, preguntas: list = None) -> dict:
     """
-    Crea una reunión con el mismo `topic` para cada usuario de la lista `users`.
-    Cada usuario tendrá su propia fila en la tabla `meetings` y sus preguntas asignadas.
+    Ejecuta el flujo completo para un participante ya resuelto: crea su fila en
+    `meetings`, genera las preguntas y las guarda.
+    Si se reciben `preguntas` (compartidas por tema) no se llama a OpenAI;
+    con `preguntas=None` se genera una variación propia para el participante.
+    Nunca lanza excepciones: devuelve un dict con `status` para poder informar
+    de fallos parciales sin interrumpir al resto de participantes.
     """
-
-    assigned_meetings = []  # Lista para guardar reuniones creadas
-
-    for email in meeting.users:
-        print(f"Intentando crear reunión para: {email}") #debug
-        # Buscar usuario por email
-        user_response = select_data("user", {"email": email})
-
-        # Verificar si la respuesta tiene `data`
-        user_data_list = user_response.data if (user_response and user_response.data) else []
-
-        if not user_data_list:
-            print(f"⚠️ Usuario con email {email} no encontrado. Se omitirá.")
-            continue
-
-        id_user = user_data_list[0]["id_user"]
-        print(f"   - id_user: {id_user}") #debug
+    result = {"email": email, "status": "ok", "id_user": id_user}
+    try:
+        print(f"Intentando crear reunión para: {email} (id_user: {id_user})") #debug
         # **Crear una reunión por cada usuario**
-        meeting_data = {"topic": meeting.topic, "state": True, "id_user": id_user}
-        meeting_response = insert_data("meetings", meeting_data)
-        # Revisa si hay error
-        if hasattr(meeting_response, "error") and meeting_response.error:
-            print("⚠️ Error al insertar meeting:", meeting_response.error)
-            raise HTTPException(status_code=400, detail=str(meeting_response.error))
+        meeting_data = {"topic": topic, "state": True, "id_user": id_user}
+        meeting_response = await ainsert_data("meetings", meeting_data)
         # Verifica si se creó efectivamente
         if not meeting_response.data or not meeting_response.data[0].get("id_meeting"):
             print("⚠️ No se devolvió id_meeting al insertar.")
-            raise HTTPException(status_code=500, detail="Error al obtener el ID de la reunión")
-        id_meeting = meeting_response.data[0]["id_meeting"] if meeting_response.data else None
-        if not id_meeting:
-            raise HTTPException(status_code=500, detail="Error al obtener el ID de la reunión")
-
-        assigned_meetings.append({
-            "id_meeting": id_meeting,
-            "topic": meeting.topic,
-            "email": email,
-            "id_user": id_user
-        })
+            result.update(status="error", detail="Error al obtener el ID de la reunión")
+            return result
+        id_meeting = meeting_response.data[0]["id_meeting"]
+        result["id_meeting"] = id_meeting
 
-        # **Generar preguntas con ChatGPT**
-        print(f"🔄 Generando preguntas para {email} en la reunión {id_meeting}...")
-        gpt = GeneradorPreguntas(api_key=OPENAI_API_KEY)  # 📌 Pasamos el `api_key`
-        preguntas = gpt.generar_preguntas(meeting.topic)
+        # **Generar preguntas con ChatGPT** (solo en modo variación por usuario)
+        if preguntas is None:
+            print(f"🔄 Generando preguntas para {email} en la reunión {id_meeting}...")
+            gpt = GeneradorPreguntas(api_key=OPENAI_API_KEY)  # 📌 Pasamos el `api_key`
+            preguntas = await gpt.agenerar_preguntas(topic, use_cache=False)
 
         if not preguntas:
             print(f"❌ No se generaron preguntas para {email}.")
-            continue
+            result.update(status="no_questions", detail="No se generaron preguntas")
+            return result
 
         # **Guardar las preguntas en la base de datos**
         print(f"✅ Guardando preguntas en la base de datos para {email}...")
-        for pregunta in preguntas:
-            insert_data("questions", {
-                "id_meeting": id_meeting,
-                "id_user": id_user,
-                "content": pregunta
-            })
+        await ainsert_many("questions", [
+            {"id_meeting": id_meeting, "id_user": id_user, "content": pregunta}
+            for pregunta in preguntas
+        ])
+        await arecord_questions(id_meeting, id_user, len(preguntas))
+        result["questions"] = len(preguntas)
+    except Exception as e:
+        print(f"⚠️ Error procesando a {email}: {e}")
+        result.update(status="error", detail=str(e))
+
+    return result
+
+@router.post("/meetings/")
+async def create_meeting(meeting: MeetingCreate):
+    """
+    Crea una reunión con el mismo `topic` para cada usuario de la lista `users`.
+    Cada usuario tendrá su propia fila en la tabla `meetings` y sus preguntas asignadas.
+
+    Las preguntas se generan una sola vez por tema y se comparten entre todos los
+    participantes; con `per_user_questions=True` cada uno recibe su propia variación.
+
+    Con `concurrent=True` (por defecto) los participantes se procesan en paralelo,
+    con como máximo `MEETING_FANOUT_WORKERS` en curso a la vez. Los resultados se
+    devuelven siempre en el mismo orden que `users`, con el estado de cada uno.
+    """
+    # Resolver todos los correos con una sola consulta
+    try:
+        found, unknown = await aresolve_emails(meeting.users)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al buscar usuarios: {e}")
+    if unknown:
+        print(f"⚠️ Usuarios no encontrados, se omitirán: {unknown}")
+
+    emails = [normalize_email(email) for email in meeting.users]
+    pending = [email for email in emails if email in found]
+
+    # Por defecto, una sola generación por tema (con caché) compartida por todos
+    shared_questions = None
+    if pending and not meeting.per_user_questions:
+        print(f"🔄 Generando preguntas para el tema '{meeting.topic}'...")
+        gpt = GeneradorPreguntas(api_key=OPENAI_API_KEY)
+        try:
+            shared_questions = await gpt.agenerar_preguntas(meeting.topic) or []
+        except Exception as e:
+            print(f"⚠️ Error al generar preguntas: {e}")
+            shared_questions = []
+
+    semaphore = asyncio.Semaphore(MEETING_FANOUT_WORKERS if meeting.concurrent else 1)
+
+    async def create(email):
+        async with semaphore:
+            return await _create_meeting_for_user(meeting.topic, email, found[email], shared_questions)
+
+    # `gather` conserva el orden de entrada
+    created = iter(await asyncio.gather(*(create(email) for email in pending)))
+
+    results = [
+        next(created) if email in found else {"email": email, "status": "not_found", "detail": "Usuario no encontrado"}
+        for email in emails
+    ]
+
+    # Reuniones creadas (aunque la generación de preguntas haya fallado, la fila existe)
+    assigned_meetings = [
+        {
+            "id_meeting": r["id_meeting"],
+            "topic": meeting.topic,
+            "email": r["email"],
+            "id_user": r["id_user"]
+        }
+        for r in results if r.get("id_meeting")
+    ]
+    failures = [r for r in results if r["status"] != "ok"]
 
     if not assigned_meetings:
-        raise HTTPException(status_code=400, detail="No se pudieron crear reuniones para los usuarios proporcionados.")
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "No se pudieron crear reuniones para los usuarios proporcionados.",
+                "participants": results,
+                "unknown_emails": unknown
+            }
+        )
 
     return {
-        "message": "Reuniones creadas con éxito",
-        "meetings": assigned_meetings
+        "message": "Reuniones creadas con éxito" if not failures else "Reuniones creadas con errores parciales",
+        "meetings": assigned_meetings,
+        "participants": results,
+        "failures": failures,
+        "unknown_emails": unknown
     }
 
 @router.post("/pending")
-def get_pending_questions(request: PendingQuestionsRequest):
+async def get_pending_questions(request: PendingQuestionsRequest):
     """
-    Devuelve la lista de preguntas de la reunión y el estado de sus respuestas.
+    Devuelve la lista de preguntas de la reunión y el estado de sus respuestas,
+    con los contadores de progreso (`total_questions`, `answered_questions`,
+    `complete`). Si los contadores indican que no hay ninguna respuesta no se
+    consultan las respuestas.
     """
     id_user = request.id_user
     id_meeting = request.id_meeting
 
-    # Obtener todas las preguntas de la reunión
-    questions_response = select_data("questions", {"id_meeting": id_meeting, "id_user": id_user})
-    if not questions_response.data:
-        return {"questions": []}
+    # Completitud con una lectura de `meeting_progress` (None sin sql/005)
+    progress, questions = await asyncio.gather(
+        aget_progress_if_available(id_meeting, id_user),
+        repository.aquestions_for(id_meeting, id_user),
+    )
+    if not questions:
+        return {"questions": [], "total_questions": 0, "answered_questions": 0, "complete": False}
 
-    # Obtener todas las respuestas de la reunión
-    answers_response = select_data("answers", {"id_meeting": id_meeting, "id_user": id_user})
-    
-    # Crear un mapa de id_question -> respuesta
-    answer_map = {}
-    if answers_response.data:
-        for answer in answers_response.data:
-            if answer["id_question"]:  # Solo si la respuesta tiene id_question
-                answer_map[answer["id_question"]] = answer["content"]
-    
-    # Determinar las preguntas respondidas
-    answered_ids = set(answer_map.keys())
+    # Obtener las respuestas de la reunión: mapa id_question -> respuesta
+    if progress is not None and progress["answered_questions"] == 0:
+        answers = {}
+    else:
+        answers = repository.answer_map(await repository.aanswers_for(id_meeting, id_user))
 
     # Armar la lista de preguntas con su estado y respuesta
-    questions = []
-    for q in questions_response.data:
-        q_id = q["id_question"]
-        is_answered = (q_id in answered_ids)
-        
+    result = []
+    for q in questions:
         question_data = {
-            "id_question": q_id,
-            "content": q["content"],
-            "answered": is_answered,
+            "id_question": q.id_question,
+            "content": q.content,
+            "answered": q.id_question in answers,
         }
         
         # Incluir la respuesta si la pregunta ha sido respondida
-        if is_answered:
-            question_data["answer"] = answer_map[q_id]
+        if question_data["answered"]:
+            question_data["answer"] = answers[q.id_question]
         
-        questions.append(question_data)
+        result.append(question_data)
 
-    return {"questions": questions}
+    if progress is None:
+        # Sin contadores se calculan con la lista
+        answered = sum(q["answered"] for q in result)
+        progress = {"total_questions": len(result), "answered_questions": answered, "complete": answered == len(result)}
+
+    return {
+        "questions": result,
+        "total_questions": progress["total_questions"],
+        "answered_questions": progress["answered_questions"],
+        "complete": progress["complete"],
+    }
 
 @router.get("/recent/{id_user}/{id_meeting}")
 def get_recent_questions(id_user: str, id_meeting: str):
@@ -159,66 +246,50 @@ def get_recent_questions(id_user: str, id_meeting: str):
     Devuelve las preguntas más recientes de un usuario en una reunión específica,
     ordenadas por fecha de creación (más reciente primero).
     """
-    # Obtener todas las preguntas de la reunión para ese usuario
-    questions_response = select_data(
-        "questions", 
-        {"id_meeting": id_meeting, "id_user": id_user},
-        order_by="created_at",
-        ascending=False,
-        limit=10  # Limitamos a las 10 más recientes
-    )
-    
-    if not questions_response.data:
+    # Las 10 preguntas más recientes de la reunión para ese usuario
+    questions = repository.recent_questions(id_meeting, id_user, limit=10)
+    if not questions:
         return {"questions": []}
     
-    # Obtener respuestas para estas preguntas
-    all_question_ids = [q["id_question"] for q in questions_response.data]
-    answers_response = select_data(
-        "answers",
-        {"id_meeting": id_meeting, "id_user": id_user, "id_question": all_question_ids}
+    # Obtener respuestas solo para estas preguntas
+    answered_map = repository.answer_map(
+        repository.answers_for(id_meeting, id_user, [q.id_question for q in questions])
     )
     
-    # Crear un mapa de id_question -> respuesta
-    answered_map = {}
-    if answers_response.data:
-        for answer in answers_response.data:
-            answered_map[answer["id_question"]] = answer["content"]
-    
     # Devolver las preguntas ordenadas con información de respuestas
-    questions = []
-    for q in questions_response.data:
-        question_id = q["id_question"]
-        questions.append({
-            "id_question": question_id,
-            "content": q["content"],
-            "created_at": q["created_at"],
-            "answered": question_id in answered_map,
-            "answer": answered_map.get(question_id, "")
-        })
-    
-    return {"questions": questions}
+    return {"questions": [
+        {
+            "id_question": q.id_question,
+            "content": q.content,
+            "created_at": q.created_at,
+            "answered": q.id_question in answered_map,
+            "answer": answered_map.get(q.id_question, "")
+        }
+        for q in questions
+    ]}
 
 @router.get("/debug/{id_meeting}/{id_user}")
-def debug_questions_answers(id_meeting: str, id_user: str):
+def debug_questions_answers(
+    id_meeting: str,
+    id_user: str,
+    limit: int = Query(5, ge=1, le=100),
+    questions_cursor: Optional[str] = None,
+    answers_cursor: Optional[str] = None
+):
     """
     Endpoint de diagnóstico para ver todas las preguntas y respuestas
     de un usuario en una reunión específica.
+    Devuelve las `limit` más recientes de cada una; `questions_cursor` y
+    `answers_cursor` piden las páginas siguientes.
     """
-    # Obtener información sobre la estructura de las tablas
-    questions_resp = select_data(
-        "questions", 
-        {"id_meeting": id_meeting, "id_user": id_user},
-        order_by="created_at",
-        ascending=False
-    )
-    
-    answers_resp = select_data(
-        "answers",
-        {"id_meeting": id_meeting, "id_user": id_user},
-        order_by="created_at",
-        ascending=False
-    )
-    
+    filters = {"id_meeting": id_meeting, "id_user": id_user}
+    questions_resp = _select_page("questions", filters, limit, "created_at", False, "*", questions_cursor)
+    answers_resp = _select_page("answers", filters, limit, "created_at", False, "*", answers_cursor)
+
+    # Totales con un recuento en la base de datos (sin descargar las filas)
+    questions_count = count_data("questions", filters)
+    answers_count = count_data("answers", filters)
+
     # Analizar la estructura de las preguntas
     question_fields = {}
     if questions_resp.data and len(questions_resp.data) > 0:
@@ -231,7 +302,7 @@ def debug_questions_answers(id_meeting: str, id_user: str):
     
     # Lista de preguntas y respuestas para análisis
     questions = []
-    for q in questions_resp.data[:5]:  # Solo las 5 más recientes para no sobrecargar
+    for q in questions_resp.data or []:
         question_item = {
             "id_question": q["id_question"],
             "content": q["content"][:100] + "..." if len(q["content"]) > 100 else q["content"],
@@ -240,7 +311,7 @@ def debug_questions_answers(id_meeting: str, id_user: str):
         questions.append(question_item)
     
     answers = []
-    for a in answers_resp.data[:5]:  # Solo las 5 más recientes
+    for a in answers_resp.data or []:
         answer_item = {
             "id_answer": a["id_answer"],
             "id_question": a["id_question"],
@@ -254,7 +325,8 @@ def debug_questions_answers(id_meeting: str, id_user: str):
         "answers_structure": answer_fields,
         "recent_questions": questions,
         "recent_answers": answers,
-        "questions_count": len(questions_resp.data),
-        "answers_count": len(answers_resp.data)
+        "questions_count": questions_count,
+        "answers_count": answers_count,
+        "next_questions_cursor": next_cursor(questions_resp.data, limit, "created_at", "questions"),
+        "next_answers_cursor": next_cursor(answers_resp.data, limit, "created_at", "answers")
     }
-
@@ -0,0 +1,111 @@
+"""
+Micro-benchmark de los constructores de contexto (`app/modules/context_builder.py`).
+
+Compara la versión anterior (filtrar todas las respuestas por cada pregunta y
+concatenar con `+=`) con la actual (agrupar una vez y unir fragmentos), y
+comprueba que ambas producen exactamente el mismo texto:
+
+    python benchmarks/context_builder_bench.py --questions 1000 --participants 50
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.modules.context_builder import build_analysis_context, build_chat_context
+
+def make_rows(num_questions: int, num_participants: int):
+    """Genera preguntas y una respuesta por participante y pregunta."""
+    questions = [{"id_question": q, "content": f"Pregunta número {q}"} for q in range(num_questions)]
+    answers = [
+        {
+            "id_question": q,
+            "id_user": u,
+            "email": f"user{u}@example.com",
+            "content": f"Respuesta del usuario {u} a la pregunta {q}",
+        }
+        for q in range(num_questions)
+        for u in range(num_participants)
+    ]
+    return questions, answers
+
+def naive_analysis_context(topic, questions, answers) -> str:
+    """Implementación anterior de `get_meeting_analysis`: O(preguntas × respuestas)."""
+    context = f"""
+    Tema de la reunión: {topic}
+
+    Preguntas y respuestas de los asistentes:
+    """
+    for q in questions:
+        context += f"\nPregunta: {q['content']}\n"
+        q_answers = [a for a in answers if a["id_question"] == q["id_question"]]
+        if q_answers:
+            for ans in q_answers:
+                user_email = ans.get("email") or "Usuario desconocido"
+                context += f"Respuesta de {user_email}: {ans['content']}\n"
+        else:
+            context += "Sin respuesta registrada.\n"
+    return context
+
+def naive_chat_context(topic, questions, answers) -> str:
+    """Implementación anterior de `build_context_from_db`: mapa de respuestas y `+=`."""
+    answer_map = {}
+    for ans in answers:
+        answer_map.setdefault(ans["id_question"], []).append(ans["content"])
+
+    context = f"=== CONTEXTO DE LA REUNIÓN ===\nTema: {topic}\n\n"
+    for q in questions:
+        qid = q["id_question"]
+        context += f"Pregunta: {q['content']}\n"
+        if qid in answer_map:
+            for idx, ans_txt in enumerate(answer_map[qid], start=1):
+                context += f"   Respuesta #{idx}: {ans_txt}\n"
+        else:
+            context += "   (Sin respuesta)\n"
+        context += "\n"
+    context += (
+        "=== FIN DEL CONTEXTO ===\n\n"
+        "Basándote en este contexto, profundiza en posibles inconsistencias, mejoras, "
+        "o información adicional que el usuario podría aportar.\n"
+    )
+    return context
+
+def best_of(func, args, repeat: int):
+    """Mejor tiempo de `repeat` ejecuciones y el resultado de la última."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark de los constructores de contexto")
+    parser.add_argument("--questions", type=int, default=1000)
+    parser.add_argument("--participants", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    questions, answers = make_rows(args.questions, args.participants)
+    topic = "Planificación trimestral"
+    print(f"{args.questions} preguntas × {args.participants} participantes = {len(answers)} respuestas")
+
+    cases = [
+        ("análisis", naive_analysis_context, build_analysis_context),
+        ("chat", naive_chat_context, build_chat_context),
+    ]
+    for name, old, new in cases:
+        old_time, old_text = best_of(old, (topic, questions, answers), args.repeat)
+        new_time, new_text = best_of(new, (topic, questions, answers), args.repeat)
+        if old_text != new_text:
+            raise SystemExit(f"❌ El texto de {name} no coincide con la implementación anterior")
+        print(
+            f"{name:>9}: anterior {old_time * 1000:9.1f} ms | actual {new_time * 1000:7.1f} ms "
+            f"| x{old_time / new_time:.1f} | {len(new_text) / 1024:.0f} KiB"
+        )
+
+if __name__ == "__main__":
+    main()
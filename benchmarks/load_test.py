@@ -0,0 +1,104 @@
+"""
+Prueba de carga para comparar la capacidad de peticiones concurrentes.
+
+Modo servidor: lanza peticiones concurrentes contra una API en marcha
+(por ejemplo la versión síncrona y la asíncrona de un mismo endpoint):
+
+    python benchmarks/load_test.py --url http://localhost:8080 \\
+        --path /analysis/analyze --payload '{"id_user": "1", "id_meeting": "1"}' \\
+        --requests 200 --concurrency 100
+
+Modo demo (sin base de datos ni OpenAI): compara en proceso un endpoint `def`
+que bloquea un hilo durante la latencia simulada con uno `async def` que la
+espera, para mostrar el efecto del threadpool de Starlette:
+
+    python benchmarks/load_test.py --demo --latency 0.5 --requests 200 --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+async def run_load(client: httpx.AsyncClient, method: str, path: str, payload, total: int, concurrency: int):
+    """Lanza `total` peticiones con como máximo `concurrency` en vuelo y devuelve las estadísticas."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=payload)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+    }
+
+def build_demo_app(latency: float):
+    """App mínima con la misma latencia simulada en una ruta síncrona y otra asíncrona."""
+    from fastapi import FastAPI
+
+    demo = FastAPI()
+
+    @demo.post("/sync")
+    def sync_route():
+        time.sleep(latency)  # Equivale a una llamada bloqueante a Supabase / GPT
+        return {"ok": True}
+
+    @demo.post("/async")
+    async def async_route():
+        await asyncio.sleep(latency)  # Equivale a `await aselect_data(...)` / `ainvoke`
+        return {"ok": True}
+
+    return demo
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--method", default="POST")
+    parser.add_argument("--payload", default=None, help="Cuerpo JSON de cada petición")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--demo", action="store_true", help="Compara rutas def/async def simuladas en proceso")
+    parser.add_argument("--latency", type=float, default=0.5, help="Latencia simulada en modo demo (s)")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    if args.demo:
+        transport = httpx.ASGITransport(app=build_demo_app(args.latency))
+        async with httpx.AsyncClient(transport=transport, base_url="http://demo", timeout=args.timeout, limits=limits) as client:
+            for path in ("/sync", "/async"):
+                stats = await run_load(client, "POST", path, None, args.requests, args.concurrency)
+                print(json.dumps({"path": path, **stats}))
+        return
+
+    payload = json.loads(args.payload) if args.payload else None
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        stats = await run_load(client, args.method, args.path, payload, args.requests, args.concurrency)
+        print(json.dumps({"path": args.path, **stats}))
+
+if __name__ == "__main__":
+    asyncio.run(main())
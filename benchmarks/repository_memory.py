@@ -0,0 +1,78 @@
+"""
+Memoria de 10k filas como diccionarios (lo que devuelve `response.data`, con
+todas las columnas) frente a los registros con `__slots__` de
+`app/database/repository.py` (solo las columnas que se usan):
+
+    python benchmarks/repository_memory.py --rows 10000
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# El repositorio importa la configuración, que exige estas variables
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+
+from app.database.repository import Answer, Question, _records
+
+def make_rows(table: str, count: int) -> list:
+    """Filas como las devuelve PostgREST con `select("*")`."""
+    if table == "questions":
+        return [
+            {
+                "id_question": 100000 + i,
+                "id_meeting": 5000 + i // 50,
+                "id_user": 300 + i % 50,
+                "content": f"¿Cuál es el estado actual del punto {i} y qué bloqueos existen?",
+                "created_at": f"2025-03-{1 + i % 28:02d}T10:{i % 60:02d}:00.000000+00:00",
+            }
+            for i in range(count)
+        ]
+    return [
+        {
+            "id_answer": 200000 + i,
+            "id_question": 100000 + i,
+            "id_meeting": 5000 + i // 50,
+            "id_user": 300 + i % 50,
+            "content": f"Respuesta número {i}: el punto avanza según lo previsto.",
+            "created_at": f"2025-03-{1 + i % 28:02d}T11:{i % 60:02d}:00.000000+00:00",
+        }
+        for i in range(count)
+    ]
+
+def measure(build) -> int:
+    """Bytes que siguen asignados después de construir la estructura."""
+    gc.collect()
+    tracemalloc.start()
+    data = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return size
+
+def container_size(rows: list, convert) -> int:
+    """Memoria del contenedor (lista + filas), sin contar los valores compartidos."""
+    return measure(lambda: convert(rows))
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria de dicts frente a registros con __slots__")
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    for table, cls in (("questions", Question), ("answers", Answer)):
+        rows = make_rows(table, args.rows)
+        # Copias de los dicts frente a registros que reutilizan los mismos valores:
+        # se mide solo el coste de la estructura de cada fila
+        dicts = container_size(rows, lambda r: [dict(row) for row in r])
+        records = container_size(rows, lambda r: _records(cls, r))
+        print(
+            f"{table:>9}: dicts {dicts / 1024:8.0f} KiB | __slots__ {records / 1024:8.0f} KiB "
+            f"| {dicts / args.rows:5.0f} B/fila frente a {records / args.rows:4.0f} B/fila | -{100 * (1 - records / dicts):.0f}%"
+        )
+
+if __name__ == "__main__":
+    main()
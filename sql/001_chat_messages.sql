@@ -0,0 +1,11 @@
+-- Historial persistente del chat (CHAT_HISTORY_BACKEND=supabase).
+-- El orden de los mensajes lo asigna la base de datos (`id_message`): varios
+-- procesos pueden añadir mensajes a la misma sesión sin calcular posiciones.
+create table if not exists chat_messages (
+    id_message bigint generated always as identity primary key,
+    session_id text not null,
+    message jsonb not null,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists chat_messages_session_idx on chat_messages (session_id, id_message);
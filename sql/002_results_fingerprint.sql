@@ -0,0 +1,5 @@
+-- Huella del contenido analizado, para reutilizar análisis sin cambios (/analysis/analyze)
+alter table results add column if not exists fingerprint text;
+
+create index if not exists results_meeting_fingerprint_idx
+    on results (id_meeting, fingerprint, created_at desc);
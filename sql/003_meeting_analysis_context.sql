@@ -0,0 +1,24 @@
+-- Contexto completo de una reunión para el análisis en una sola llamada:
+-- reunión, preguntas y respuestas con el email de quien respondió.
+create or replace function meeting_analysis_context(p_id_meeting bigint)
+returns jsonb
+language sql
+stable
+as $$
+    select jsonb_build_object(
+        'meeting', (
+            select to_jsonb(m) from meetings m where m.id_meeting = p_id_meeting
+        ),
+        'questions', coalesce((
+            select jsonb_agg(to_jsonb(q) order by q.id_question)
+            from questions q
+            where q.id_meeting = p_id_meeting
+        ), '[]'::jsonb),
+        'answers', coalesce((
+            select jsonb_agg(to_jsonb(a) || jsonb_build_object('email', u.email) order by a.id_answer)
+            from answers a
+            left join "user" u on u.id_user = a.id_user
+            where a.id_meeting = p_id_meeting
+        ), '[]'::jsonb)
+    );
+$$;
@@ -0,0 +1,34 @@
+-- Reuniones de un usuario con todas sus preguntas respondidas (listas para analizar),
+-- paginadas. `total_count` es el total sin paginar.
+create or replace function ready_meetings(p_id_user bigint, p_limit integer default 50, p_offset integer default 0)
+returns table (
+    id_meeting bigint,
+    topic text,
+    total_questions bigint,
+    answered_questions bigint,
+    total_count bigint
+)
+language sql
+stable
+as $$
+    with progress as (
+        select
+            m.id_meeting,
+            m.topic,
+            count(distinct q.id_question) as total_questions,
+            count(distinct a.id_question) as answered_questions
+        from meetings m
+        join questions q on q.id_meeting = m.id_meeting and q.id_user = p_id_user
+        left join answers a on a.id_question = q.id_question and a.id_user = p_id_user
+        where m.id_user = p_id_user
+        group by m.id_meeting, m.topic
+    )
+    select id_meeting, topic, total_questions, answered_questions, count(*) over () as total_count
+    from progress
+    where answered_questions = total_questions
+    order by id_meeting desc
+    limit p_limit offset p_offset;
+$$;
+
+create index if not exists questions_user_meeting_idx on questions (id_user, id_meeting);
+create index if not exists answers_user_question_idx on answers (id_user, id_question);
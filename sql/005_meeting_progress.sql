@@ -0,0 +1,103 @@
+-- Progreso por (reunión, usuario): preguntas totales, respondidas y última actividad.
+-- Se actualiza en las rutas de escritura (ver app/modules/progress.py) y se puede
+-- reconstruir desde cero con `select rebuild_meeting_progress();`
+-- o `python -m app.modules.progress --reconcile`.
+create table if not exists meeting_progress (
+    id_meeting bigint not null,
+    id_user bigint not null,
+    total_questions integer not null default 0,
+    answered_questions integer not null default 0,
+    last_activity timestamptz not null default now(),
+    primary key (id_meeting, id_user)
+);
+
+create index if not exists meeting_progress_user_idx on meeting_progress (id_user, id_meeting desc);
+
+-- Suma preguntas nuevas al contador de la pareja (reunión, usuario)
+create or replace function bump_meeting_progress(p_id_meeting bigint, p_id_user bigint, p_questions integer)
+returns void
+language sql
+as $$
+    insert into meeting_progress (id_meeting, id_user, total_questions, last_activity)
+    values (p_id_meeting, p_id_user, p_questions, now())
+    on conflict (id_meeting, id_user) do update
+        set total_questions = meeting_progress.total_questions + excluded.total_questions,
+            last_activity = now();
+$$;
+
+-- Cuenta una respuesta: solo la primera respuesta del usuario a una pregunta la marca como respondida
+create or replace function record_answer_progress(p_id_meeting bigint, p_id_user bigint, p_id_question bigint)
+returns void
+language sql
+as $$
+    insert into meeting_progress (id_meeting, id_user, answered_questions, last_activity)
+    values (
+        p_id_meeting,
+        p_id_user,
+        case when (
+            select count(*) from answers
+            where id_question = p_id_question and id_user = p_id_user
+        ) = 1 then 1 else 0 end,
+        now()
+    )
+    on conflict (id_meeting, id_user) do update
+        set answered_questions = meeting_progress.answered_questions + excluded.answered_questions,
+            last_activity = now();
+$$;
+
+-- Reconstruye todos los contadores a partir de `questions` y `answers`; devuelve las filas escritas
+create or replace function rebuild_meeting_progress()
+returns integer
+language plpgsql
+as $$
+declare
+    written integer;
+begin
+    delete from meeting_progress where true;
+
+    insert into meeting_progress (id_meeting, id_user, total_questions, answered_questions, last_activity)
+    select
+        q.id_meeting,
+        q.id_user,
+        count(distinct q.id_question),
+        count(distinct a.id_question),
+        coalesce(max(q.created_at), now())
+    from questions q
+    left join answers a on a.id_question = q.id_question and a.id_user = q.id_user
+    where q.id_user is not null
+    group by q.id_meeting, q.id_user;
+
+    get diagnostics written = row_count;
+    return written;
+end;
+$$;
+
+-- /analysis/ready lee los contadores en lugar de agrupar preguntas y respuestas
+create or replace function ready_meetings(p_id_user bigint, p_limit integer default 50, p_offset integer default 0)
+returns table (
+    id_meeting bigint,
+    topic text,
+    total_questions bigint,
+    answered_questions bigint,
+    total_count bigint
+)
+language sql
+stable
+as $$
+    select
+        p.id_meeting,
+        m.topic,
+        p.total_questions::bigint,
+        p.answered_questions::bigint,
+        count(*) over () as total_count
+    from meeting_progress p
+    join meetings m on m.id_meeting = p.id_meeting
+    where p.id_user = p_id_user
+      and p.total_questions > 0
+      and p.answered_questions >= p.total_questions
+    order by p.id_meeting desc
+    limit p_limit offset p_offset;
+$$;
+
+-- Rellena los contadores con las preguntas y respuestas que ya existen
+select rebuild_meeting_progress();
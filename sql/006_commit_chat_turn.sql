@@ -0,0 +1,93 @@
+-- Guarda un turno de /chat/conversation en una sola transacción:
+-- 1. Busca la pregunta abierta (la más reciente sin respuesta entre las 10 últimas).
+-- 2. Guarda la respuesta del usuario asociada a ella (o sin pregunta si no hay ninguna).
+-- 3. Guarda la respuesta de GPT como nueva pregunta.
+-- 4. Actualiza los contadores de meeting_progress (sql/005).
+-- En el inicio automático `p_answer` es null y solo se guarda la nueva pregunta.
+-- Devuelve los IDs escritos y los datos de debug del turno.
+create or replace function commit_chat_turn(
+    p_id_meeting bigint,
+    p_id_user bigint,
+    p_answer text,
+    p_question text
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_recent jsonb := '[]'::jsonb;
+    v_answered jsonb := '[]'::jsonb;
+    v_selected jsonb;
+    v_open_id bigint;
+    v_id_answer bigint;
+    v_new_id bigint;
+begin
+    -- Dos turnos simultáneos de la misma pareja no deben elegir la misma pregunta abierta
+    perform pg_advisory_xact_lock(hashtextextended(p_id_meeting::text || ':' || p_id_user::text, 0));
+
+    if p_answer is not null then
+        select coalesce(jsonb_agg(jsonb_build_object(
+                   'id', r.id_question, 'content', r.content, 'created_at', r.created_at
+               ) order by r.created_at desc), '[]'::jsonb)
+        into v_recent
+        from (
+            select id_question, content, created_at from questions
+            where id_meeting = p_id_meeting and id_user = p_id_user
+            order by created_at desc
+            limit 3
+        ) r;
+
+        select coalesce(jsonb_agg(jsonb_build_object(
+                   'id_question', a.id_question, 'id_answer', a.id_answer, 'content', a.content
+               ) order by a.id_answer), '[]'::jsonb)
+        into v_answered
+        from (
+            select id_question, id_answer, content from answers
+            where id_meeting = p_id_meeting and id_user = p_id_user and id_question is not null
+            order by id_answer
+            limit 3
+        ) a;
+
+        select q.id_question,
+               jsonb_build_object('id', q.id_question, 'content', q.content, 'created_at', q.created_at)
+        into v_open_id, v_selected
+        from (
+            select id_question, content, created_at from questions
+            where id_meeting = p_id_meeting and id_user = p_id_user
+            order by created_at desc
+            limit 10
+        ) q
+        where not exists (
+            select 1 from answers a
+            where a.id_question = q.id_question
+              and a.id_meeting = p_id_meeting
+              and a.id_user = p_id_user
+        )
+        order by q.created_at desc
+        limit 1;
+
+        insert into answers (id_question, id_user, id_meeting, content)
+        values (v_open_id, p_id_user, p_id_meeting, p_answer)
+        returning id_answer into v_id_answer;
+
+        if v_open_id is not null then
+            perform record_answer_progress(p_id_meeting, p_id_user, v_open_id);
+        end if;
+    end if;
+
+    insert into questions (id_meeting, id_user, content)
+    values (p_id_meeting, p_id_user, p_question)
+    returning id_question into v_new_id;
+
+    perform bump_meeting_progress(p_id_meeting, p_id_user, 1);
+
+    return jsonb_build_object(
+        'id_answer', v_id_answer,
+        'id_question', v_open_id,
+        'new_id_question', v_new_id,
+        'selected_question', v_selected,
+        'recent_questions', v_recent,
+        'answered_questions', v_answered
+    );
+end;
+$$;
@@ -0,0 +1,144 @@
+-- Puntero a la pregunta abierta del chat por (reunión, usuario) en meeting_progress:
+-- el turno sabe a qué pregunta responde el usuario con una lectura por clave,
+-- sin cargar las preguntas recientes ni todas sus respuestas.
+alter table meeting_progress add column if not exists open_question_id bigint;
+
+-- Valor inicial: la pregunta más reciente sin respuesta de cada pareja
+create or replace function latest_open_question(p_id_meeting bigint, p_id_user bigint)
+returns bigint
+language sql
+stable
+as $$
+    select q.id_question
+    from questions q
+    where q.id_meeting = p_id_meeting
+      and q.id_user = p_id_user
+      and not exists (
+          select 1 from answers a
+          where a.id_question = q.id_question and a.id_user = p_id_user
+      )
+    order by q.created_at desc
+    limit 1;
+$$;
+
+update meeting_progress
+set open_question_id = latest_open_question(id_meeting, id_user)
+where open_question_id is null;
+
+-- Una respuesta a la pregunta abierta (también desde /answers/create) cierra el puntero
+create or replace function record_answer_progress(p_id_meeting bigint, p_id_user bigint, p_id_question bigint)
+returns void
+language sql
+as $$
+    insert into meeting_progress (id_meeting, id_user, answered_questions, last_activity)
+    values (
+        p_id_meeting,
+        p_id_user,
+        case when (
+            select count(*) from answers
+            where id_question = p_id_question and id_user = p_id_user
+        ) = 1 then 1 else 0 end,
+        now()
+    )
+    on conflict (id_meeting, id_user) do update
+        set answered_questions = meeting_progress.answered_questions + excluded.answered_questions,
+            last_activity = now(),
+            open_question_id = case
+                when meeting_progress.open_question_id = p_id_question then null
+                else meeting_progress.open_question_id
+            end;
+$$;
+
+-- La reconstrucción también recalcula el puntero
+create or replace function rebuild_meeting_progress()
+returns integer
+language plpgsql
+as $$
+declare
+    written integer;
+begin
+    delete from meeting_progress where true;
+
+    insert into meeting_progress (id_meeting, id_user, total_questions, answered_questions, last_activity)
+    select
+        q.id_meeting,
+        q.id_user,
+        count(distinct q.id_question),
+        count(distinct a.id_question),
+        coalesce(max(q.created_at), now())
+    from questions q
+    left join answers a on a.id_question = q.id_question and a.id_user = q.id_user
+    where q.id_user is not null
+    group by q.id_meeting, q.id_user;
+
+    get diagnostics written = row_count;
+
+    update meeting_progress
+    set open_question_id = latest_open_question(id_meeting, id_user);
+
+    return written;
+end;
+$$;
+
+-- El turno lee y mueve el puntero en lugar de buscar la pregunta abierta
+create or replace function commit_chat_turn(
+    p_id_meeting bigint,
+    p_id_user bigint,
+    p_answer text,
+    p_question text
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_selected jsonb;
+    v_open_id bigint;
+    v_id_answer bigint;
+    v_new_id bigint;
+begin
+    -- Dos turnos simultáneos de la misma pareja no deben responder a la misma pregunta
+    perform pg_advisory_xact_lock(hashtextextended(p_id_meeting::text || ':' || p_id_user::text, 0));
+
+    if p_answer is not null then
+        select open_question_id into v_open_id
+        from meeting_progress
+        where id_meeting = p_id_meeting and id_user = p_id_user;
+
+        -- Sin puntero (reunión recién creada, o la pregunta abierta se respondió por
+        -- /answers/create): la pregunta más reciente sin respuesta, como la versión local
+        if v_open_id is null then
+            v_open_id := latest_open_question(p_id_meeting, p_id_user);
+        end if;
+
+        select jsonb_build_object('id', id_question, 'content', content, 'created_at', created_at)
+        into v_selected
+        from questions
+        where id_question = v_open_id;
+
+        insert into answers (id_question, id_user, id_meeting, content)
+        values (v_open_id, p_id_user, p_id_meeting, p_answer)
+        returning id_answer into v_id_answer;
+
+        if v_open_id is not null then
+            perform record_answer_progress(p_id_meeting, p_id_user, v_open_id);
+        end if;
+    end if;
+
+    insert into questions (id_meeting, id_user, content)
+    values (p_id_meeting, p_id_user, p_question)
+    returning id_question into v_new_id;
+
+    perform bump_meeting_progress(p_id_meeting, p_id_user, 1);
+
+    update meeting_progress
+    set open_question_id = v_new_id
+    where id_meeting = p_id_meeting and id_user = p_id_user;
+
+    return jsonb_build_object(
+        'id_answer', v_id_answer,
+        'id_question', v_open_id,
+        'new_id_question', v_new_id,
+        'selected_question', v_selected
+    );
+end;
+$$;
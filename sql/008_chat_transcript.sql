@@ -0,0 +1,39 @@
+-- Conversación de un usuario en una reunión como una sola secuencia de mensajes:
+-- preguntas (las genera GPT: rol 'ai') y respuestas (rol 'human'), de la más
+-- reciente a la más antigua. Una respuesta y la pregunta siguiente se guardan en
+-- la misma transacción (commit_chat_turn) y comparten `created_at`: a igualdad,
+-- la respuesta del usuario va antes que la pregunta de GPT.
+-- Paginación por clave sobre (created_at, rol, id): la página siguiente empieza
+-- después de (p_before, p_before_role, p_before_id) de la última fila. El rol
+-- forma parte de la clave porque los ids de preguntas y respuestas vienen de
+-- secuencias distintas y pueden coincidir.
+-- La usa la rehidratación del historial del chat (app/modules/chat_history.py).
+drop function if exists chat_transcript(bigint, bigint, integer, timestamptz, bigint);
+
+create or replace function chat_transcript(
+    p_id_meeting bigint,
+    p_id_user bigint,
+    p_limit integer default 50,
+    p_before timestamptz default null,
+    p_before_role text default null,
+    p_before_id bigint default null
+)
+returns table (role text, id bigint, content text, created_at timestamptz)
+language sql
+stable
+as $$
+    select t.role, t.id, t.content, t.created_at
+    from (
+        select 'ai'::text as role, q.id_question as id, q.content, q.created_at
+        from questions q
+        where q.id_meeting = p_id_meeting and q.id_user = p_id_user
+        union all
+        select 'human'::text, a.id_answer, a.content, a.created_at
+        from answers a
+        where a.id_meeting = p_id_meeting and a.id_user = p_id_user
+    ) t
+    where p_before is null
+       or (t.created_at, t.role = 'ai', t.id) < (p_before, p_before_role = 'ai', p_before_id)
+    order by t.created_at desc, t.role = 'ai' desc, t.id desc
+    limit p_limit;
+$$;
@@ -0,0 +1,7 @@
+-- Latencia y endpoint de origen de cada llamada a OpenAI en `openai_requests`
+-- (las filas las escribe por lotes app/modules/llm_usage.py)
+alter table openai_requests add column if not exists latency_ms integer;
+alter table openai_requests add column if not exists endpoint text;
+alter table openai_requests add column if not exists created_at timestamptz not null default now();
+
+create index if not exists openai_requests_endpoint_idx on openai_requests (endpoint, created_at desc);
@@ -0,0 +1,15 @@
+-- Búsqueda de usuarios por correo sin distinguir mayúsculas ni espacios
+-- (`user_resolver`): una sola consulta por lote, apoyada en un índice sobre lower(email).
+create index if not exists user_email_lower_idx on "user" (lower(email));
+
+create or replace function users_by_emails(p_emails text[])
+returns table (id_user bigint, email text)
+language sql
+stable
+as $$
+    select u.id_user, u.email
+    from "user" u
+    where lower(u.email) = any (
+        select lower(trim(e)) from unnest(p_emails) as e
+    );
+$$;
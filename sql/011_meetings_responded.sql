@@ -0,0 +1,21 @@
+-- Reuniones (id_meeting, topic) en las que un usuario tiene al menos una respuesta,
+-- paginadas por clave sobre id_meeting (la página siguiente empieza después de
+-- `p_after`). Sustituye a recorrer todas las respuestas del usuario para reunir
+-- los ids y consultarlos después con un `in` sin límite (/answers/meetings_responded).
+create index if not exists answers_user_meeting_idx on answers (id_user, id_meeting);
+
+create or replace function meetings_responded(p_id_user bigint, p_limit integer default 50, p_after bigint default null)
+returns table (id_meeting bigint, topic text)
+language sql
+stable
+as $$
+    select m.id_meeting, m.topic
+    from meetings m
+    where (p_after is null or m.id_meeting > p_after)
+      and exists (
+          select 1 from answers a
+          where a.id_meeting = m.id_meeting and a.id_user = p_id_user
+      )
+    order by m.id_meeting
+    limit p_limit;
+$$;
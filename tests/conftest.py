@@ -0,0 +1,49 @@
+import os
+
+# `app.config` exige las variables de Supabase al importarse; los tests no
+# llegan a conectarse (el acceso a datos se sustituye en cada test)
+os.environ.setdefault("SUPABASE_URL", "https://test.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from types import SimpleNamespace
+
+import pytest
+
+class FakeQuery:
+    """Consulta de postgrest que registra las llamadas encadenadas (`eq`, `order`...)."""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.calls = []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return method
+
+    def called(self, name) -> list:
+        return [args for call, args, _ in self.calls if call == name]
+
+    def execute(self):
+        self.client.executed.append(self)
+        return SimpleNamespace(data=self.client.handler(self), count=None)
+
+class FakeClient:
+    """Cliente de Supabase falso: `handler(query)` decide las filas de cada respuesta."""
+
+    def __init__(self):
+        self.handler = lambda query: []
+        self.executed = []
+
+    def from_(self, table):
+        return FakeQuery(self, table)
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    from app.database import supabase_api
+    client = FakeClient()
+    monkeypatch.setattr(supabase_api, "get_client", lambda: client)
+    return client
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+from app.models.schemas import AnalysisRequest
+from app.modules.jobs import DONE, QUEUED, RUNNING, Job, JobQueue, SQLiteJobStore
+from app.routers import analysis
+
+def slow_handler(calls: list):
+    """Handler que tarda un poco (para que los envíos coincidan con el trabajo en curso)."""
+    async def handler(payload):
+        calls.append(payload)
+        await asyncio.sleep(0.05)
+        return {"n": len(calls)}
+    return handler
+
+def test_same_key_is_deduplicated_while_in_flight():
+    calls = []
+
+    async def scenario():
+        queue = JobQueue(slow_handler(calls))
+        await queue.start()
+        first, deduplicated_first = await queue.submit("m1", {"id": 1})
+        second, deduplicated_second = await queue.submit("m1", {"id": 1})
+        other, _ = await queue.submit("m2", {"id": 2})
+        await queue.wait(first.id_job, timeout=2)
+        await queue.wait(other.id_job, timeout=2)
+        # Terminado el trabajo, la misma clave vuelve a encolarse
+        again, deduplicated_again = await queue.submit("m1", {"id": 1})
+        await queue.stop()
+        return first, second, other, again, deduplicated_first, deduplicated_second, deduplicated_again
+
+    first, second, other, again, *flags = asyncio.run(scenario())
+    assert second is first and other.id_job != first.id_job and again.id_job != first.id_job
+    assert flags == [False, True, False]
+    assert first.status == DONE
+
+def test_shared_store_runs_each_job_once(tmp_path):
+    calls = []
+    path = str(tmp_path / "jobs.db")
+
+    async def scenario():
+        queues = [JobQueue(slow_handler(calls), store=SQLiteJobStore(path), poll_interval=0.05) for _ in range(2)]
+        for queue in queues:
+            await queue.start()
+        # Los dos envíos compiten por el store: cualquiera de ellos puede ganar
+        (job, deduplicated), (same, same_deduplicated) = await asyncio.gather(
+            queues[0].submit("m1", {"id": 1}), queues[1].submit("m1", {"id": 1})
+        )
+        results = [await queue.wait(job.id_job, timeout=2) for queue in queues]
+        for queue in queues:
+            await queue.stop()
+        return job, same, [deduplicated, same_deduplicated], results
+
+    job, same, flags, results = asyncio.run(scenario())
+    assert same.id_job == job.id_job
+    assert sorted(flags) == [False, True]
+    assert len(calls) == 1
+    assert [result.status for result in results] == [DONE, DONE]
+
+def test_store_claim_is_exclusive(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store, other = SQLiteJobStore(path), SQLiteJobStore(path)
+    job = Job(id_job="j1", key="m1", payload={})
+
+    assert store.add(job) is None
+    assert other.add(Job(id_job="j2", key="m1", payload={})).id_job == "j1"
+    assert store.claim("j1") is True
+    assert other.claim("j1") is False
+    assert other.get("j1").status == RUNNING
+
+def test_stale_running_jobs_are_requeued(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"), stale_after=0)
+    store.add(Job(id_job="j1", key="m1", payload={}))
+    store.claim("j1")
+    time.sleep(0.01)
+
+    assert [(job.id_job, job.status) for job in store.pending()] == [("j1", QUEUED)]
+
+def test_force_is_part_of_the_job_key(monkeypatch):
+    calls = []
+
+    async def scenario():
+        queue = JobQueue(slow_handler(calls))
+        monkeypatch.setattr(analysis, "analysis_jobs", queue)
+        await queue.start()
+        cached = await analysis.submit_analysis_job(AnalysisRequest(id_user="u", id_meeting="m1"))
+        cached_again = await analysis.submit_analysis_job(AnalysisRequest(id_user="u", id_meeting="m1"))
+        forced = await analysis.submit_analysis_job(AnalysisRequest(id_user="u", id_meeting="m1", force=True))
+        await queue.stop()
+        return cached, cached_again, forced
+
+    cached, cached_again, forced = asyncio.run(scenario())
+    assert cached_again == {**cached, "deduplicated": True}
+    # Un análisis normal en curso no cubre una petición que pide ignorar la caché
+    assert forced["id_job"] != cached["id_job"] and not forced["deduplicated"]
@@ -0,0 +1,82 @@
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+from langchain_openai import ChatOpenAI
+
+from app.modules import llm_cache
+from app.modules.llm_cache import LangChainLLMCache, LLMCache, _temperature, should_cache, use_llm_cache
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    """Caché vacía y política por defecto (solo temperatura 0) en cada test."""
+    monkeypatch.setattr(llm_cache, "llm_cache", LLMCache())
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_MAX_TEMPERATURE", 0.0)
+
+def llm_string(**kwargs) -> str:
+    return ChatOpenAI(model="gpt-4", api_key="sk-test", **kwargs)._get_llm_string()
+
+def test_temperature_from_llm_string():
+    assert _temperature(llm_string(temperature=0)) == 0
+    assert _temperature(llm_string(temperature=0.7)) == 0.7
+    assert _temperature(llm_string()) is None
+    assert _temperature("no es json---") is None
+
+def test_should_cache_policy(monkeypatch):
+    assert should_cache(0) and should_cache("0")
+    assert not should_cache(0.7)
+    # Sin temperatura explícita no se cachea
+    assert not should_cache(None)
+    with use_llm_cache(True):
+        assert should_cache(0.7)
+    with use_llm_cache(False):
+        assert not should_cache(0)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", False)
+    assert not should_cache(0)
+
+def test_lru_eviction_and_ttl():
+    cache = LLMCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("1", None, "3")
+    expired = LLMCache(ttl=0)
+    expired.set("a", "1")
+    assert expired.get("a") is None
+
+def test_sqlite_level_survives_restarts(tmp_path):
+    path = str(tmp_path / "llm.db")
+    LLMCache(path=path).set("a", "1")
+    cache = LLMCache(path=path)
+
+    assert cache.get("a") == "1"
+    assert cache.get("a") == "1"
+    assert cache.stats()["disk_hits"] == 1 and cache.stats()["memory_hits"] == 1
+
+def test_completions_follow_the_temperature():
+    deterministic = {"model": "gpt-4", "messages": [], "temperature": 0}
+    creative = {**deterministic, "temperature": 0.7}
+    response = {"choices": [{"message": {"content": "hola"}}]}
+    llm_cache.set_completion(deterministic, response)
+    llm_cache.set_completion(creative, response)
+
+    assert llm_cache.get_completion(deterministic) == response
+    assert llm_cache.get_completion(deterministic, use_cache=False) is None
+    assert llm_cache.get_completion(creative) is None
+
+def test_langchain_adapter_round_trip():
+    adapter = LangChainLLMCache()
+    generations = [ChatGeneration(message=AIMessage(content="hola", usage_metadata={
+        "input_tokens": 3, "output_tokens": 1, "total_tokens": 4,
+    }))]
+    adapter.update("prompt", llm_string(temperature=0), generations)
+    adapter.update("prompt", llm_string(temperature=0.7), generations)
+
+    cached = adapter.lookup("prompt", llm_string(temperature=0))
+    assert [generation.message.content for generation in cached] == ["hola"]
+    # Una respuesta de la caché no cuenta como consumo de tokens
+    assert cached[0].message.usage_metadata is None
+    assert adapter.lookup("prompt", llm_string(temperature=0.7)) is None
+    assert adapter.lookup("otro", llm_string(temperature=0)) is None
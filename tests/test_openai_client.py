@@ -0,0 +1,122 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.modules import open_ai
+from app.modules.open_ai import AnalizadorReunion, OpenAIClient, OpenAIError
+
+COMPLETION = {
+    "model": "gpt-3.5-turbo",
+    "choices": [{"message": {"role": "assistant", "content": "  respuesta  "}}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 5},
+}
+
+# Temperatura > LLM_CACHE_MAX_TEMPERATURE: la caché de respuestas no interviene
+PAYLOAD = {"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": "hola"}], "temperature": 0.7}
+
+class FakeOpenAI:
+    """Servidor `/chat/completions` local que responde según una lista de pasos."""
+
+    def __init__(self, steps):
+        self.steps = list(steps)
+        self.requests = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                fake.requests.append((self.path, time.monotonic(), body))
+                status, headers, delay = fake.steps.pop(0) if fake.steps else (200, {}, 0)
+                time.sleep(delay)
+                data = json.dumps(COMPLETION if status == 200 else {"error": "fallo"}).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except OSError:
+                    pass  # el cliente ya cortó por timeout
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture(autouse=True)
+def no_usage_recording(monkeypatch):
+    monkeypatch.setattr(open_ai, "record_completion", lambda *args: None)
+
+@pytest.fixture
+def fake_openai():
+    servers = []
+
+    def start(*steps):
+        server = FakeOpenAI(steps)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+def make_client(url, **options):
+    options = {"timeout": 2, "connect_timeout": 1, "max_retries": 2, "backoff_base": 0.01, **options}
+    return OpenAIClient("sk-test", base_url=url, **options)
+
+def test_429_waits_for_retry_after(fake_openai):
+    server = fake_openai((429, {"Retry-After": "0.3"}, 0))
+    data = asyncio.run(make_client(server.url).chat_completion(PAYLOAD))
+
+    assert data["choices"][0]["message"]["content"] == "  respuesta  "
+    assert [path for path, _, _ in server.requests] == ["/v1/chat/completions"] * 2
+    assert server.requests[1][1] - server.requests[0][1] >= 0.3
+
+def test_5xx_retries_with_exponential_backoff(fake_openai, monkeypatch):
+    server = fake_openai((503, {}, 0), (500, {}, 0))
+    client = make_client(server.url)
+    waits = []
+    backoff = client._backoff
+    monkeypatch.setattr(client, "_backoff", lambda attempt, retry_after=None: waits.append(attempt) or backoff(attempt, retry_after))
+
+    asyncio.run(client.chat_completion(PAYLOAD))
+
+    assert len(server.requests) == 3
+    assert waits == [0, 1]
+    assert all(0 <= client._backoff(attempt) <= client.backoff_base * 2 ** attempt for attempt in range(5))
+
+def test_5xx_gives_up_after_max_retries(fake_openai):
+    server = fake_openai(*[(502, {}, 0)] * 3)
+    with pytest.raises(OpenAIError) as error:
+        asyncio.run(make_client(server.url).chat_completion(PAYLOAD))
+
+    assert error.value.status_code == 502
+    assert len(server.requests) == 3
+
+def test_read_timeout_is_retried_then_raised(fake_openai):
+    server = fake_openai(*[(200, {}, 1.0)] * 2)
+    start = time.monotonic()
+    with pytest.raises(OpenAIError, match="conexión"):
+        asyncio.run(make_client(server.url, timeout=0.2, max_retries=1).chat_completion(PAYLOAD))
+
+    assert len(server.requests) == 2
+    assert time.monotonic() - start < 2
+
+def test_analizador_uses_shared_client(fake_openai):
+    server = fake_openai()
+    analizador = AnalizadorReunion(client=make_client(server.url))
+
+    assert analizador.analizar_necesidad_reunion("contexto") == "respuesta"
+    assert server.requests[0][2]["messages"][1]["content"] == "contexto"
@@ -0,0 +1,65 @@
+import pytest
+
+from app.database import cache
+from app.database.supabase_api import insert_data, insert_many, select_data, update_data
+
+@pytest.fixture(autouse=True)
+def request_only(monkeypatch):
+    """Solo el mapa de identidad por petición, salvo que el test active la caché del proceso."""
+    monkeypatch.setattr(cache, "DB_CACHE_TTL", 0)
+    cache.clear()
+    yield
+    cache.clear()
+
+def test_reads_are_cached_within_a_request(fake_db):
+    fake_db.handler = lambda query: [{"id_meeting": 1}]
+    with cache.request_scope():
+        first = select_data("meetings", {"id_meeting": 1})
+        second = select_data("meetings", {"id_meeting": 1})
+        select_data("meetings", {"id_meeting": 2})
+
+    assert second is first
+    assert len(fake_db.executed) == 2
+
+def test_reads_outside_a_request_are_not_cached(fake_db):
+    select_data("meetings", {"id_meeting": 1})
+    select_data("meetings", {"id_meeting": 1})
+
+    assert len(fake_db.executed) == 2
+
+@pytest.mark.parametrize("write", [
+    lambda: insert_data("answers", {"answer": "a"}),
+    lambda: insert_many("answers", [{"answer": "a"}], id_column="answer"),
+    lambda: update_data("answers", {"id_answer": 1}, {"answer": "b"}),
+])
+def test_writes_invalidate_their_table(fake_db, write):
+    fake_db.handler = lambda query: query.called("insert")[0][0] if query.called("insert") else []
+    with cache.request_scope():
+        select_data("answers", {"id_user": "u"})
+        select_data("meetings", {"id_meeting": 1})
+        write()
+        select_data("answers", {"id_user": "u"})
+        select_data("meetings", {"id_meeting": 1})
+
+    selects = [query.table for query in fake_db.executed if query.called("select")]
+    assert selects == ["answers", "meetings", "answers"]
+
+def test_process_cache_is_shared_and_invalidated(fake_db, monkeypatch):
+    monkeypatch.setattr(cache, "DB_CACHE_TTL", 60)
+    monkeypatch.setattr(cache, "DB_CACHE_TABLES", {"meetings"})
+    select_data("meetings", {"id_meeting": 1})
+    select_data("meetings", {"id_meeting": 1})
+    select_data("user", {"id_user": "u"})
+    select_data("user", {"id_user": "u"})
+    assert len(fake_db.executed) == 3
+
+    cache.invalidate("meetings")
+    select_data("meetings", {"id_meeting": 1})
+    assert len(fake_db.executed) == 4
+
+def test_make_key_is_order_insensitive_and_hashable():
+    key = cache.make_key("answers", {"id_user": "u", "id_meeting": [1, 2]}, ["a", "b"])
+
+    assert key == cache.make_key("answers", {"id_meeting": [1, 2], "id_user": "u"}, ["a", "b"])
+    hash(key)  # Las listas se convierten en tuplas
+    assert key != cache.make_key("answers", {"id_user": "u", "id_meeting": [2, 1]}, ["a", "b"])
@@ -0,0 +1,105 @@
+import itertools
+
+import pytest
+
+from app.database.supabase_api import (
+    apply_select_options, decode_cursor, encode_cursor, insert_many, keyset_columns, next_cursor, select_pages,
+)
+
+def numbered(id_column):
+    """Handler que devuelve las filas insertadas con IDs consecutivos."""
+    counter = itertools.count(1)
+    return lambda query: [{**row, id_column: next(counter)} for row in query.called("insert")[0][0]]
+
+def test_insert_many_splits_in_chunks_and_keeps_order(fake_db):
+    fake_db.handler = numbered("id_question")
+    rows = [{"question": f"p{i}"} for i in range(5)]
+
+    assert insert_many("questions", rows, chunk_size=2) == [1, 2, 3, 4, 5]
+    assert [len(query.called("insert")[0][0]) for query in fake_db.executed] == [2, 2, 1]
+    assert fake_db.executed[0].called("insert")[0][0] == rows[:2]
+
+def test_insert_many_short_insert_raises(fake_db):
+    fake_db.handler = lambda query: query.called("insert")[0][0][:-1]
+
+    with pytest.raises(RuntimeError, match="1 de 2 filas"):
+        insert_many("answers", [{"answer": "a"}, {"answer": "b"}])
+
+def test_insert_many_without_id_column(fake_db):
+    fake_db.handler = lambda query: query.called("insert")[0][0]
+
+    assert insert_many("otra", [{"a": 1}, {"a": 2}]) == [None, None]
+    assert insert_many("otra", [{"a": 1}], id_column="a") == [1]
+
+def test_insert_many_empty_and_invalid_chunk(fake_db):
+    assert insert_many("questions", []) == []
+    assert fake_db.executed == []
+    with pytest.raises(ValueError):
+        insert_many("questions", [{"question": "p"}], chunk_size=0)
+
+def test_cursor_round_trip():
+    row = {"created_at": "2024-05-01T10:00:00", "id_question": 7, "question": "p"}
+
+    assert decode_cursor(encode_cursor(row, "created_at", "questions")) == ("2024-05-01T10:00:00", 7)
+    # Ordenando por el propio id no hace falta desempate
+    assert decode_cursor(encode_cursor(row, "id_question", "questions")) == (7, None)
+
+def test_decode_cursor_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_cursor("no-es-un-cursor")
+
+def test_next_cursor_only_for_full_pages():
+    rows = [{"id_meeting": 1}, {"id_meeting": 2}]
+
+    assert next_cursor(rows, 3, "id_meeting", "meetings") is None
+    assert next_cursor([], 2, "id_meeting", "meetings") is None
+    assert decode_cursor(next_cursor(rows, 2, "id_meeting", "meetings")) == (2, None)
+
+@pytest.mark.parametrize("ascending, op", [(True, "gt"), (False, "lt")])
+def test_keyset_filter_breaks_ties_by_id(fake_db, ascending, op):
+    after = encode_cursor({"created_at": "2024-05-01", "id_answer": 9}, "created_at", "answers")
+    query = apply_select_options(
+        fake_db.from_("answers"), "answers", {"id_user": "u"}, limit=10, order_by="created_at",
+        ascending=ascending, after=after,
+    )
+
+    assert query.called("or_") == [(f'created_at.{op}."2024-05-01",and(created_at.eq."2024-05-01",id_answer.{op}.9)',)]
+    assert query.called("order") == [("created_at",), ("id_answer",)]
+    assert [kwargs["desc"] for name, _, kwargs in query.calls if name == "order"] == [not ascending] * 2
+    assert query.called("limit") == [(10,)]
+
+def test_keyset_filter_without_tie_breaker(fake_db):
+    after = encode_cursor({"id_meeting": 4}, "id_meeting", "meetings")
+    query = apply_select_options(fake_db.from_("meetings"), "meetings", order_by="id_meeting", after=after)
+
+    assert query.called("gt") == [("id_meeting", 4)]
+    assert query.called("or_") == []
+
+def test_keyset_needs_order_by(fake_db):
+    after = encode_cursor({"id_meeting": 4}, "id_meeting", "meetings")
+    with pytest.raises(ValueError):
+        apply_select_options(fake_db.from_("meetings"), "meetings", after=after)
+
+def test_offset_uses_range(fake_db):
+    query = apply_select_options(fake_db.from_("meetings"), "meetings", limit=50, order_by="id_meeting", offset=100)
+
+    assert query.called("range") == [(100, 149)]
+    assert query.called("limit") == []
+
+def test_keyset_columns_adds_cursor_columns():
+    assert keyset_columns("id_meeting", "created_at", "answers") == ["id_meeting", "created_at", "id_answer"]
+    assert keyset_columns("*", "created_at", "answers") == "*"
+
+def test_select_pages_follows_the_cursor(fake_db):
+    rows = [{"id_answer": i, "created_at": f"2024-05-0{i}"} for i in range(1, 6)]
+
+    def handler(query):
+        # Filas posteriores al id del cursor (`...,id_answer.gt.N)`)
+        after = int(query.called("or_")[0][0].rsplit(".", 1)[1].rstrip(")")) if query.called("or_") else 0
+        return [row for row in rows if row["id_answer"] > after][:query.called("limit")[0][0]]
+
+    fake_db.handler = handler
+    pages = list(select_pages("answers", page_size=2, columns="id_meeting"))
+
+    assert [[row["id_answer"] for row in page] for page in pages] == [[1, 2], [3, 4], [5]]
+    assert fake_db.executed[0].called("select") == [("id_meeting,created_at,id_answer",)]